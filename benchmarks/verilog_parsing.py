@@ -0,0 +1,82 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Compares the native structural verilog parser against pyverilog on large,
+randomly generated gate-level netlists.
+
+    $ python benchmarks/verilog_parsing.py --gate-counts 1000 --gate-counts 4000
+
+Neither path reads from the parse cache, so every construction is a full parse.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+import os
+import tempfile
+import time
+from typing import (
+    List,
+)
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from ibis.datastucture import LogicNetwork
+from ibis.generators.random_verilog import write_random_structural_verilog
+
+
+def time_construction(verilog_fp: str, use_native_parser: bool):
+    start = time.perf_counter()
+    network = LogicNetwork(
+        verilog_fp=verilog_fp,
+        use_cache=False,
+        use_native_parser=use_native_parser,
+    )
+    return time.perf_counter() - start, network
+
+
+def main(
+        gate_counts: List[int] = typer.Option(
+            [250, 1000, 4000],
+            help="Netlist sizes to benchmark, in gates.",
+        ),
+        num_inputs: int = typer.Option(16, help="Primary inputs per netlist."),
+        num_outputs: int = typer.Option(4, help="Primary outputs per netlist."),
+        seed: int = typer.Option(0, help="Seed for netlist generation."),
+        skip_pyverilog: bool = typer.Option(
+            False,
+            help="Only time the native parser.",
+        ),
+):
+    table = Table(title="Verilog Parsing Benchmark")
+    for column in ["Gates", "Native (s)", "Pyverilog (s)", "Speedup", "Match"]:
+        table.add_column(column)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for gate_count in gate_counts:
+            verilog_fp = os.path.join(temp_dir, f"random_{gate_count}.v")
+            write_random_structural_verilog(
+                verilog_fp,
+                num_inputs=num_inputs,
+                num_outputs=num_outputs,
+                num_gates=gate_count,
+                seed=seed,
+            )
+            native_time, native = time_construction(verilog_fp, True)
+            if skip_pyverilog:
+                table.add_row(f"{gate_count}", f"{native_time:.4f}", "-", "-", "-")
+                continue
+            pyverilog_time, pyverilog = time_construction(verilog_fp, False)
+            match = native.serialize_netlist() == pyverilog.serialize_netlist()
+            table.add_row(
+                f"{gate_count}",
+                f"{native_time:.4f}",
+                f"{pyverilog_time:.4f}",
+                f"{pyverilog_time / native_time:.1f}x",
+                f"{match}",
+            )
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    typer.run(main)
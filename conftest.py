@@ -0,0 +1,12 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="session")
+def isolated_cache_directory(tmp_path_factory):
+    """
+    Points the parse caches at a temporary directory, so the test suite never
+    reads or writes the user's cache.
+    """
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("IBIS_CACHE_DIR", str(tmp_path_factory.mktemp("cache")))
+        yield
@@ -11,10 +11,43 @@ from .circuits import (
     SBOLGeneticGroup,
     NetworkGeneticNode,
     NetworkGeneticCircuit,
+    CircuitMetrics,
+    batch_circuit_metrics,
+    batch_dynamic_range,
+    batch_vector_proximity,
+    summarize_replicates,
 )
 from .logic import (
     LogicNetwork,
 )
+from .bdd import (
+    BDDManager,
+    SymbolicTruthFunction,
+)
+from .equivalence import (
+    EquivalenceResult,
+    check_equivalence,
+)
+from .netlist import (
+    CompactNetlist,
+)
+from .sampling import (
+    MarginEstimate,
+    MarginTracker,
+    ProportionEstimate,
+    RandomVectorSampler,
+)
+from .simulation import (
+    EventDrivenSimulator,
+    LevelizedSchedule,
+    canonical_input_matrix,
+)
+from .truth_table import (
+    TruthTable,
+    TruthTableChunk,
+    hamming_distance_matrix,
+    read_truth_table_binary,
+)
 from .parts import (
     BasePart,
     Promoter,
@@ -27,5 +60,8 @@ from .parts import (
     PART_LUT,
 )
 from .ucf_parse import (
+    CelloGate,
+    CelloGateLibrary,
+    parse_cello_gate_library,
     parse_cello_input_file,
 )
@@ -0,0 +1,244 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Batch synthesis of whole corpora of verilog files.
+
+Files are parsed in a process pool, and every file is handled within a private
+temporary working directory, so nothing a parser leaves behind in the working
+directory can collide with another worker. Each file gets an edgelist, and
+optionally a truth table and a plot, next to a small manifest recording the
+content hash of the source. A file whose manifest matches its current content
+and whose outputs all exist is skipped.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+from dataclasses import dataclass
+import glob
+import json
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import time
+import traceback
+from typing import (
+    Iterator,
+    List,
+    Optional,
+)
+
+from .logic import LogicNetwork
+from .parse_cache import (
+    atomic_write,
+    hash_file,
+)
+
+# Bump this whenever the outputs of a batch run change, so stale outputs are
+# regenerated.
+BATCH_MANIFEST_VERSION = 1
+
+
+@dataclass
+class BatchResult:
+    verilog_fp: str
+    # One of 'synthesized', 'skipped', or 'failed'.
+    status: str
+    num_nodes: int = 0
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+
+def collect_verilog_files(input_pattern: str) -> List[str]:
+    """
+    Resolves a single file, a directory (searched recursively), or a glob
+    pattern into a sorted list of verilog files.
+    """
+    if os.path.isdir(input_pattern):
+        input_pattern = os.path.join(input_pattern, "**", "*.v")
+    elif os.path.isfile(input_pattern):
+        return [os.path.abspath(input_pattern)]
+    return sorted(
+        os.path.abspath(fp)
+        for fp in glob.glob(input_pattern, recursive=True)
+        if fp.endswith(".v") and os.path.isfile(fp)
+    )
+
+
+@contextlib.contextmanager
+def isolated_working_directory() -> Iterator[str]:
+    """
+    Runs the body within a fresh temporary working directory, which is
+    removed afterwards along with anything written into it.
+    """
+    previous_directory = os.getcwd()
+    working_directory = tempfile.mkdtemp(prefix="ibis-batch-")
+    os.chdir(working_directory)
+    try:
+        yield working_directory
+    finally:
+        os.chdir(previous_directory)
+        shutil.rmtree(working_directory, ignore_errors=True)
+
+
+def synthesize_verilog_file(
+        verilog_fp: str,
+        output_dir: str,
+        write_truth_table: bool = True,
+        visualize_graph: bool = False,
+        max_truth_table_inputs: int = 20,
+        force: bool = False,
+) -> BatchResult:
+    """
+    Synthesizes a single verilog file, unless its outputs are already up to
+    date. Failures are reported in the result rather than raised.
+
+    Args:
+        verilog_fp: Filepath of the verilog file.
+        output_dir: Directory to write outputs to.
+        write_truth_table: Whether to write the truth table as CSV.
+        visualize_graph: Whether to plot the network.
+        max_truth_table_inputs: Truth tables are only written for networks
+            with up to this many inputs.
+        force: Whether to regenerate outputs that are up to date.
+
+    Returns:
+        The result of the file.
+    """
+    start_time = time.perf_counter()
+    # Resolved up front, as the work happens in another working directory.
+    verilog_fp = os.path.abspath(verilog_fp)
+    output_dir = os.path.abspath(output_dir)
+    stem = Path(verilog_fp).stem
+    output_stem = os.path.join(output_dir, stem)
+    manifest_fp = f"{output_stem}.manifest.json"
+    try:
+        digest = hash_file(verilog_fp)
+        settings = {
+            "version": BATCH_MANIFEST_VERSION,
+            "digest": digest,
+            "write_truth_table": write_truth_table,
+            "visualize_graph": visualize_graph,
+            "max_truth_table_inputs": max_truth_table_inputs,
+        }
+        if not force and os.path.isfile(manifest_fp):
+            with open(manifest_fp, "r") as manifest_file:
+                manifest = json.load(manifest_file)
+            if (
+                    manifest.get("settings") == settings
+                    and all(os.path.isfile(fp) for fp in manifest["outputs"])
+            ):
+                return BatchResult(
+                    verilog_fp=verilog_fp,
+                    status="skipped",
+                    num_nodes=manifest["num_nodes"],
+                    elapsed=time.perf_counter() - start_time,
+                )
+        outputs = []
+        with isolated_working_directory():
+            network = LogicNetwork(verilog_fp=verilog_fp)
+            edgelist_fp = f"{output_stem}.edgelist"
+            network.save_netlist(output_fp=edgelist_fp)
+            outputs.append(edgelist_fp)
+            if (
+                    write_truth_table
+                    and network.get_number_of_inputs() <= max_truth_table_inputs
+            ):
+                truth_table_fp = f"{output_stem}.csv"
+                network.write_truth_table(truth_table_fp)
+                outputs.append(truth_table_fp)
+            if visualize_graph:
+                plot_fp = f"{output_stem}.jpg"
+                network.plot_graph(save_file=True, output_filename=plot_fp)
+                outputs.append(plot_fp)
+        num_nodes = network.netlist.number_of_nodes()
+        atomic_write(
+            manifest_fp,
+            json.dumps(
+                {
+                    "settings": settings,
+                    "source": verilog_fp,
+                    "outputs": outputs,
+                    "num_nodes": num_nodes,
+                }
+            ).encode("utf-8"),
+        )
+        return BatchResult(
+            verilog_fp=verilog_fp,
+            status="synthesized",
+            num_nodes=num_nodes,
+            elapsed=time.perf_counter() - start_time,
+        )
+    except Exception:
+        return BatchResult(
+            verilog_fp=verilog_fp,
+            status="failed",
+            elapsed=time.perf_counter() - start_time,
+            error=traceback.format_exc(limit=4),
+        )
+
+
+def synthesize_verilog_batch(
+        input_pattern: str,
+        output_dir: str,
+        processes: Optional[int] = None,
+        write_truth_table: bool = True,
+        visualize_graph: bool = False,
+        max_truth_table_inputs: int = 20,
+        force: bool = False,
+) -> List[BatchResult]:
+    """
+    Synthesizes every verilog file matching a directory or glob pattern.
+
+    Args:
+        input_pattern: A verilog file, a directory, or a glob pattern.
+        output_dir: Directory to write outputs to. Outputs are named after
+            the stem of each verilog file.
+        processes: Number of worker processes. Defaults to the number of
+            CPUs, and 1 synthesizes every file within this process.
+        write_truth_table: Whether to write truth tables as CSV.
+        visualize_graph: Whether to plot every network.
+        max_truth_table_inputs: Truth tables are only written for networks
+            with up to this many inputs.
+        force: Whether to regenerate outputs that are up to date.
+
+    Returns:
+        The result of every file, in the order of the files.
+    """
+    verilog_fps = collect_verilog_files(input_pattern)
+    stems = [Path(fp).stem for fp in verilog_fps]
+    if len(set(stems)) != len(stems):
+        raise RuntimeError(
+            "Unable to batch verilog files that share a file name, as their "
+            "outputs would overwrite each other. Please investigate."
+        )
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    arguments = [
+        (
+            verilog_fp,
+            output_dir,
+            write_truth_table,
+            visualize_graph,
+            max_truth_table_inputs,
+            force,
+        )
+        for verilog_fp in verilog_fps
+    ]
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes == 1 or len(verilog_fps) <= 1:
+        return [synthesize_verilog_file(*argument) for argument in arguments]
+    # A few chunks per worker keeps the pool busy without paying for a round
+    # trip per file.
+    chunksize = max(1, len(arguments) // (4 * processes))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(
+            executor.map(
+                synthesize_verilog_file,
+                *zip(*arguments),
+                chunksize=chunksize,
+            )
+        )
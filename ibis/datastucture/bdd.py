@@ -0,0 +1,403 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Reduced ordered binary decision diagrams (ROBDDs) for symbolic truth functions.
+
+A truth table doubles in size with every input, so past twenty or so inputs it
+can no longer be enumerated. A BDD represents the same boolean function as a
+shared, canonical DAG, which lets us count the ON and OFF rows of an output,
+walk them, or check two circuits for equivalence without ever building the full
+table.
+
+Nodes are integers indexing into flat arrays. The unique table guarantees every
+(variable, low, high) triple exists once, so two functions built in the same
+manager are equal if and only if they are the same node, and the operation
+cache means every if-then-else is only ever computed once.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+from functools import reduce
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+from .netlist import (
+    GATE_REDUCTIONS,
+    CompactNetlist,
+)
+
+# Terminals sort below every variable.
+TERMINAL_LEVEL = 1 << 30
+
+
+# ---------------------------------- MANAGER -----------------------------------
+class BDDManager:
+    FALSE = 0
+    TRUE = 1
+
+    def __init__(self, variable_names: Sequence[str] = ()):
+        """
+        Owns the nodes, unique table, and operation cache of a set of BDDs.
+        Variables are ordered by the order in which they're added; functions
+        can only be combined or compared within a single manager.
+
+        Args:
+            variable_names: Initial variables, in order.
+        """
+        self.variable_names: List[str] = []
+        self.variable_index: Dict[str, int] = {}
+        self.node_level: List[int] = [TERMINAL_LEVEL, TERMINAL_LEVEL]
+        self.node_low: List[int] = [self.FALSE, self.TRUE]
+        self.node_high: List[int] = [self.FALSE, self.TRUE]
+        self.unique_table: Dict[Tuple[int, int, int], int] = {}
+        self.ite_cache: Dict[Tuple[int, int, int], int] = {}
+        for variable_name in variable_names:
+            self.add_variable(variable_name)
+
+    def __len__(self) -> int:
+        return len(self.node_level)
+
+    # ----------------------------- CONSTRUCTION -------------------------------
+    def add_variable(self, variable_name: str) -> int:
+        """
+        Adds a variable below every existing one, if it doesn't already exist.
+
+        Returns:
+            The node of the variable.
+        """
+        if variable_name not in self.variable_index:
+            self.variable_index[variable_name] = len(self.variable_names)
+            self.variable_names.append(variable_name)
+        return self.variable(variable_name)
+
+    def variable(self, variable_name: str) -> int:
+        if variable_name not in self.variable_index:
+            raise RuntimeError(
+                f"Variable {variable_name} is not part of this BDD manager."
+            )
+        return self.make_node(
+            self.variable_index[variable_name],
+            self.FALSE,
+            self.TRUE,
+        )
+
+    def make_node(self, level: int, low: int, high: int) -> int:
+        if low == high:
+            return low
+        key = (level, low, high)
+        node = self.unique_table.get(key)
+        if node is None:
+            node = len(self.node_level)
+            self.node_level.append(level)
+            self.node_low.append(low)
+            self.node_high.append(high)
+            self.unique_table[key] = node
+        return node
+
+    # ------------------------------- OPERATIONS -------------------------------
+    def ite(self, f: int, g: int, h: int) -> int:
+        """
+        If f then g else h, the one operation every other one is built on.
+        """
+        if f == self.TRUE:
+            return g
+        if f == self.FALSE:
+            return h
+        if g == h:
+            return g
+        if g == self.TRUE and h == self.FALSE:
+            return f
+        key = (f, g, h)
+        result = self.ite_cache.get(key)
+        if result is not None:
+            return result
+        level = min(self.node_level[f], self.node_level[g], self.node_level[h])
+        f_low, f_high = self.cofactors(f, level)
+        g_low, g_high = self.cofactors(g, level)
+        h_low, h_high = self.cofactors(h, level)
+        result = self.make_node(
+            level,
+            self.ite(f_low, g_low, h_low),
+            self.ite(f_high, g_high, h_high),
+        )
+        self.ite_cache[key] = result
+        return result
+
+    def cofactors(self, node: int, level: int) -> Tuple[int, int]:
+        if self.node_level[node] != level:
+            return node, node
+        return self.node_low[node], self.node_high[node]
+
+    def negate(self, f: int) -> int:
+        return self.ite(f, self.FALSE, self.TRUE)
+
+    def conjoin(self, f: int, g: int) -> int:
+        return self.ite(f, g, self.FALSE)
+
+    def disjoin(self, f: int, g: int) -> int:
+        return self.ite(f, self.TRUE, g)
+
+    def exclusive_or(self, f: int, g: int) -> int:
+        return self.ite(f, self.negate(g), g)
+
+    # -------------------------------- QUERIES ---------------------------------
+    def count_satisfying(self, f: int) -> int:
+        """
+        Counts the assignments of every variable in the manager for which the
+        function is True, without enumerating them.
+        """
+        num_variables = len(self.variable_names)
+
+        def level_of(node: int) -> int:
+            return min(self.node_level[node], num_variables)
+
+        counts = {self.FALSE: 0, self.TRUE: 1}
+        stack = [f]
+        while stack:
+            node = stack[-1]
+            if node in counts:
+                stack.pop()
+                continue
+            low, high = self.node_low[node], self.node_high[node]
+            pending = [child for child in (low, high) if child not in counts]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            level = level_of(node)
+            counts[node] = (
+                counts[low] << (level_of(low) - level - 1)
+            ) + (
+                counts[high] << (level_of(high) - level - 1)
+            )
+        return counts[f] << level_of(f)
+
+    def count_nodes(self, f: int) -> int:
+        """
+        Counts the decision nodes of a function, excluding the terminals.
+        """
+        seen = set()
+        stack = [f]
+        while stack:
+            node = stack.pop()
+            if node in seen or node in (self.FALSE, self.TRUE):
+                continue
+            seen.add(node)
+            stack.append(self.node_low[node])
+            stack.append(self.node_high[node])
+        return len(seen)
+
+    def iterate_cubes(self, f: int) -> Iterator[Dict[str, bool]]:
+        """
+        Walks every path to True. Each path is a cube, i.e. a partial
+        assignment where every variable that isn't mentioned is a don't care.
+        The cubes are disjoint and together cover exactly the ON set.
+        """
+        stack: List[Tuple[int, Dict[str, bool]]] = [(f, {})]
+        while stack:
+            node, cube = stack.pop()
+            if node == self.FALSE:
+                continue
+            if node == self.TRUE:
+                yield cube
+                continue
+            variable_name = self.variable_names[self.node_level[node]]
+            # True is explored first, the same as the canonical row ordering.
+            stack.append((self.node_low[node], {**cube, variable_name: False}))
+            stack.append((self.node_high[node], {**cube, variable_name: True}))
+
+    def evaluate(self, f: int, assignment: Dict[str, bool]) -> bool:
+        node = f
+        while node not in (self.FALSE, self.TRUE):
+            variable_name = self.variable_names[self.node_level[node]]
+            if assignment[variable_name]:
+                node = self.node_high[node]
+            else:
+                node = self.node_low[node]
+        return node == self.TRUE
+
+
+# --------------------------- SYMBOLIC TRUTH FUNCTION --------------------------
+class SymbolicTruthFunction:
+    def __init__(
+            self,
+            manager: BDDManager,
+            input_names: List[str],
+            output_names: List[str],
+            roots: List[int],
+    ):
+        """
+        The truth function of every output of a network as BDDs. Rows follow
+        the same canonical ordering as LogicNetwork.generate_truth_table, i.e.
+        itertools.product([True, False], repeat=inputs).
+
+        Args:
+            manager: The manager holding the BDDs.
+            input_names: Names of the inputs, in input order.
+            output_names: Names of the outputs, in output order.
+            roots: The BDD of each output.
+        """
+        self.manager = manager
+        self.input_names = input_names
+        self.output_names = output_names
+        self.roots = roots
+
+    @classmethod
+    def from_netlist(
+            cls,
+            netlist: CompactNetlist,
+            manager: Optional[BDDManager] = None,
+    ) -> "SymbolicTruthFunction":
+        """
+        Builds the BDDs of a netlist. Inputs are matched to manager variables
+        by name, and new variables are added in input order.
+
+        Args:
+            netlist: The netlist to build.
+            manager: The manager to build in. Pass the same manager to build
+                several networks that are to be compared.
+
+        Returns:
+            The symbolic truth function of the netlist.
+        """
+        if manager is None:
+            manager = BDDManager()
+        reductions = {
+            "AND": manager.conjoin,
+            "OR": manager.disjoin,
+            "XOR": manager.exclusive_or,
+        }
+        input_names = [netlist.names[node_id] for node_id in netlist.input_ids]
+        functions: Dict[int, int] = {}
+        for node_id, input_name in zip(netlist.input_ids, input_names):
+            functions[node_id] = manager.add_variable(input_name)
+        fanin = netlist.get_fanin_lists()
+        order = np.argsort(netlist.get_schedule().node_levels, kind="stable")
+        for node_id in order.tolist():
+            if node_id in functions:
+                continue
+            drivers = fanin[node_id].tolist()
+            if not drivers:
+                # Undriven nodes read as False.
+                functions[node_id] = manager.FALSE
+                continue
+            reduction, invert = GATE_REDUCTIONS[netlist.get_gate_type(node_id)]
+            function = reduce(
+                reductions[reduction],
+                [functions[driver] for driver in drivers],
+            )
+            functions[node_id] = manager.negate(function) if invert else function
+        return cls(
+            manager=manager,
+            input_names=input_names,
+            output_names=[netlist.names[node_id] for node_id in netlist.output_ids],
+            roots=[functions[node_id] for node_id in netlist.output_ids],
+        )
+
+    # -------------------------------- QUERIES ---------------------------------
+    def get_root(self, output_index: int = 0, value: bool = True) -> int:
+        root = self.roots[output_index]
+        return root if value else self.manager.negate(root)
+
+    def count_rows(self, output_index: int = 0, value: bool = True) -> int:
+        """
+        Counts the rows of the truth table where an output is ON (or OFF).
+
+        Args:
+            output_index: Which output to count.
+            value: Whether to count the ON rows or the OFF rows.
+
+        Returns:
+            Number of rows, out of 2 ** inputs.
+        """
+        count = self.manager.count_satisfying(self.get_root(output_index, value))
+        # The manager may hold variables from other networks, which this
+        # function doesn't depend on.
+        extra_variables = len(self.manager.variable_names) - len(self.input_names)
+        return count >> extra_variables
+
+    def iterate_cubes(
+            self,
+            output_index: int = 0,
+            value: bool = True,
+    ) -> Iterator[Dict[str, bool]]:
+        """
+        Walks the ON (or OFF) set of an output as disjoint cubes, i.e. partial
+        assignments of inputs where missing inputs are don't cares. This is
+        typically far smaller than the set of rows.
+        """
+        return self.manager.iterate_cubes(self.get_root(output_index, value))
+
+    def iterate_rows(
+            self,
+            output_index: int = 0,
+            value: bool = True,
+    ) -> Iterator[int]:
+        """
+        Walks the indices of every row of the truth table where an output is
+        ON (or OFF), cube by cube. Only the requested rows are enumerated, not
+        the whole table.
+
+        Yields:
+            Row indices in canonical ordering, where the first input is the
+            most significant bit and True comes first. Rows are grouped by
+            cube, so they are not necessarily yielded in ascending order.
+        """
+        num_inputs = len(self.input_names)
+        for cube in self.iterate_cubes(output_index, value):
+            base = 0
+            free_bits = []
+            for index, input_name in enumerate(self.input_names):
+                bit = 1 << (num_inputs - 1 - index)
+                if input_name not in cube:
+                    free_bits.append(bit)
+                elif not cube[input_name]:
+                    base |= bit
+            for combination in range(1 << len(free_bits)):
+                row = base
+                for position, bit in enumerate(free_bits):
+                    if combination >> position & 1:
+                        row |= bit
+                yield row
+
+    def evaluate(
+            self,
+            input_signals: Union[List[bool], Tuple[bool], Dict[str, bool]],
+    ) -> List[bool]:
+        """
+        Evaluates every output for a single input vector.
+        """
+        if not isinstance(input_signals, dict):
+            input_signals = dict(zip(self.input_names, input_signals))
+        return [
+            self.manager.evaluate(root, input_signals) for root in self.roots
+        ]
+
+    def is_equivalent(self, other: "SymbolicTruthFunction") -> bool:
+        """
+        Checks whether two functions are identical output by output. BDDs are
+        canonical, so this is a comparison of root nodes.
+
+        Args:
+            other: A function built in the same manager.
+
+        Returns:
+            Whether every output of both functions is the same.
+        """
+        if other.manager is not self.manager:
+            raise RuntimeError(
+                "Symbolic truth functions can only be compared when built "
+                "within the same BDD manager. Please investigate."
+            )
+        if sorted(self.input_names) != sorted(other.input_names):
+            return False
+        return self.roots == other.roots
@@ -7,17 +7,19 @@ Written by W.R. Jackson, Ben Bremer, Eric South
 --------------------------------------------------------------------------------
 """
 from dataclasses import dataclass, field, asdict
-from math import acos, degrees
 from typing import (
     Dict,
     List,
     Tuple,
+    Union,
 )
 
 import matplotlib.pyplot as plt
 import networkx as nx
+import numpy as np
 
 from .parts import BasePart, PART_LUT
+from .truth_table import TruthTable
 
 
 class GeneticCircuit:
@@ -43,11 +45,25 @@ class GeneticCircuit:
         return self._intended_truth_table
 
     @intended_truth_table.setter
-    def intended_truth_table(self, value: List[int]):
+    def intended_truth_table(self, value: Union[List[int], TruthTable]):
         # assert len(value) == 2 ** (self.num_inputs + self.num_outputs - 1)
-        assert all(x in (0, 1) for x in value)
+        # A TruthTable is binary by construction.
+        if not isinstance(value, TruthTable):
+            assert all(x in (0, 1) for x in value)
         self._intended_truth_table = value
 
+    def get_intended_vector(self) -> np.ndarray:
+        """
+        The intended truth table as a flat 0/1 vector. A TruthTable is
+        unpacked with the outputs of each row next to each other, the same
+        layout as the experimental data.
+        """
+        itt = self.intended_truth_table
+        assert itt is not None
+        if isinstance(itt, TruthTable):
+            return itt.to_vector()
+        return np.asarray(itt)
+
     @property
     def exp_data(self):
         return self._exp_data
@@ -57,33 +73,194 @@ class GeneticCircuit:
         assert len(value) == 2 ** (self.num_inputs + self.num_outputs - 1)
         self._exp_data = value
 
+    # Unlike the batch metrics, which give NaN, degenerate circuits raise.
     def dynamic_range(self) -> float:
-        itt = self.intended_truth_table
-        assert itt is not None
+        ett = self.exp_data
+        assert ett is not None
+        intended = self.get_intended_vector()
+        if (intended != 0).all() or (intended == 0).all():
+            raise ValueError(
+                "A dynamic range needs both intended ON and intended OFF states."
+            )
+        dynamic_range = float(batch_dynamic_range(
+            intended[np.newaxis],
+            np.asarray(ett)[np.newaxis],
+        )[0])
+        if not np.isfinite(dynamic_range):
+            raise ZeroDivisionError("The highest intended OFF measurement is zero.")
+        return dynamic_range
 
+    def vector_proximity(self) -> float:
         ett = self.exp_data
         assert ett is not None
+        theta = float(batch_vector_proximity(
+            self.get_intended_vector()[np.newaxis],
+            np.asarray(ett)[np.newaxis],
+        )[0])
+        if np.isnan(theta):
+            raise ZeroDivisionError(
+                "The angle to an all zero vector is undefined."
+            )
+        return theta
 
-        max_low = max(e for i, e in zip(itt, ett) if i == 0)
-        min_high = min(e for i, e in zip(itt, ett) if i == 1)
 
-        return min_high / max_low
+# ------------------------------- Batch Metrics --------------------------------
+# The metrics of GeneticCircuit for many circuits at once. Intended truth tables
+# are arrays of shape (circuits, states) and measurements are either of the same
+# shape or of shape (circuits, states, replicates), in which case the metrics
+# are of the replicate means. Rows a metric is undefined for get NaN rather
+# than raising or warning.
+@dataclass
+class CircuitMetrics:
+    # Of shape (circuits,).
+    angles: np.ndarray
+    dynamic_ranges: np.ndarray
+    max_low: np.ndarray
+    min_high: np.ndarray
+    # Mean ON minus mean OFF measurement, in pooled replicate standard
+    # deviations. NaN without replicates or without replicate variation.
+    signal_to_noise: np.ndarray
+    # Of shape (circuits, states).
+    means: np.ndarray
+    standard_deviations: np.ndarray
+
+
+def summarize_replicates(measured: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The mean and sample standard deviation of the replicates of every state,
+    ignoring missing (NaN) replicates.
 
-    def vector_proximity(self) -> float:
-        itt = self.intended_truth_table
-        assert itt is not None
+    Args:
+        measured: Measurements of shape (circuits, states) or (circuits,
+            states, replicates).
 
-        ett = self.exp_data
-        assert ett is not None
+    Returns:
+        Both of shape (circuits, states). Standard deviations are NaN for
+        states with fewer than two replicates.
+    """
+    measured = np.asarray(measured, dtype=np.float64)
+    if measured.ndim == 2:
+        return measured, np.full(measured.shape, np.nan)
+    counts = np.sum(~np.isnan(measured), axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = np.nansum(measured, axis=-1) / counts
+        squares = np.nansum((measured - means[..., np.newaxis]) ** 2, axis=-1)
+        deviations = np.sqrt(squares / (counts - 1))
+    return means, np.where(counts > 1, deviations, np.nan)
+
+
+def batch_vector_proximity(
+        intended: np.ndarray,
+        measured: np.ndarray,
+) -> np.ndarray:
+    """
+    GeneticCircuit.vector_proximity for many circuits at once: the angle, in
+    degrees, between every intended truth table vector and its measured
+    output vector.
 
-        itt_mag = sum(i ** 2 for i in itt) ** (1 / 2)
-        ett_mag = sum(e ** 2 for e in ett) ** (1 / 2)
+    Args:
+        intended: Intended truth tables, of shape (circuits, states).
+        measured: Measured outputs in the same layout, optionally with a
+            trailing replicate axis.
+
+    Returns:
+        The angle of every circuit. NaN if either vector is all zeros.
+    """
+    intended = np.asarray(intended, dtype=np.float64)
+    measured = np.asarray(measured, dtype=np.float64)
+    if measured.ndim == 3:
+        measured, _ = summarize_replicates(measured)
+    dot = np.einsum("ij,ij->i", intended, measured)
+    magnitudes = np.linalg.norm(intended, axis=1) * np.linalg.norm(measured, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cos_theta = dot / magnitudes
+    # Rounding can push a perfect match just past 1.
+    return np.degrees(np.arccos(np.clip(cos_theta, -1.0, 1.0)))
+
+
+def get_low_high(
+        intended: np.ndarray,
+        means: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The highest measurement of an intended OFF state and the lowest of an
+    intended ON state of every circuit. NaN where there is no such state.
+    """
+    on = np.asarray(intended) != 0
+    max_low = np.where(on, -np.inf, means).max(axis=1)
+    min_high = np.where(on, means, np.inf).min(axis=1)
+    return (
+        np.where(np.isfinite(max_low), max_low, np.nan),
+        np.where(np.isfinite(min_high), min_high, np.nan),
+    )
+
+
+def batch_dynamic_range(
+        intended: np.ndarray,
+        measured: np.ndarray,
+) -> np.ndarray:
+    """
+    GeneticCircuit.dynamic_range for many circuits at once: the lowest ON
+    measurement over the highest OFF measurement.
 
-        dot = sum(i * e for i, e in zip(itt, ett))
-        cos_theta = dot / (itt_mag * ett_mag)
-        theta = degrees(acos(cos_theta))
+    Args:
+        intended: Intended truth tables, of shape (circuits, states).
+        measured: Measured outputs in the same layout, optionally with a
+            trailing replicate axis.
 
-        return theta
+    Returns:
+        The dynamic range of every circuit. NaN for circuits that are never
+        ON or never OFF, or with neither ON nor OFF output.
+    """
+    means, _ = summarize_replicates(measured)
+    max_low, min_high = get_low_high(intended, means)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return min_high / max_low
+
+
+def batch_circuit_metrics(
+        intended: np.ndarray,
+        measured: np.ndarray,
+) -> CircuitMetrics:
+    """
+    Every batch metric of many circuits in one call, sharing the replicate
+    summary between them.
+
+    Args:
+        intended: Intended truth tables, of shape (circuits, states).
+        measured: Measured outputs in the same layout, optionally with a
+            trailing replicate axis.
+
+    Returns:
+        The metrics of every circuit.
+    """
+    intended = np.asarray(intended)
+    means, deviations = summarize_replicates(measured)
+    if means.shape != intended.shape:
+        raise RuntimeError(
+            f"Measurements of shape {means.shape} don't match intended truth "
+            f"tables of shape {intended.shape}. Please investigate."
+        )
+    max_low, min_high = get_low_high(intended, means)
+    on = intended != 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_on = np.where(on, means, 0.0).sum(axis=1) / on.sum(axis=1)
+        mean_off = np.where(on, 0.0, means).sum(axis=1) / (~on).sum(axis=1)
+        variances = deviations ** 2
+        pooled = np.sqrt(
+            np.nansum(variances, axis=1) / np.sum(~np.isnan(variances), axis=1)
+        )
+        signal_to_noise = (mean_on - mean_off) / pooled
+        dynamic_ranges = min_high / max_low
+    return CircuitMetrics(
+        angles=batch_vector_proximity(intended, means),
+        dynamic_ranges=dynamic_ranges,
+        max_low=max_low,
+        min_high=min_high,
+        signal_to_noise=np.where(pooled > 0, signal_to_noise, np.nan),
+        means=means,
+        standard_deviations=deviations,
+    )
 
 
 @dataclass
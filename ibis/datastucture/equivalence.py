@@ -0,0 +1,172 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Combinational equivalence checking between two netlists, e.g. a Verilog file
+and the same network after NOR mapping or optimization. Inputs and outputs are
+matched by name, so the two netlists may order their ports differently.
+
+The check runs in two stages:
+
+    - Random vector signatures. Both netlists are simulated bit-parallel on
+      the same random rows, which refutes almost every non-equivalent pair in
+      a few microseconds and yields a counterexample.
+    - An exact proof, run only once the signatures agree. Small networks are
+      simply enumerated, and anything wider is built as BDDs within a single
+      manager, where two functions are equivalent if and only if they are the
+      same node.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    List,
+    Optional,
+)
+
+import numpy as np
+
+from .bdd import (
+    BDDManager,
+    SymbolicTruthFunction,
+)
+from .netlist import CompactNetlist
+from .simulation import (
+    canonical_input_matrix,
+    unpack_words,
+)
+
+
+@dataclass
+class EquivalenceResult:
+    equivalent: bool
+    # Which stage decided the result: 'signature', 'exhaustive', or 'bdd'.
+    method: str
+    mismatched_output: Optional[str] = None
+    counterexample: Optional[Dict[str, bool]] = None
+
+    def __bool__(self) -> bool:
+        return self.equivalent
+
+
+def get_port_names(netlist: CompactNetlist, node_ids: List[int]) -> List[str]:
+    names = [netlist.names[node_id] for node_id in node_ids]
+    if len(set(names)) != len(names) or None in names:
+        raise RuntimeError(
+            "Unable to match ports by name as the netlist has unnamed or "
+            "duplicate ports. Please investigate."
+        )
+    return names
+
+
+def check_equivalence(
+        netlist_a: CompactNetlist,
+        netlist_b: CompactNetlist,
+        num_signature_words: int = 64,
+        exhaustive_limit: int = 16,
+        seed: Optional[int] = 0,
+) -> EquivalenceResult:
+    """
+    Checks whether two netlists compute the same function for every output.
+
+    Args:
+        netlist_a: The first netlist.
+        netlist_b: The second netlist. Must have the same input and output
+            names as the first, in any order.
+        num_signature_words: Number of random 64 row words simulated for the
+            signatures.
+        exhaustive_limit: Netlists with up to this many inputs are proven by
+            enumerating the truth table rather than building BDDs.
+        seed: Seed of the random signature rows.
+
+    Returns:
+        The result of the check, with a counterexample input assignment if the
+        netlists differ.
+    """
+    input_names = get_port_names(netlist_a, netlist_a.input_ids)
+    output_names = get_port_names(netlist_a, netlist_a.output_ids)
+    other_inputs = get_port_names(netlist_b, netlist_b.input_ids)
+    other_outputs = get_port_names(netlist_b, netlist_b.output_ids)
+    if sorted(input_names) != sorted(other_inputs):
+        raise RuntimeError(
+            f"Unable to compare netlists with differing inputs {input_names} "
+            f"and {other_inputs}. Please investigate."
+        )
+    if sorted(output_names) != sorted(other_outputs):
+        raise RuntimeError(
+            f"Unable to compare netlists with differing outputs {output_names} "
+            f"and {other_outputs}. Please investigate."
+        )
+    # Row permutations that line the ports of b up with the ports of a.
+    input_order = [other_inputs.index(name) for name in input_names]
+    output_order = [other_outputs.index(name) for name in output_names]
+    schedule_a = netlist_a.get_schedule()
+    schedule_b = netlist_b.get_schedule()
+
+    def find_mismatch(method: str, input_matrix, outputs_a, outputs_b):
+        differing = np.argwhere(outputs_a != outputs_b)
+        if not len(differing):
+            return None
+        output_index, row = differing[0].tolist()
+        return EquivalenceResult(
+            equivalent=False,
+            method=method,
+            mismatched_output=output_names[output_index],
+            counterexample={
+                name: bool(value)
+                for name, value in zip(input_names, input_matrix[:, row])
+            },
+        )
+
+    # Stage one: random signatures.
+    rng = np.random.default_rng(seed)
+    packed_inputs = rng.integers(
+        0,
+        np.iinfo(np.uint64).max,
+        size=(len(input_names), num_signature_words),
+        dtype=np.uint64,
+        endpoint=True,
+    )
+    packed_b = np.empty_like(packed_inputs)
+    packed_b[input_order] = packed_inputs
+    signatures_a = schedule_a.evaluate_packed(packed_inputs)[schedule_a.output_ids]
+    signatures_b = schedule_b.evaluate_packed(packed_b)[schedule_b.output_ids]
+    signatures_b = signatures_b[output_order]
+    if not np.array_equal(signatures_a, signatures_b):
+        return find_mismatch(
+            "signature",
+            unpack_words(packed_inputs),
+            unpack_words(signatures_a),
+            unpack_words(signatures_b),
+        )
+    # Stage two: an exact proof.
+    if len(input_names) <= exhaustive_limit:
+        input_matrix = canonical_input_matrix(len(input_names))
+        input_b = np.empty_like(input_matrix)
+        input_b[input_order] = input_matrix
+        mismatch = find_mismatch(
+            "exhaustive",
+            input_matrix,
+            schedule_a.evaluate_outputs(input_matrix),
+            schedule_b.evaluate_outputs(input_b)[output_order],
+        )
+        return mismatch or EquivalenceResult(equivalent=True, method="exhaustive")
+    manager = BDDManager(input_names)
+    function_a = SymbolicTruthFunction.from_netlist(netlist_a, manager)
+    function_b = SymbolicTruthFunction.from_netlist(netlist_b, manager)
+    for output_index, output_name in enumerate(output_names):
+        root_a = function_a.roots[output_index]
+        root_b = function_b.roots[output_order[output_index]]
+        if root_a == root_b:
+            continue
+        # Any path to True through the miter is a counterexample, and inputs
+        # it doesn't mention are don't cares.
+        cube = next(manager.iterate_cubes(manager.exclusive_or(root_a, root_b)))
+        return EquivalenceResult(
+            equivalent=False,
+            method="bdd",
+            mismatched_output=output_name,
+            counterexample={name: cube.get(name, False) for name in input_names},
+        )
+    return EquivalenceResult(equivalent=True, method="bdd")
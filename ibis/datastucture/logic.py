@@ -9,10 +9,12 @@ Written by W.R. Jackson, Ben Bremer, Eric South
 import copy
 from dataclasses import dataclass
 import os
-import itertools
 from typing import (
     Callable,
+    Iterator,
     Optional,
+    Sequence,
+    Type,
     Union,
     List,
     Dict,
@@ -24,7 +26,52 @@ import networkx as nx
 import pandas as pd
 import numpy as np
 
-from pyverilog.vparser.parser import parse
+from .parse_cache import (
+    get_parser_tag,
+    hash_file,
+    load_cached_netlist,
+    parse_verilog_ast,
+    store_cached_netlist,
+)
+from .structural_verilog import (
+    UnsupportedVerilogError,
+    parse_structural_verilog_file,
+)
+from .bdd import (
+    BDDManager,
+    SymbolicTruthFunction,
+)
+from .equivalence import (
+    EquivalenceResult,
+    check_equivalence,
+)
+from .netlist import (
+    BINARY_NETLIST_SUFFIX,
+    CompactNetlist,
+)
+from .nor_mapping import map_to_nor
+from .optimization import (
+    DEFAULT_PASSES,
+    NetlistRewriter,
+    PassStatistics,
+    optimize_netlist,
+)
+from .sampling import (
+    ProportionEstimate,
+    RandomVectorSampler,
+)
+from .simulation import (
+    EventDrivenSimulator,
+    LevelizedSchedule,
+    canonical_input_matrix,
+    evaluate_gate,
+)
+from .truth_table import (
+    TruthTable,
+    TruthTableChunk,
+    write_truth_table_binary,
+    write_truth_table_csv,
+)
 
 
 # ----------------------------- LOGICAL FUNCTIONS ------------------------------
@@ -104,48 +151,216 @@ class LogicNode:
                 (True | False)
             input_signals: A list of other LogicNodes that represent the
                 inputs into this node.
-            output_signal: The LogicNode that is fed the output of this node.
-                This design presupposes that we do not have any form of fanout
-                in our systems.
+            output_signal: A LogicNode that is fed the output of this node.
+                Nodes may fan out to any number of successors; the edges of
+                the network graph are the source of truth for fanout, and this
+                only records one of them.
             node_name: Name of the node. Used as a handle to retrieve or filter
                 nodes, typically.
             logical_function: If the node is a boolean gate, this represents
                 the operation performed.
         """
         self.boolean_value = boolean_value
-        self.input_signals = input_signals
-        self.output_signal = output_signal
-        self.node_name = node_name
         self.logical_function = logical_function
         self.node_rank = None
+        # Set once the node is added to a network, at which point the name
+        # and signal pointers are read straight from the network's netlist.
+        self.network: Optional["LogicNetwork"] = None
+        self.node_id: Optional[int] = None
+        self._node_name = node_name
+        self._input_signals = input_signals
+        self._output_signal = output_signal
+
+    def attach(self, network: "LogicNetwork", node_id: int):
+        """
+        Binds the node to its entry in a network's netlist.
+
+        Args:
+            network: The network the node belongs to.
+            node_id: The ID of the node within the network's netlist.
+        """
+        self.network = network
+        self.node_id = node_id
+
+    @property
+    def node_name(self) -> str:
+        if self.network is None:
+            return self._node_name
+        return self.network.netlist.names[self.node_id]
+
+    @node_name.setter
+    def node_name(self, node_name: str):
+        if self.network is None:
+            self._node_name = node_name
+        else:
+            self.network.netlist.rename_node(self.node_id, node_name)
+
+    @property
+    def input_signals(self) -> Optional[List["LogicNode"]]:
+        if self.network is None:
+            return self._input_signals
+        fanin = self.network.netlist.get_fanin(self.node_id)
+        if not len(fanin):
+            return None
+        return [self.network.get_logic_node(node_id) for node_id in fanin]
+
+    @input_signals.setter
+    def input_signals(self, input_signals: Optional[List["LogicNode"]]):
+        if self.network is not None:
+            raise RuntimeError(
+                f"Node {self.node_name} is part of a network, connect it via "
+                f"LogicNetwork.add_edge instead."
+            )
+        self._input_signals = input_signals
+
+    @property
+    def output_signal(self) -> Optional["LogicNode"]:
+        if self.network is None:
+            return self._output_signal
+        fanout = self.network.netlist.get_fanout(self.node_id)
+        if not len(fanout):
+            return None
+        # Matches the historical behaviour of recording the latest successor.
+        return self.network.get_logic_node(fanout[-1])
+
+    @output_signal.setter
+    def output_signal(self, output_signal: Optional["LogicNode"]):
+        if self.network is not None:
+            raise RuntimeError(
+                f"Node {self.node_name} is part of a network, connect it via "
+                f"LogicNetwork.add_edge instead."
+            )
+        self._output_signal = output_signal
 
 
 # ------------------------------- CIRCUIT NETWORK ------------------------------
 @dataclass
 class LogicNetwork:
-    def __init__(self, verilog_fp: str):
+    def __init__(
+            self,
+            verilog_fp: str,
+            use_cache: bool = True,
+            use_native_parser: bool = True,
+    ):
         """
         A CircuitNetwork represents the boolean logic of the passed in verilog
         file. This class is responsible for parsing the verilog file and
         simulating the logic of the electrical circuit.
 
         Args:
-            verilog_fp:
+            verilog_fp: Filepath of the verilog file to parse.
+            use_cache: Whether to load the parsed netlist from the on-disk
+                cache, keyed by the content hash of the verilog file and the
+                parser. An unchanged circuit is then never parsed twice.
+            use_native_parser: Whether to attempt the native gate-level
+                structural verilog parser before falling back to pyverilog.
         """
         self.verilog_fp = verilog_fp
         if not os.path.isfile(verilog_fp):
             raise RuntimeError(
                 f"Unable to locate file {verilog_fp}, please investigate."
             )
-        self.input_signal_node_list = []
-        self.output_signal_node_list = []
         self.function_counter = {}
-        self.graph = nx.DiGraph()
+        self.netlist = CompactNetlist()
         self.simple_graph = nx.DiGraph()
-        self.cleanup()
-        self.parse_verilog_file()
+        # LogicNode views are only materialized for nodes that are asked for.
+        self._node_views: Dict[int, LogicNode] = {}
+        self._graph: Optional[nx.DiGraph] = None
+        self.use_native_parser = use_native_parser
+        if not use_cache:
+            self.parse_verilog_file()
+            return
+        # Each parser gets its own entries, so the choice is always honoured.
+        digest = hash_file(verilog_fp)
+        parser_tag = get_parser_tag(use_native_parser)
+        cached_netlist = load_cached_netlist(digest, parser_tag)
+        if cached_netlist is not None:
+            self.deserialize_netlist(cached_netlist)
+        else:
+            self.parse_verilog_file()
+            store_cached_netlist(digest, parser_tag, self.serialize_netlist())
 
     # -------------------------- GETTERS AND SETTERS ---------------------------
+    @property
+    def input_signal_node_list(self) -> List[LogicNode]:
+        return [self.get_logic_node(i) for i in self.netlist.input_ids]
+
+    @property
+    def output_signal_node_list(self) -> List[LogicNode]:
+        return [self.get_logic_node(i) for i in self.netlist.output_ids]
+
+    @property
+    def graph(self) -> nx.DiGraph:
+        """
+        The network as a networkx graph keyed by LogicNode. This is built on
+        demand from the netlist, primarily for plotting, and is read only;
+        modify the network through add_node and add_edge.
+        """
+        if self._graph is None:
+            graph = nx.DiGraph()
+            for node_id, node_name in enumerate(self.netlist.names):
+                graph.add_node(self.get_logic_node(node_id), node_name=node_name)
+            graph.add_edges_from(
+                (self.get_logic_node(start), self.get_logic_node(end))
+                for start, end in self.netlist.iterate_edges()
+            )
+            self._graph = graph
+        return self._graph
+
+    def get_logic_node(self, node_id: int) -> LogicNode:
+        """
+        Returns the LogicNode view of a node in the netlist, creating it on
+        first access. The same object is returned on every call.
+
+        Args:
+            node_id: The ID of the node within the netlist.
+
+        Returns:
+            LogicNode: The requested node.
+        """
+        node = self._node_views.get(node_id)
+        if node is None:
+            gate_type = self.netlist.get_gate_type(node_id)
+            node = LogicNode(
+                logical_function=string_to_logic_function(gate_type)
+                if gate_type is not None else None,
+            )
+            node.attach(self, node_id)
+            self._node_views[node_id] = node
+        return node
+
+    def name_function_node(
+            self,
+            function_name: Optional[str],
+            node_name: Optional[str],
+    ) -> str:
+        """
+        Counts the logical functions in the network, and labels unnamed nodes
+        by their function and count, e.g. NOR3.
+
+        Args:
+            function_name: Name of the logical function of the node, if any.
+            node_name: Name of the node, or None/'temp' if unnamed.
+
+        Returns:
+            The name of the node.
+        """
+        if function_name is not None:
+            if function_name not in self.function_counter:
+                self.function_counter[function_name] = 1
+            else:
+                self.function_counter[function_name] += 1
+        if node_name is None or node_name == 'temp':
+            f_index = self.function_counter[function_name]
+            node_name = f'{function_name}{f_index}'.upper()
+        return node_name
+
+    def modified(self):
+        """
+        Drops anything derived from the netlist. Called on any modification.
+        """
+        self._graph = None
+
     def add_node(self, node: LogicNode):
         """
         Adds a node to the network. Just a wrapper to simplify the code.
@@ -153,16 +368,14 @@ class LogicNetwork:
         Args:
             node: The node to add to the network.
         """
+        function_name = None
         if node.logical_function is not None:
-            if node.logical_function.__name__ not in self.function_counter:
-                self.function_counter[node.logical_function.__name__] = 1
-            else:
-                self.function_counter[node.logical_function.__name__] += 1
-        if node.node_name == 'temp':
-            f_name = node.logical_function.__name__
-            f_index = self.function_counter[node.logical_function.__name__]
-            node.node_name = f'{f_name}{f_index}'.upper()
-        self.graph.add_node(node, node_name=node.node_name)
+            function_name = node.logical_function.__name__
+        node_name = self.name_function_node(function_name, node.node_name)
+        node_id = self.netlist.add_node(node_name, function_name)
+        node.attach(self, node_id)
+        self._node_views[node_id] = node
+        self.modified()
 
     def add_input_node(self, node: LogicNode):
         """
@@ -171,7 +384,8 @@ class LogicNetwork:
         Args:
             node: The node to add to the network and input node list.
         """
-        self.input_signal_node_list.append(node)
+        self.netlist.add_input(node.node_id)
+        self.modified()
 
     def add_output_node(self, node: LogicNode):
         """
@@ -180,32 +394,37 @@ class LogicNetwork:
         Args:
             node: The node to add to the network and output node list.
         """
-        self.output_signal_node_list.append(node)
+        self.netlist.add_output(node.node_id)
+        self.modified()
 
     def add_edge(self, start_node: LogicNode, end_node: LogicNode):
         """
-        Adds an edge between two nodes.
+        Adds an edge between two nodes. The signal pointers of both nodes are
+        derived from the edges.
 
         Args:
             start_node: Starting Node.
             end_node: Ending Node.
         """
-        self.graph.add_edge(start_node, end_node)
+        self.netlist.add_edge(start_node.node_id, end_node.node_id)
+        self.modified()
 
-    def get_node_by_node_name(self, name: str) -> LogicNode:
+    def get_node_by_node_name(self, name: str) -> Optional[LogicNode]:
         """
         Get's a node by it's name. We do not currently enforce unique labels
-        for each individual node, so be careful.
+        for each individual node, so be careful; the first node added with the
+        name is returned.
 
         Args:
             name: Name of the requested node.
 
         Returns:
-            LogicNode: The requested node.
+            LogicNode: The requested node, or None if there is no such node.
         """
-        for node in self.graph.nodes:
-            if node.node_name == name:
-                return node
+        node_id = self.netlist.find(name)
+        if node_id is None:
+            return None
+        return self.get_logic_node(node_id)
 
     def get_available_inputs(self) -> List[str]:
         """
@@ -217,11 +436,8 @@ class LogicNetwork:
             A list of input node names.
 
         """
-        out_list = []
         # We assume that each of these have a name.
-        for node in self.input_signal_node_list:
-            out_list.append(node.node_name)
-        return out_list
+        return [self.netlist.names[i] for i in self.netlist.input_ids]
 
     def get_available_outputs(self):
         """
@@ -233,259 +449,98 @@ class LogicNetwork:
             A list of output node names.
 
         """
-        out_list = []
         # We assume that each of these have a name.
-        for node in self.output_signal_node_list:
-            out_list.append(node.node_name)
-        return out_list
+        return [self.netlist.names[i] for i in self.netlist.output_ids]
 
     def get_logic_function_nodes(self):
         """
         Returns a list of logic function node *names*.
         """
-        out_list = []
-        for node in self.graph.nodes:
-            if node.logical_function is not None:
-                out_list.append(node)
-        return out_list
+        return [
+            self.get_logic_node(node_id)
+            for node_id in self.netlist.get_function_node_ids()
+        ]
 
     def get_number_of_inputs(self):
-        return len(self.input_signal_node_list)
+        return len(self.netlist.input_ids)
 
     def get_number_of_outputs(self):
-        return len(self.output_signal_node_list)
+        return len(self.netlist.output_ids)
 
     # ------------------------------- PARSING ----------------------------------
     def perform_nor_logic_expansion(
             self
-    ):
+    ) -> int:
         """
         If you want a visual representation of what's happening here:
         https://en.wikipedia.org/wiki/NOR_logic.
 
-        Mutates the logic graph structure in place to only use NOR gates.
-        This is needed for using things in a genetic circuit/Cello based
-        operation, so I'm explicitly requiring calling this functionality to
-        divorce the two conceptually.
+        Replaces the logic graph structure in place with one that only uses
+        two input NOR gates and NOT gates. This is needed for using things in
+        a genetic circuit/Cello based operation, so I'm explicitly requiring
+        calling this functionality to divorce the two conceptually. Identical
+        gates are shared via structural hashing. See nor_mapping.py.
+
+        Any LogicNode previously retrieved from the network is stale after
+        this call.
 
         Returns:
+            The number of gates in the mapped network.
+        """
+        self.load_netlist(map_to_nor(self.netlist))
+        return len(self.netlist.get_function_node_ids())
 
+    def optimize(
+            self,
+            passes: Optional[Sequence[Type[NetlistRewriter]]] = None,
+            max_iterations: int = 16,
+    ) -> List[PassStatistics]:
         """
-        for node in self.get_logic_function_nodes():
-            if node.logical_function.__name__ == "NOR":
-                continue
-            elif node.logical_function.__name__ == "NOT":
-                original_node: LogicNode = node
-                input_sig = original_node.input_signals[0]
-                new_node = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[input_sig, input_sig],
-                    node_name=original_node.node_name,
-                )
-                predecessor = self.graph.predecessors(original_node)
-                successor = self.graph.successors(original_node)
-                # We presume that these guys only have one. Probably safe,
-                # but we may want a len check.
-                self.graph.add_node(new_node)
-                self.graph.add_edge(predecessor, new_node)
-                self.graph.add_edge(new_node, successor)
-                self.graph.remove_edge(predecessor, original_node)
-                self.graph.remove_edge(original_node, successor)
-                self.graph.remove_node(original_node)
-            elif node.logical_function.__name__ == "OR":
-                original_node: LogicNode = node
-                input_sig_a, input_sig_b = original_node.input_signals
-                nor_one = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[input_sig_a, input_sig_b],
-                    node_name=f'{original_node.node_name}_0',
-                )
-                nor_two = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[nor_one.output_signal, nor_one.output_signal],
-                    node_name=f'{original_node.node_name}_1',
-                )
-                self.graph.add_node(nor_one)
-                self.graph.add_node(nor_two)
-                predecessor_a, predecessor_b = self.graph.predecessors(original_node)
-                successor = self.graph.successors(original_node)
-                # We presume that these guys only have one. Probably safe,
-                # but we may want a len check.
-                self.graph.add_edge(predecessor_a, nor_one)
-                self.graph.add_edge(predecessor_b, nor_one)
-                self.graph.add_edge(nor_one, nor_two)
-                self.graph.add_edge(nor_two, successor)
-                self.graph.remove_edge(predecessor_a, original_node)
-                self.graph.remove_edge(predecessor_b, original_node)
-                self.graph.remove_edge(original_node, successor)
-                self.graph.remove_node(original_node)
-            elif node.logical_function.__name__ == "AND":
-                original_node: LogicNode = node
-                input_sig_a, input_sig_b = original_node.input_signals
-                nor_one = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[input_sig_a, input_sig_a],
-                    node_name=f'{original_node.node_name}_0',
-                )
-                nor_two = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[input_sig_b, input_sig_b],
-                    node_name=f'{original_node.node_name}_1',
-                )
-                nor_three = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[nor_one.output_signal, nor_two.output_signal],
-                    node_name=f'{original_node.node_name}_2',
-                )
+        Runs the logic optimization pipeline over the network in place:
+        wire sweeping, double inversion collapse, constant propagation, and
+        dead gate removal, repeated until none of them changes anything. The
+        inputs, outputs, and truth table of the network are unchanged. See
+        optimization.py.
 
-                self.graph.add_node(nor_one)
-                self.graph.add_node(nor_two)
-                self.graph.add_node(nor_three)
-                predecessor_a, predecessor_b = self.graph.predecessors(original_node)
-                successor = self.graph.successors(original_node)
-                # We presume that these guys only have one. Probably safe,
-                # but we may want a len check.
-                self.graph.add_edge(predecessor_a, nor_one)
-                self.graph.add_edge(predecessor_b, nor_two)
-                self.graph.add_edge(nor_one, nor_three)
-                self.graph.add_edge(nor_two, nor_three)
-                self.graph.add_edge(nor_three, successor)
-                self.graph.remove_edge(predecessor_a, original_node)
-                self.graph.remove_edge(predecessor_b, original_node)
-                self.graph.remove_node(original_node)
-            elif node.logical_function.__name__ == "NAND":
-                original_node: LogicNode = node
-                input_sig_a, input_sig_b = original_node.input_signals
-                nor_one = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[input_sig_a, input_sig_a],
-                    node_name=f'{original_node.node_name}_0',
-                )
-                nor_two = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[input_sig_b, input_sig_b],
-                    node_name=f'{original_node.node_name}_1',
-                )
-                nor_three = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[nor_one.output_signal, nor_two.output_signal],
-                    node_name=f'{original_node.node_name}_2',
-                )
-                nor_four = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[nor_three.output_signal, nor_three.output_signal],
-                    node_name=f'{original_node.node_name}_3',
-                )
-                self.graph.add_node(nor_one)
-                self.graph.add_node(nor_two)
-                self.graph.add_node(nor_three)
-                self.graph.add_node(nor_four)
-                predecessor_a, predecessor_b = self.graph.predecessors(original_node)
-                successor = self.graph.successors(original_node)
-                # We presume that these guys only have one. Probably safe,
-                # but we may want a len check.
-                self.graph.add_edge(predecessor_a, nor_one)
-                self.graph.add_edge(predecessor_b, nor_two)
-                self.graph.add_edge(nor_one, nor_three)
-                self.graph.add_edge(nor_two, nor_three)
-                self.graph.add_edge(nor_three, nor_four)
-                self.graph.add_edge(nor_four, successor)
-                self.graph.remove_edge(predecessor_a, original_node)
-                self.graph.remove_edge(predecessor_b, original_node)
-                self.graph.remove_edge(original_node, successor)
-                self.graph.remove_node(original_node)
-            elif node.logical_function.__name__ == "XNOR":
-                original_node: LogicNode = node
-                input_sig_a, input_sig_b = original_node.input_signals
-                nor_one = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[input_sig_a, input_sig_b],
-                    node_name=f'{original_node.node_name}_0',
-                )
-                nor_two = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[input_sig_a, nor_one.output_signal],
-                    node_name=f'{original_node.node_name}_1',
-                )
-                nor_three = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[input_sig_b, nor_one.output_signal],
-                    node_name=f'{original_node.node_name}_2',
-                )
-                nor_four = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[nor_two.output_signal, nor_three.output_signal],
-                    node_name=f'{original_node.node_name}_3',
-                )
-                self.graph.add_node(nor_one)
-                self.graph.add_node(nor_two)
-                self.graph.add_node(nor_three)
-                self.graph.add_node(nor_four)
-                predecessor_a, predecessor_b = self.graph.predecessors(original_node)
-                successor = self.graph.successors(original_node)
-                # We presume that these guys only have one. Probably safe,
-                # but we may want a len check.
-                self.graph.add_edge(predecessor_a, nor_one)
-                self.graph.add_edge(predecessor_b, nor_two)
-                self.graph.add_edge(predecessor_a, nor_two)
-                self.graph.add_edge(predecessor_b, nor_three)
-                self.graph.add_edge(nor_one, nor_two)
-                self.graph.add_edge(nor_one, nor_three)
-                self.graph.add_edge(nor_two, nor_four)
-                self.graph.add_edge(nor_three, nor_four)
-                self.graph.add_edge(nor_four, successor)
-                self.graph.remove_edge(predecessor_a, original_node)
-                self.graph.remove_edge(predecessor_b, original_node)
-                self.graph.remove_edge(original_node, successor)
-                self.graph.remove_node(original_node)
-            elif node.logical_function.__name__ == "XOR":
-                original_node: LogicNode = node
-                input_sig_a, input_sig_b = original_node.input_signals
-                nor_one = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[input_sig_a, input_sig_b],
-                    node_name=f'{original_node.node_name}_0',
-                )
-                nor_two = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[input_sig_a, nor_one.output_signal],
-                    node_name=f'{original_node.node_name}_1',
-                )
-                nor_three = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[input_sig_b, nor_one.output_signal],
-                    node_name=f'{original_node.node_name}_2',
-                )
-                nor_four = LogicNode(
-                    logical_function=NOR,
-                    input_signals=[nor_two.output_signal, nor_three.output_signal],
-                    node_name=f'{original_node.node_name}_3',
-                )
-                self.graph.add_node(nor_one)
-                self.graph.add_node(nor_two)
-                self.graph.add_node(nor_three)
-                self.graph.add_node(nor_four)
-                predecessor_a, predecessor_b = self.graph.predecessors(original_node)
-                successor = self.graph.successors(original_node)
-                # We presume that these guys only have one. Probably safe,
-                # but we may want a len check.
-                self.graph.add_edge(predecessor_a, nor_one)
-                self.graph.add_edge(predecessor_b, nor_two)
-                self.graph.add_edge(predecessor_a, nor_two)
-                self.graph.add_edge(predecessor_b, nor_three)
-                self.graph.add_edge(nor_one, nor_two)
-                self.graph.add_edge(nor_one, nor_three)
-                self.graph.add_edge(nor_two, nor_four)
-                self.graph.add_edge(nor_three, nor_four)
-                self.graph.add_edge(nor_four, successor)
-                self.graph.remove_edge(predecessor_a, original_node)
-                self.graph.remove_edge(predecessor_b, original_node)
-                self.graph.remove_edge(original_node, successor)
-                self.graph.remove_node(original_node)
+        Any LogicNode previously retrieved from the network is stale after
+        this call.
+
+        Args:
+            passes: The passes to run on every iteration. Defaults to all of
+                them.
+            max_iterations: Upper bound on the number of iterations.
 
+        Returns:
+            The statistics of every pass that was run, in order.
+        """
+        netlist, statistics = optimize_netlist(
+            self.netlist,
+            passes=passes if passes is not None else DEFAULT_PASSES,
+            max_iterations=max_iterations,
+        )
+        self.load_netlist(netlist)
+        return statistics
 
     def parse_verilog_file(
             self,
+    ):
+        """
+        Parses the input verilog file into a networkx datastructure. Flat,
+        gate-level structural verilog is handled by the native parser, and
+        anything else falls back to pyverilog.
+        """
+        if self.use_native_parser:
+            try:
+                netlist = parse_structural_verilog_file(self.verilog_fp)
+            except UnsupportedVerilogError:
+                pass
+            else:
+                self.deserialize_netlist(netlist)
+                return
+        self.parse_verilog_file_with_pyverilog()
+
+    def parse_verilog_file_with_pyverilog(
+            self,
     ):
         """
         Uses Pyverilog (https://github.com/PyHDI/Pyverilog) to parse input
@@ -493,15 +548,7 @@ class LogicNetwork:
         now, and should get expanded as we start to handle more complex
         circuits.
         """
-        # Note the list containing the filepath. This will give you a very
-        # confusing error message if not wrapped in an iterable even though
-        # there documentation and code make it very clear you should be able to
-        # do both.
-        ast, directives = parse(
-            [self.verilog_fp],
-            preprocess_include=[],
-            preprocess_define=[],
-        )
+        ast = parse_verilog_ast(self.verilog_fp)
         # We're only doing sequential logic for this first iteration for a
         # variety of reasons. I need to understand higher-level standards
         # within the hardware description field before I go too ham on this.
@@ -590,12 +637,8 @@ class LogicNetwork:
                 node_logical_function = string_to_logic_function(
                     str(type(input_attributes).__name__)
                 )
-                instantiated_node = LogicNode(logical_function=node_logical_function)
-                self.add_node(instantiated_node)
-                # Should be the 'further' node in the network as it was just
-                # added. Might want to think about extending this to have
-                #
-                ref_node = list(self.graph.nodes.items())[-1][0]
+                ref_node = LogicNode(logical_function=node_logical_function)
+                self.add_node(ref_node)
                 # TODO: How does this handle three inputs? Probably custom
                 # based on class. Test with Struct.
                 if hasattr(input_attributes, "left") and hasattr(
@@ -612,11 +655,66 @@ class LogicNetwork:
                     output_id = item.left.var.name
                     out_node = self.get_node_by_node_name(output_id)
                     self.add_edge(ref_node, out_node)
-                    # Then we add all of the pointers
-                    left_node.output_signal = ref_node
-                    right_node.output_signal = ref_node
-                    ref_node.input_signals = [left_node, right_node]
-                    out_node.input_signals = [ref_node]
+
+    def serialize_netlist(self) -> dict:
+        """
+        Flattens the network into plain python types so it can be persisted,
+        e.g. as JSON in the parse cache.
+
+        Returns:
+            Dictionary containing the nodes, edges, inputs, and outputs of the
+            network, with nodes referenced by their index.
+        """
+        return self.netlist.serialize()
+
+    def load_netlist(self, netlist: dict):
+        """
+        Replaces the entire network with a serialized netlist.
+
+        Args:
+            netlist: A serialized netlist, see serialize_netlist.
+        """
+        self.function_counter = {}
+        self.netlist = CompactNetlist()
+        self._node_views = {}
+        self.deserialize_netlist(netlist)
+
+    def load_binary_netlist(self, input_fp: str):
+        """
+        Replaces the entire network with a netlist saved in the binary netlist
+        format. The file is memory mapped rather than parsed.
+
+        Args:
+            input_fp: Filepath of the binary netlist.
+        """
+        self.function_counter = {}
+        self.netlist = CompactNetlist.read_binary(input_fp)
+        self._node_views = {}
+        self.modified()
+
+    def deserialize_netlist(self, netlist: dict):
+        """
+        Rebuilds the network from the output of serialize_netlist. This
+        writes straight into the compact netlist; no LogicNode is created
+        until one is asked for.
+
+        Args:
+            netlist: A serialized netlist. Nodes without a name are labelled
+                by their logical function, e.g. NOR3.
+        """
+        offset = self.netlist.number_of_nodes()
+        for node_name, function_name in netlist["nodes"]:
+            self.netlist.add_node(
+                self.name_function_node(function_name, node_name),
+                function_name,
+            )
+        for start_index, end_index in netlist["edges"]:
+            self.netlist.add_edge(offset + start_index, offset + end_index)
+        for node_index in netlist["inputs"]:
+            self.netlist.add_input(offset + node_index)
+        for node_index in netlist["outputs"]:
+            self.netlist.add_output(offset + node_index)
+        self.modified()
 
     # ---------------------------- LOGIC SIMULATION ----------------------------
 
@@ -636,6 +734,45 @@ class LogicNetwork:
         Returns:
             The logical output given the inputs to the circuit. (True | False)
         """
+        self.set_input_signals(input_signals)
+        output_node = self.output_signal_node_list[output_index]
+        res = self.perform_traversal(output_node)
+        return res
+
+    def get_logical_outputs(
+            self,
+            input_signals: Union[List[bool], Tuple[bool], Dict[str, bool]],
+    ) -> List[bool]:
+        """
+        Get the boolean value of every output of the CircuitNetwork given the
+        passed in input signals. The evaluation cache is shared across the
+        outputs, so logic common to several outputs is only evaluated once.
+
+        Args:
+            input_signals: The input signals into the circuit. The various
+            types are coerced into a uniform approach within the function.
+
+        Returns:
+            The logical outputs, in the same order as get_available_outputs.
+        """
+        self.set_input_signals(input_signals)
+        memo = {}
+        return [
+            self.perform_traversal(output_node, memo=memo)
+            for output_node in self.output_signal_node_list
+        ]
+
+    def set_input_signals(
+            self,
+            input_signals: Union[List[bool], Tuple[bool], Dict[str, bool]],
+    ):
+        """
+        Sets the boolean value of each of the input nodes.
+
+        Args:
+            input_signals: The input signals into the circuit. The various
+            types are coerced into a uniform approach within the function.
+        """
         available_inputs = self.get_available_inputs()
         if len(input_signals) != len(available_inputs):
             raise RuntimeError(
@@ -654,101 +791,363 @@ class LogicNetwork:
                     input_signals,
             ):
                 node.boolean_value = signal_value
-        # We then run the graph to get the final output.
-        # This assumes that we have a singular output. Our approach below is
-        # amenable to multiple outputs, but I need to do some additional
-        # research before I pursue it.
-        output_node = self.output_signal_node_list[output_index]
-        res = self.perform_traversal(output_node)
-        return res
 
-    def generate_truth_table(self):
-        logical_inputs = list(
-            itertools.product(
-                [True, False],
-                repeat=len(self.get_available_inputs())
+    def get_simulation_schedule(self) -> LevelizedSchedule:
+        """
+        Flattens the network into a levelized schedule for vectorized
+        simulation. The schedule is cached and rebuilt only after the network
+        is modified.
+
+        Returns:
+            The levelized schedule for this network.
+        """
+        return self.netlist.get_schedule()
+
+    def get_event_driven_simulator(self) -> EventDrivenSimulator:
+        """
+        Builds an event driven simulator over the levelized schedule of the
+        network.
+
+        Returns:
+            A fresh simulator for this network.
+        """
+        return EventDrivenSimulator(self.get_simulation_schedule())
+
+    def simulate(self, input_matrix: np.ndarray) -> np.ndarray:
+        """
+        Simulates every output of the network for many input rows at once.
+
+        Args:
+            input_matrix: Boolean array of shape (number of inputs, rows), with
+                inputs in the same order as get_available_inputs.
+
+        Returns:
+            Boolean array of shape (number of outputs, rows).
+        """
+        return self.get_simulation_schedule().evaluate_outputs(input_matrix)
+
+    def generate_truth_table(self, simulation_mode: str = "levelized"):
+        """
+        Generates the full truth table of the network.
+
+        Args:
+            simulation_mode: 'levelized' simulates every input combination in
+                a single vectorized pass. 'event_driven' walks the rows in
+                Gray code order and only re-evaluates the fanout cone of the
+                input that flips, see EventDrivenSimulator.
+
+        Returns:
+            Array of shape (2 ** inputs, inputs + outputs). Rows are implicitly
+            in canonical discrete mathematics ordering, i.e. the same ordering
+            as itertools.product([True, False], repeat=inputs).
+        """
+        input_matrix = canonical_input_matrix(self.get_number_of_inputs())
+        if simulation_mode == "levelized":
+            output_matrix = self.simulate(input_matrix)
+        elif simulation_mode == "event_driven":
+            output_matrix = self.get_event_driven_simulator().evaluate_gray_code()
+        else:
+            raise RuntimeError(
+                f"Unknown simulation mode {simulation_mode}. Please investigate."
             )
+        return np.vstack([input_matrix, output_matrix]).T.astype(float)
+
+    def iterate_truth_table(
+            self,
+            chunk_size: int = 1 << 16,
+            start: int = 0,
+            stop: Optional[int] = None,
+    ) -> Iterator[TruthTableChunk]:
+        """
+        Streams the truth table of the network in blocks of rows, in canonical
+        ordering. Each block is simulated in a single vectorized pass, and
+        only one block is held in memory at a time, so arbitrarily large
+        tables can be consumed and the consumer can stop whenever it likes.
+
+        Args:
+            chunk_size: Number of rows per block.
+            start: First row to generate.
+            stop: One past the last row to generate. Defaults to the full
+                table.
+
+        Yields:
+            Blocks of the truth table.
+        """
+        num_inputs = self.get_number_of_inputs()
+        if stop is None:
+            stop = 2 ** num_inputs
+        if chunk_size < 1:
+            raise RuntimeError(f"Invalid chunk size {chunk_size}.")
+        schedule = self.get_simulation_schedule()
+        for chunk_start in range(start, stop, chunk_size):
+            chunk_stop = min(chunk_start + chunk_size, stop)
+            input_matrix = canonical_input_matrix(num_inputs, chunk_start, chunk_stop)
+            yield TruthTableChunk(
+                start=chunk_start,
+                input_matrix=input_matrix,
+                output_matrix=schedule.evaluate_outputs(input_matrix),
+            )
+
+    def get_truth_table(self) -> TruthTable:
+        """
+        Generates the full truth table of the network as packed bit vectors,
+        one bit per row and output. See truth_table.py.
+
+        Returns:
+            The truth table of the network.
+        """
+        # Packed block by block, so the unpacked table never exists in full.
+        packed_blocks = [
+            np.packbits(chunk.output_matrix, axis=1)
+            for chunk in self.iterate_truth_table()
+        ]
+        return TruthTable(
+            num_inputs=self.get_number_of_inputs(),
+            packed_outputs=np.concatenate(packed_blocks, axis=1),
+            input_names=self.get_available_inputs(),
+            output_names=self.get_available_outputs(),
         )
-        # These are implicitly in canonical discrete mathematics ordering for
-        # construction of a truth table.
-        out_array = np.zeros(
-            shape=(
-                len(logical_inputs),
-                self.get_number_of_inputs() + self.get_number_of_outputs(),
+
+    def write_truth_table(
+            self,
+            output_fp: str,
+            binary: bool = False,
+            chunk_size: int = 1 << 16,
+    ):
+        """
+        Streams the truth table of the network straight to a file, one block
+        at a time.
+
+        Args:
+            output_fp: Filepath to write to.
+            binary: Whether to write a packed bit stream (see
+                write_truth_table_binary) instead of CSV.
+            chunk_size: Number of rows per block. Must be a multiple of eight
+                for binary output.
+        """
+        chunks = self.iterate_truth_table(chunk_size=chunk_size)
+        if binary:
+            write_truth_table_binary(output_fp, chunks)
+        else:
+            write_truth_table_csv(
+                output_fp,
+                chunks,
+                input_names=self.get_available_inputs(),
+                output_names=self.get_available_outputs(),
             )
+
+    def generate_truth_vector(
+            self,
+            input_array: Optional[Union[np.ndarray, TruthTable]] = None,
+            output_index: int = 0,
+    ):
+        """
+        Extracts the column of the truth table for a single output.
+
+        Args:
+            input_array: A truth table as produced by generate_truth_table or
+                get_truth_table. If not passed, the truth table is simulated.
+            output_index: Which output to extract.
+
+        Returns:
+            The truth vector for the requested output.
+        """
+        if input_array is None:
+            input_array = self.get_truth_table()
+        if isinstance(input_array, TruthTable):
+            return input_array.get_truth_vector(output_index)
+        input_offset = self.get_number_of_inputs()
+        return input_array[:, input_offset + output_index]
+
+    def equivalent(
+            self,
+            other: "LogicNetwork",
+            exhaustive_limit: int = 16,
+            seed: Optional[int] = 0,
+    ) -> EquivalenceResult:
+        """
+        Checks whether two networks compute the same function, matching
+        inputs and outputs by name. Random vector signatures refute most
+        mismatches cheaply, and only agreeing networks are proven exactly.
+        See equivalence.py.
+
+        Args:
+            other: The network to compare against.
+            exhaustive_limit: Up to this many inputs the proof enumerates the
+                truth table, past it BDDs are built instead.
+            seed: Seed of the random signature rows.
+
+        Returns:
+            The result of the check, which is truthy if the networks are
+            equivalent and otherwise carries a counterexample.
+        """
+        return check_equivalence(
+            self.netlist,
+            other.netlist,
+            exhaustive_limit=exhaustive_limit,
+            seed=seed,
         )
-        for logical_input_index, logical_input in enumerate(logical_inputs):
-            input_offset = len(logical_input)
-            for truth_index, truth_value in enumerate(logical_input):
-                out_array[logical_input_index][truth_index] = truth_value
-            for logical_output_index in range(self.get_number_of_outputs()):
-                res = self.get_logical_output(logical_input, logical_output_index)
-                out_array[logical_input_index][input_offset + logical_output_index] = res
-        return out_array
 
-    def generate_truth_vector(self, input_array: np.ndarray, output_index: int):
+    def get_random_vector_sampler(
+            self,
+            seed: Optional[int] = None,
+    ) -> RandomVectorSampler:
         """
+        Builds a Monte Carlo sampler over the levelized schedule of the
+        network, for networks too wide to enumerate.
 
         Args:
-            input_array:
-            output_index:
+            seed: Seed of the random number generator.
 
         Returns:
+            A sampler for this network.
+        """
+        return RandomVectorSampler(self.get_simulation_schedule(), seed=seed)
 
+    def estimate_output_balance(
+            self,
+            confidence: float = 0.95,
+            tolerance: float = 0.01,
+            seed: Optional[int] = None,
+            max_samples: int = 1 << 24,
+    ) -> List[ProportionEstimate]:
         """
-        logical_inputs = list(
-            itertools.product(
-                [True, False],
-                repeat=len(self.get_available_inputs())
-            )
+        Estimates the fraction of the truth table where each output is ON from
+        random input vectors, sampling until every confidence interval is
+        within the tolerance.
+
+        Args:
+            confidence: Confidence level of the intervals.
+            tolerance: Requested half width of every interval.
+            seed: Seed of the random number generator.
+            max_samples: Upper bound on the number of rows drawn.
+
+        Returns:
+            The estimated ON fraction of every output.
+        """
+        return self.get_random_vector_sampler(seed).estimate_output_balance(
+            output_names=self.get_available_outputs(),
+            confidence=confidence,
+            tolerance=tolerance,
+            max_samples=max_samples,
         )
-        input_offset = len(logical_inputs[0])
-        return input_array[input_offset + output_index, :].T
+
+    def get_symbolic_truth_function(
+            self,
+            manager: Optional[BDDManager] = None,
+    ) -> SymbolicTruthFunction:
+        """
+        Builds the truth function of every output as a reduced ordered binary
+        decision diagram. Unlike generate_truth_table this never enumerates
+        the input space, so it remains usable for circuits with many inputs
+        as long as their logic has a compact BDD. See bdd.py.
+
+        Args:
+            manager: The BDD manager to build in. Build several networks in
+                the same manager to check them for equivalence.
+
+        Returns:
+            The symbolic truth function of the network.
+        """
+        return SymbolicTruthFunction.from_netlist(self.netlist, manager=manager)
 
     def perform_traversal(
             self,
             root_node: LogicNode,
+            memo: Optional[Dict[int, bool]] = None,
     ) -> bool:
         """
-        Recursive function to parse the outputs of all of the nodes of the
-        network. This presumes a fairly rigid tree-like structure at the
-        moment, and should be expanded in the future.
+        Evaluates the network backwards from the passed in node for the input
+        values currently set on the input nodes.
+
+        The network is treated as a DAG rather than a tree. Each node is
+        evaluated exactly once and its value is cached in the memo, so shared
+        subexpressions and nodes that fan out to several successors do not get
+        re-evaluated once per path that reaches them. The walk uses an explicit
+        stack, so deep netlists do not run into the recursion limit.
+
+        Args:
+            root_node: The node to evaluate.
+            memo: Cache of already evaluated node IDs. Pass the same dictionary
+                when evaluating several nodes for the same input vector to
+                share work between them. A fresh cache is used if not passed.
 
         Returns:
             Boolean output of the node being evaluated.
 
         """
-        if root_node.input_signals is not None:
-            # You could imagine here that we could just iterate over the number
-            # of input signals, but I'm limiting it for the moment.
-            if len(root_node.input_signals) == 1:
-                progenitor = root_node.input_signals[0]
-                # A NOT is evaluated here.
-                # if root_node.logical_function is not None:
-                #     return root_node.logical_function(
-                #         self.perform_traversal(progenitor)
-                #     )
-                # else:
-                return self.perform_traversal(progenitor)
-            if len(root_node.input_signals) > 1:
-                # We assume that if you have multiple inputs you are something
-                # that performs some sort of logic.
-                left = root_node.input_signals[0]
-                right = root_node.input_signals[1]
-                l_out = self.perform_traversal(left)
-                r_out = self.perform_traversal(right)
-                return root_node.logical_function(l_out, r_out)
-        # If we get here, we assume that we're an input node and we
-        # just need to return our value.
-        else:
-            return root_node.boolean_value
+        if memo is None:
+            memo = {}
+        arrays = self.netlist.get_arrays()
+        fanin_offsets = arrays["fanin_offsets"]
+        fanin_indices = arrays["fanin_indices"]
+        expanded = set()
+        root_id = root_node.node_id
+        stack = [root_id]
+        while stack:
+            node_id = stack[-1]
+            if node_id in memo:
+                stack.pop()
+                continue
+            drivers = fanin_indices[
+                fanin_offsets[node_id]:fanin_offsets[node_id + 1]
+            ].tolist()
+            pending = [driver for driver in drivers if driver not in memo]
+            if pending:
+                # If we're revisiting a node and its drivers still aren't
+                # resolved, one of them depends on the node itself.
+                if node_id in expanded:
+                    raise RuntimeError(
+                        f"Node {self.netlist.names[node_id]} is part of a "
+                        f"combinational loop and cannot be evaluated. Please "
+                        f"investigate."
+                    )
+                expanded.add(node_id)
+                stack.extend(pending)
+                continue
+            stack.pop()
+            if drivers:
+                # Ports and other function-less nodes simply pass their
+                # driver on.
+                memo[node_id] = evaluate_gate(
+                    self.netlist.get_gate_type(node_id) or "BUFFER",
+                    [memo[d] for d in drivers],
+                )
+            else:
+                # Inputs return their value, undriven nodes read as False.
+                # Only nodes that have been handed out can carry a value.
+                node = self._node_views.get(node_id)
+                memo[node_id] = node is not None and bool(node.boolean_value)
+        return memo[root_id]
+
+    @staticmethod
+    def evaluate_node(node: LogicNode, input_values: List[bool]) -> bool:
+        """
+        Evaluates a single node given the values of the nodes driving it.
+
+        Args:
+            node: The node to evaluate.
+            input_values: The boolean values of each node driving this node.
+
+        Returns:
+            Boolean output of the node.
+        """
+        if not input_values:
+            # If we get here, we assume that we're an input node and we
+            # just need to return our value. Undriven nodes read as False.
+            return bool(node.boolean_value)
+        if node.logical_function is None:
+            # Ports and other function-less nodes simply pass their driver on.
+            return evaluate_gate("BUFFER", input_values)
+        return evaluate_gate(node.logical_function.__name__, input_values)
 
     # -------------------------------- UTILITY ---------------------------------
     @staticmethod
     def cleanup():
         """
-        Pyverilog is messy and doesn't clean up after itself. This should
-        probably be run at the exit of the primary Ibis execution as well.
+        Pyverilog is messy and doesn't clean up after itself. Parsing now
+        happens within the Ibis cache directory, so this only clears remnants
+        left in the working directory by older versions.
         """
         cleanup_list = ["parser.out", "parsetab.py"]
         for file in cleanup_list:
@@ -759,11 +1158,14 @@ class LogicNetwork:
                     print("Failed to clear prior verilog parsing remnants.")
 
     def rank_nodes(self):
-        for node_name in self.get_available_outputs():
-            node = self.get_node_by_node_name(node_name)
-            # All input nodes have a rank of zero.
-            node.node_rank = 0
-            # Should be unique.
+        """
+        Sets the rank of every node to its level in the simulation schedule.
+        All input nodes have a rank of zero, and every other node sits one
+        above its deepest driver.
+        """
+        node_levels = self.get_simulation_schedule().node_levels.tolist()
+        for node_id, node_level in enumerate(node_levels):
+            self.get_logic_node(node_id).node_rank = node_level
 
     def plot_graph(
             self,
@@ -807,5 +1209,17 @@ class LogicNetwork:
             self,
             output_fp: str
     ):
-        simple_graph = nx.convert_node_labels_to_integers(self.graph)
-        nx.write_edgelist(simple_graph, output_fp, data=False)
+        """
+        Writes the edges of the network as a plain edgelist of node IDs, or,
+        if the filepath ends in BINARY_NETLIST_SUFFIX, the whole netlist in
+        the binary netlist format.
+
+        Args:
+            output_fp: Filepath to write the edgelist to.
+        """
+        if output_fp.endswith(BINARY_NETLIST_SUFFIX):
+            self.netlist.write_binary(output_fp)
+            return
+        with open(output_fp, "w") as output_file:
+            for start, end in self.netlist.iterate_edges():
+                output_file.write(f"{start} {end}\n")
@@ -0,0 +1,555 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Compact, integer indexed storage for logic networks.
+
+Nodes are plain integer IDs. Gate types live in a NumPy array, connectivity is
+kept in CSR (compressed sparse row) form in both directions, and a hash index
+maps node names to IDs. A 100k gate netlist is a handful of flat arrays rather
+than hundreds of thousands of Python objects, and every lookup is O(1).
+
+Netlists are saved in a versioned binary format that holds exactly those arrays,
+so loading one is a matter of memory mapping the file rather than parsing it.
+The mapped arrays back the loaded netlist until it is first modified, and names
+are only decoded once they are asked for.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+from array import array
+import struct
+import sys
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import networkx as nx
+import numpy as np
+
+from .simulation import LevelizedSchedule
+
+# NONE is a node without a logical function, e.g. a port or a single wire.
+GATE_TYPES = ("NONE", "WIRE", "NOT", "AND", "OR", "XOR", "NAND", "NOR", "XNOR")
+GATE_CODES = {gate_type: code for code, gate_type in enumerate(GATE_TYPES)}
+
+# Every gate is a reduction across its fanin followed by an optional inversion,
+# matching the simulation kernels. Function-less nodes and WIRE pass their
+# drivers on, and NOT is the single input case of NOR.
+GATE_REDUCTIONS = {
+    None: ("OR", False),
+    "WIRE": ("OR", False),
+    "NOT": ("OR", True),
+    "AND": ("AND", False),
+    "OR": ("OR", False),
+    "XOR": ("XOR", False),
+    "NAND": ("AND", True),
+    "NOR": ("OR", True),
+    "XNOR": ("XOR", True),
+}
+
+
+# ------------------------------ BINARY FORMAT ---------------------------------
+# A fixed header followed by the sections below, in order, each padded to a
+# multiple of eight bytes so every array is aligned within the file.
+BINARY_NETLIST_MAGIC = b"IBISNETL"
+BINARY_NETLIST_VERSION = 1
+BINARY_NETLIST_SUFFIX = ".ibisnet"
+# Magic, version, nodes, edges, inputs, outputs, bytes of name data.
+BINARY_NETLIST_HEADER = struct.Struct("<8sI4xQQQQQ")
+
+
+def get_binary_sections(
+        num_nodes: int,
+        num_edges: int,
+        num_inputs: int,
+        num_outputs: int,
+        num_name_bytes: int,
+) -> List[Tuple[str, np.dtype, int]]:
+    """
+    The (name, dtype, length) of every section of a binary netlist, in order.
+    """
+    return [
+        ("gate_codes", np.dtype(np.int8), num_nodes),
+        ("named", np.dtype(np.uint8), num_nodes),
+        ("edge_sources", np.dtype("<i8"), num_edges),
+        ("edge_targets", np.dtype("<i8"), num_edges),
+        ("fanin_offsets", np.dtype("<i8"), num_nodes + 1),
+        ("fanin_indices", np.dtype("<i8"), num_edges),
+        ("fanout_offsets", np.dtype("<i8"), num_nodes + 1),
+        ("fanout_indices", np.dtype("<i8"), num_edges),
+        ("input_ids", np.dtype("<i8"), num_inputs),
+        ("output_ids", np.dtype("<i8"), num_outputs),
+        ("name_data", np.dtype(np.uint8), num_name_bytes),
+    ]
+
+
+def pad_to_word(num_bytes: int) -> int:
+    return -num_bytes % 8
+
+
+def decode_names(name_data: np.ndarray, named: np.ndarray) -> List[Optional[str]]:
+    """
+    Splits the NUL separated name blob of a binary netlist, with None for
+    every unnamed node.
+    """
+    names = bytes(name_data).decode("utf-8").split("\0")[:len(named)]
+    for node_id in np.flatnonzero(named == 0).tolist():
+        names[node_id] = None
+    return names
+
+
+class CompactNetlist:
+    def __init__(self):
+        """
+        Append-only storage for a logic network. Nodes and edges are collected
+        into compact growable buffers, and the NumPy/CSR view is built on first
+        access and rebuilt only after the netlist changes.
+
+        Duplicate edges are ignored, the same as a networkx DiGraph.
+        """
+        self._names: Optional[List[Optional[str]]] = []
+        self._name_index: Optional[Dict[str, int]] = {}
+        # The name blob and named flags of a loaded netlist, until decoded.
+        self._name_sections: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self.input_ids: List[int] = []
+        self.output_ids: List[int] = []
+        # Growable buffers, or the read-only arrays of a loaded netlist until
+        # it is first modified.
+        self._gate_codes: Union[array, np.ndarray] = array("b")
+        self._edge_sources: Union[array, np.ndarray] = array("q")
+        self._edge_targets: Union[array, np.ndarray] = array("q")
+        self._arrays: Optional[Dict[str, np.ndarray]] = None
+        self._schedule: Optional[LevelizedSchedule] = None
+
+    @property
+    def names(self) -> List[Optional[str]]:
+        """
+        The name of every node, or None for unnamed nodes.
+        """
+        if self._names is None:
+            self._names = decode_names(*self._name_sections)
+            self._name_sections = None
+        return self._names
+
+    @property
+    def name_index(self) -> Dict[str, int]:
+        """
+        Maps every name to the first node that carries it.
+        """
+        if self._name_index is None:
+            self._name_index = {}
+            for node_id, name in enumerate(self.names):
+                if name is not None:
+                    self._name_index.setdefault(name, node_id)
+        return self._name_index
+
+    # ------------------------------ CONSTRUCTION ------------------------------
+    def make_mutable(self):
+        """
+        Copies the arrays backing a loaded netlist into growable buffers.
+        Called before the first modification, so a netlist that is only read
+        never copies them.
+        """
+        if isinstance(self._gate_codes, np.ndarray):
+            self._gate_codes = array("b", self._gate_codes.tobytes())
+            self._edge_sources = array("q", self._edge_sources.tobytes())
+            self._edge_targets = array("q", self._edge_targets.tobytes())
+
+    def invalidate(self):
+        """
+        Drops every derived structure. Called on any modification.
+        """
+        self._arrays = None
+        self._schedule = None
+
+    def add_node(
+            self,
+            node_name: Optional[str],
+            gate_type: Optional[str] = None,
+    ) -> int:
+        """
+        Adds a node to the netlist.
+
+        Args:
+            node_name: Name of the node, or None for an unnamed node. Names
+                are not required to be unique, but the name index only ever
+                points at the first node added with a given name.
+            gate_type: The logical function of the node, e.g. 'NOR', or None
+                for a node without one.
+
+        Returns:
+            The ID of the new node.
+        """
+        self.make_mutable()
+        node_id = self.number_of_nodes()
+        self.names.append(node_name)
+        if node_name is not None:
+            self.name_index.setdefault(node_name, node_id)
+        self._gate_codes.append(GATE_CODES[gate_type or "NONE"])
+        self.invalidate()
+        return node_id
+
+    def add_edge(self, start_id: int, end_id: int):
+        """
+        Connects two nodes.
+
+        Args:
+            start_id: ID of the driving node.
+            end_id: ID of the driven node.
+        """
+        self.make_mutable()
+        self._edge_sources.append(start_id)
+        self._edge_targets.append(end_id)
+        self.invalidate()
+
+    def add_input(self, node_id: int):
+        self.input_ids.append(node_id)
+        self.invalidate()
+
+    def add_output(self, node_id: int):
+        self.output_ids.append(node_id)
+        self.invalidate()
+
+    def rename_node(self, node_id: int, node_name: str):
+        """
+        Renames a node, keeping the name index consistent.
+
+        Args:
+            node_id: ID of the node.
+            node_name: The new name.
+        """
+        old_name = self.names[node_id]
+        self.names[node_id] = node_name
+        if self.name_index.get(old_name) == node_id:
+            del self.name_index[old_name]
+            # Hand the old name to the next node that carries it, if any.
+            for other_id, other_name in enumerate(self.names):
+                if other_name == old_name:
+                    self.name_index[old_name] = other_id
+                    break
+        if node_name is not None:
+            self.name_index.setdefault(node_name, node_id)
+
+    # -------------------------------- ACCESSORS -------------------------------
+    def get_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Builds (or returns the cached) NumPy view of the netlist.
+
+        Returns:
+            Dictionary of arrays: gate_codes, edge_sources, edge_targets, and
+            the CSR fanin_offsets/fanin_indices and fanout_offsets/
+            fanout_indices. The drivers of node i are
+            fanin_indices[fanin_offsets[i]:fanin_offsets[i + 1]], in the order
+            their edges were added.
+        """
+        if self._arrays is None:
+            num_nodes = self.number_of_nodes()
+            # Copies, so the growable buffers are never pinned by a view.
+            sources = np.frombuffer(self._edge_sources, dtype=np.int64).copy()
+            targets = np.frombuffer(self._edge_targets, dtype=np.int64).copy()
+            # Duplicate edges are dropped here rather than on insertion,
+            # keeping the first of each, so no per edge index is ever held.
+            _, first = np.unique(sources * max(num_nodes, 1) + targets, return_index=True)
+            if len(first) < len(sources):
+                first.sort()
+                sources, targets = sources[first], targets[first]
+                self._edge_sources = array("q", sources.tobytes())
+                self._edge_targets = array("q", targets.tobytes())
+            fanin_order = np.argsort(targets, kind="stable")
+            fanout_order = np.argsort(sources, kind="stable")
+            fanin_offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+            fanout_offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+            np.cumsum(np.bincount(targets, minlength=num_nodes), out=fanin_offsets[1:])
+            np.cumsum(np.bincount(sources, minlength=num_nodes), out=fanout_offsets[1:])
+            self._arrays = {
+                "gate_codes": np.frombuffer(self._gate_codes, dtype=np.int8).copy(),
+                "edge_sources": sources,
+                "edge_targets": targets,
+                "fanin_offsets": fanin_offsets,
+                "fanin_indices": sources[fanin_order],
+                "fanout_offsets": fanout_offsets,
+                "fanout_indices": targets[fanout_order],
+            }
+        return self._arrays
+
+    def number_of_nodes(self) -> int:
+        return len(self._gate_codes)
+
+    def number_of_edges(self) -> int:
+        return len(self.get_arrays()["edge_sources"])
+
+    def find(self, node_name: str) -> Optional[int]:
+        """
+        Returns the ID of the first node with the passed in name, if any.
+        """
+        return self.name_index.get(node_name)
+
+    def get_unused_name(self, node_name: str) -> str:
+        """
+        Returns the passed in name if no node carries it, else the first of
+        node_name_1, node_name_2, ... that is free.
+        """
+        candidate = node_name
+        suffix = 0
+        while candidate in self.name_index:
+            suffix += 1
+            candidate = f"{node_name}_{suffix}"
+        return candidate
+
+    def get_gate_type(self, node_id: int) -> Optional[str]:
+        """
+        Returns the logical function of a node, or None if it has none.
+        """
+        gate_type = GATE_TYPES[self._gate_codes[node_id]]
+        return gate_type if gate_type != "NONE" else None
+
+    def get_fanin(self, node_id: int) -> np.ndarray:
+        arrays = self.get_arrays()
+        offsets = arrays["fanin_offsets"]
+        return arrays["fanin_indices"][offsets[node_id]:offsets[node_id + 1]]
+
+    def get_fanout(self, node_id: int) -> np.ndarray:
+        arrays = self.get_arrays()
+        offsets = arrays["fanout_offsets"]
+        return arrays["fanout_indices"][offsets[node_id]:offsets[node_id + 1]]
+
+    def get_function_node_ids(self) -> np.ndarray:
+        """
+        Returns the IDs of every node with a logical function.
+        """
+        return np.flatnonzero(self.get_arrays()["gate_codes"] != GATE_CODES["NONE"])
+
+    def get_fanin_lists(self) -> List[np.ndarray]:
+        """
+        Splits the CSR fanin into one array of drivers per node.
+        """
+        arrays = self.get_arrays()
+        return np.split(arrays["fanin_indices"], arrays["fanin_offsets"][1:-1])
+
+    def get_schedule(self) -> LevelizedSchedule:
+        """
+        Returns the (cached) levelized simulation schedule for the netlist.
+        """
+        if self._schedule is None:
+            input_set = set(self.input_ids)
+            gate_types = []
+            for node_id, code in enumerate(self._gate_codes.tolist()):
+                if code != GATE_CODES["NONE"]:
+                    gate_types.append(GATE_TYPES[code])
+                elif node_id in input_set:
+                    gate_types.append("INPUT")
+                else:
+                    gate_types.append("BUFFER")
+            self._schedule = LevelizedSchedule(
+                gate_types=gate_types,
+                fanin=self.get_fanin_lists(),
+                input_ids=self.input_ids,
+                output_ids=self.output_ids,
+            )
+        return self._schedule
+
+    def get_memory_usage(self) -> int:
+        """
+        Approximate memory held by the netlist, in bytes: the growable
+        buffers, the NumPy view, the name table and the name index. Names that
+        haven't been decoded yet count as their encoded bytes.
+        """
+        buffers = (self._gate_codes, self._edge_sources, self._edge_targets)
+        # The arrays backing a loaded netlist are part of its view.
+        usage = sum(
+            buffer.buffer_info()[1] * buffer.itemsize
+            for buffer in buffers if isinstance(buffer, array)
+        )
+        usage += sum(view.nbytes for view in self.get_arrays().values())
+        if self._names is None:
+            usage += sum(section.nbytes for section in self._name_sections)
+        else:
+            usage += sys.getsizeof(self._names) + sum(
+                sys.getsizeof(name) for name in self._names if name is not None
+            )
+        # The keys are the strings of the name table, counted above.
+        if self._name_index is not None:
+            usage += sys.getsizeof(self._name_index)
+        return usage
+
+    # ------------------------------ CONVERSION --------------------------------
+    def serialize(self) -> dict:
+        """
+        Flattens the netlist into plain python types. See
+        LogicNetwork.serialize_netlist for the format.
+        """
+        return {
+            "nodes": [
+                [name, self.get_gate_type(node_id)]
+                for node_id, name in enumerate(self.names)
+            ],
+            "edges": [
+                [int(start), int(end)]
+                for start, end in self.iterate_edges()
+            ],
+            "inputs": list(self.input_ids),
+            "outputs": list(self.output_ids),
+        }
+
+    @classmethod
+    def from_serialized(cls, netlist: dict) -> "CompactNetlist":
+        """
+        Builds a netlist from the output of serialize. Unnamed nodes are kept
+        unnamed.
+        """
+        compact = cls()
+        for node_name, gate_type in netlist["nodes"]:
+            compact.add_node(node_name, gate_type)
+        for start_id, end_id in netlist["edges"]:
+            compact.add_edge(start_id, end_id)
+        for node_id in netlist["inputs"]:
+            compact.add_input(node_id)
+        for node_id in netlist["outputs"]:
+            compact.add_output(node_id)
+        return compact
+
+    def write_binary(self, output_fp: str):
+        """
+        Saves the netlist in the binary netlist format, in a single write.
+
+        Args:
+            output_fp: Filepath to write to, conventionally ending in
+                BINARY_NETLIST_SUFFIX.
+        """
+        arrays = self.get_arrays()
+        # Names are stored as one NUL separated blob, unnamed nodes as empty
+        # names with a cleared flag. Names never decoded are written back as
+        # they were read.
+        if self._names is None:
+            name_data, named = self._name_sections
+            name_data = name_data.tobytes()
+        else:
+            name_data = "\0".join(name or "" for name in self._names).encode("utf-8")
+            named = np.array([name is not None for name in self._names], dtype=np.uint8)
+        sections = {
+            **arrays,
+            "named": named,
+            "input_ids": np.asarray(self.input_ids, dtype=np.int64),
+            "output_ids": np.asarray(self.output_ids, dtype=np.int64),
+            "name_data": np.frombuffer(name_data, dtype=np.uint8),
+        }
+        buffers = [
+            BINARY_NETLIST_HEADER.pack(
+                BINARY_NETLIST_MAGIC,
+                BINARY_NETLIST_VERSION,
+                self.number_of_nodes(),
+                self.number_of_edges(),
+                len(self.input_ids),
+                len(self.output_ids),
+                len(name_data),
+            )
+        ]
+        for name, dtype, _ in get_binary_sections(
+                self.number_of_nodes(),
+                self.number_of_edges(),
+                len(self.input_ids),
+                len(self.output_ids),
+                len(name_data),
+        ):
+            data = np.ascontiguousarray(sections[name], dtype=dtype).tobytes()
+            buffers.append(data)
+            buffers.append(bytes(pad_to_word(len(data))))
+        with open(output_fp, "wb") as output_file:
+            output_file.write(b"".join(buffers))
+
+    @classmethod
+    def read_binary(cls, input_fp: str, use_mmap: bool = True) -> "CompactNetlist":
+        """
+        Loads a netlist saved by write_binary. The arrays are memory mapped
+        straight from the file and back the netlist until it is first
+        modified, so nothing is parsed, copied or recomputed. Names are
+        decoded, and the name index built, on first use.
+
+        Args:
+            input_fp: Filepath of the binary netlist.
+            use_mmap: Whether to memory map the file rather than read it into
+                memory.
+
+        Returns:
+            The loaded netlist.
+        """
+        with open(input_fp, "rb") as input_file:
+            header = input_file.read(BINARY_NETLIST_HEADER.size)
+        if len(header) != BINARY_NETLIST_HEADER.size:
+            raise RuntimeError(
+                f"{input_fp} is not a binary netlist. Please investigate."
+            )
+        magic, version, *counts = BINARY_NETLIST_HEADER.unpack(header)
+        if magic != BINARY_NETLIST_MAGIC:
+            raise RuntimeError(
+                f"{input_fp} is not a binary netlist. Please investigate."
+            )
+        if version != BINARY_NETLIST_VERSION:
+            raise RuntimeError(
+                f"{input_fp} is a version {version} binary netlist, but only "
+                f"version {BINARY_NETLIST_VERSION} is supported. Please "
+                f"investigate."
+            )
+        if use_mmap:
+            # Viewed as a plain array, as slicing a np.memmap subclass is
+            # far slower. The mapping stays alive through the view's base.
+            data = np.memmap(input_fp, dtype=np.uint8, mode="r").view(np.ndarray)
+        else:
+            data = np.fromfile(input_fp, dtype=np.uint8)
+        sections = {}
+        offset = BINARY_NETLIST_HEADER.size
+        for name, dtype, length in get_binary_sections(*counts):
+            num_bytes = length * dtype.itemsize
+            sections[name] = data[offset:offset + num_bytes].view(dtype)
+            offset += num_bytes + pad_to_word(num_bytes)
+        netlist = cls()
+        netlist._names = None
+        netlist._name_index = None
+        netlist._name_sections = (sections["name_data"], sections["named"])
+        netlist.input_ids = sections["input_ids"].tolist()
+        netlist.output_ids = sections["output_ids"].tolist()
+        netlist._gate_codes = sections["gate_codes"]
+        netlist._edge_sources = sections["edge_sources"]
+        netlist._edge_targets = sections["edge_targets"]
+        netlist._arrays = {
+            name: sections[name]
+            for name in (
+                "gate_codes",
+                "edge_sources",
+                "edge_targets",
+                "fanin_offsets",
+                "fanin_indices",
+                "fanout_offsets",
+                "fanout_indices",
+            )
+        }
+        return netlist
+
+    def iterate_edges(self) -> List[Tuple[int, int]]:
+        """
+        Returns every edge ordered by driving node, matching the edge order of
+        the materialized networkx graph.
+        """
+        arrays = self.get_arrays()
+        offsets = arrays["fanout_offsets"]
+        sources = np.repeat(np.arange(self.number_of_nodes()), np.diff(offsets))
+        return list(zip(sources.tolist(), arrays["fanout_indices"].tolist()))
+
+    def to_networkx(self) -> nx.DiGraph:
+        """
+        Materializes the netlist as a networkx graph with integer nodes. Only
+        intended for plotting and other networkx tooling.
+        """
+        graph = nx.DiGraph()
+        for node_id, name in enumerate(self.names):
+            graph.add_node(
+                node_id,
+                node_name=name,
+                gate_type=self.get_gate_type(node_id),
+            )
+        graph.add_edges_from(self.iterate_edges())
+        return graph
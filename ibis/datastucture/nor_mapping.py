@@ -0,0 +1,219 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Technology mapping of arbitrary logic networks onto NOR and NOT gates, which is
+what a Cello style genetic implementation is built from. If you want a visual
+representation of what's happening here: https://en.wikipedia.org/wiki/NOR_logic.
+
+Every gate is rebuilt out of two input NORs and NOTs with structural hashing,
+i.e. a NOR of the same two signals (in either order) or a NOT of the same
+signal is only ever built once and then shared. Signals are tracked as
+literals, a node plus a flag for whether it is inverted, so a NOT is only built
+once something actually consumes the inverted signal and double inversions
+cost nothing, e.g. an OR feeding a NOT costs a single NOR. Every gate in the
+result costs a repressor, so the gate count is the figure of merit: only the
+logic the outputs depend on is mapped, and a NOR of a signal with its own
+inversion is folded to a constant.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
+
+from .netlist import (
+    GATE_REDUCTIONS,
+    CompactNetlist,
+)
+
+
+class NorMapper:
+    def __init__(self, source: CompactNetlist):
+        """
+        Maps a netlist onto two input NOR and NOT gates. The mapped netlist is
+        emitted in the serialized format of LogicNetwork, with the primary
+        inputs first, then the gates, and then the primary outputs. Ports keep
+        their names, and gates are left unnamed so that LogicNetwork labels
+        them by function, e.g. NOR3.
+
+        Args:
+            source: The netlist to map.
+        """
+        self.source = source
+        self.nodes: List[List[Optional[str]]] = []
+        self.edges: List[List[int]] = []
+        # (gate type, sorted fanin) -> mapped node.
+        self.structural_hash: Dict[Tuple[str, Tuple[int, ...]], int] = {}
+        # Mapped NOT gate -> the node it inverts.
+        self.inverted: Dict[int, int] = {}
+        # Undriven node standing in for False, built on first use.
+        self.constant_false: Optional[int] = None
+
+    # --------------------------- GATE CONSTRUCTION ----------------------------
+    # A literal is 2 * node + 1 if the node's signal is inverted, else 2 * node.
+    def add_node(
+            self,
+            node_name: Optional[str],
+            function_name: Optional[str] = None,
+            fanin: Tuple[int, ...] = (),
+    ) -> int:
+        node_id = len(self.nodes)
+        self.nodes.append([node_name, function_name])
+        for driver in fanin:
+            self.edges.append([driver, node_id])
+        return node_id
+
+    def hash_gate(self, function_name: str, fanin: Tuple[int, ...]) -> int:
+        key = (function_name, fanin)
+        node_id = self.structural_hash.get(key)
+        if node_id is None:
+            node_id = self.add_node(None, function_name, fanin)
+            self.structural_hash[key] = node_id
+        return node_id
+
+    def materialize(self, literal: int) -> int:
+        """
+        Returns a node carrying the signal of a literal, building the NOT gate
+        for an inverted literal if needed.
+        """
+        node_id = literal >> 1
+        if not literal & 1:
+            return node_id
+        if node_id in self.inverted:
+            # The node is itself a NOT, so inverting it gets us its input.
+            return self.inverted[node_id]
+        not_id = self.hash_gate("NOT", (node_id,))
+        self.inverted[not_id] = node_id
+        return not_id
+
+    def get_false(self) -> int:
+        """
+        Returns the literal of the constant False, an undriven node.
+        """
+        if self.constant_false is None:
+            self.constant_false = self.add_node(self.source.get_unused_name("CONST0"))
+        return self.constant_false << 1
+
+    @staticmethod
+    def make_not(literal: int) -> int:
+        return literal ^ 1
+
+    def make_nor(self, literal_a: int, literal_b: int) -> int:
+        if literal_a == literal_b:
+            return self.make_not(literal_a)
+        # x NOR NOT x is always False.
+        if literal_a == self.make_not(literal_b):
+            return self.get_false()
+        if self.constant_false is not None:
+            for constant, other in ((literal_a, literal_b), (literal_b, literal_a)):
+                if constant >> 1 == self.constant_false:
+                    # True forces the NOR low, and False leaves the inversion
+                    # of the other signal.
+                    return constant ^ 1 if constant & 1 else self.make_not(other)
+        fanin = sorted((self.materialize(literal_a), self.materialize(literal_b)))
+        return self.hash_gate("NOR", tuple(fanin)) << 1
+
+    def make_or(self, literal_a: int, literal_b: int) -> int:
+        return self.make_not(self.make_nor(literal_a, literal_b))
+
+    def make_and(self, literal_a: int, literal_b: int) -> int:
+        return self.make_nor(self.make_not(literal_a), self.make_not(literal_b))
+
+    def make_xor(self, literal_a: int, literal_b: int) -> int:
+        # The classic four NOR XNOR, inverted.
+        both_low = self.make_nor(literal_a, literal_b)
+        only_b = self.make_nor(literal_a, both_low)
+        only_a = self.make_nor(literal_b, both_low)
+        return self.make_not(self.make_nor(only_a, only_b))
+
+    @staticmethod
+    def reduce_literals(combine: Callable[[int, int], int], literals: List[int]) -> int:
+        # Pairwise rather than left to right, so wide gates map to a balanced
+        # tree instead of a chain.
+        while len(literals) > 1:
+            paired = [
+                combine(literals[index], literals[index + 1])
+                for index in range(0, len(literals) - 1, 2)
+            ]
+            if len(literals) % 2:
+                paired.append(literals[-1])
+            literals = paired
+        return literals[0]
+
+    # -------------------------------- MAPPING ---------------------------------
+    def map(self) -> dict:
+        """
+        Performs the mapping.
+
+        Returns:
+            The mapped, serialized netlist.
+        """
+        source = self.source
+        combiners = {
+            "AND": self.make_and,
+            "OR": self.make_or,
+            "XOR": self.make_xor,
+        }
+        fanin = source.get_fanin_lists()
+        literals: Dict[int, int] = {}
+        for node_id in source.input_ids:
+            if node_id not in literals:
+                literals[node_id] = self.add_node(source.names[node_id]) << 1
+        # Only what the outputs transitively depend on is mapped.
+        live = set(source.output_ids)
+        stack = list(live)
+        while stack:
+            for driver in fanin[stack.pop()].tolist():
+                if driver not in live:
+                    live.add(driver)
+                    stack.append(driver)
+        # Levelizing also rejects combinational loops.
+        order = np.argsort(source.get_schedule().node_levels, kind="stable")
+        for node_id in order.tolist():
+            if node_id in literals or node_id not in live:
+                continue
+            drivers = fanin[node_id].tolist()
+            if not drivers:
+                # Undriven nodes read as False; keep them as they are.
+                literals[node_id] = self.add_node(source.names[node_id]) << 1
+                continue
+            reduction, invert = GATE_REDUCTIONS[source.get_gate_type(node_id)]
+            literal = self.reduce_literals(
+                combiners[reduction],
+                [literals[driver] for driver in drivers],
+            )
+            literals[node_id] = self.make_not(literal) if invert else literal
+        inputs = [literals[node_id] >> 1 for node_id in source.input_ids]
+        outputs = []
+        for node_id in source.output_ids:
+            signal = self.materialize(literals[node_id])
+            if self.nodes[signal][0] != source.names[node_id]:
+                signal = self.add_node(source.names[node_id], None, (signal,))
+            outputs.append(signal)
+        return {
+            "nodes": self.nodes,
+            "edges": self.edges,
+            "inputs": inputs,
+            "outputs": outputs,
+        }
+
+
+def map_to_nor(netlist: CompactNetlist) -> dict:
+    """
+    Maps a netlist onto two input NOR and NOT gates with structural hashing.
+
+    Args:
+        netlist: The netlist to map.
+
+    Returns:
+        The mapped netlist, serialized in the same format as
+        LogicNetwork.serialize_netlist.
+    """
+    return NorMapper(netlist).map()
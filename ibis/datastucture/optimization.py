@@ -0,0 +1,383 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Logic optimization passes. Every node left in a netlist costs simulation time,
+and further down the line each gate costs a repressor in the genetic design, so
+netlists are cleaned up before they are scored:
+
+    - Wire sweeping removes WIRE gates and function-less internal nodes that
+      simply pass a single driver on.
+    - Double inversion collapse replaces NOT(NOT(x)) with x.
+    - Constant propagation folds gates driven by constants, where undriven
+      nodes read as False.
+    - Dead gate removal drops every node that no output depends on.
+
+Each pass rebuilds the netlist, and the pipeline repeats them until none of
+them changes anything. Primary inputs and outputs are always kept, in order,
+under their original names. Gates are left unnamed so that LogicNetwork labels
+them by function, e.g. NOR3.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+
+import numpy as np
+
+from .netlist import (
+    GATE_REDUCTIONS,
+    CompactNetlist,
+)
+
+# Constant signals. Node IDs are never negative.
+CONST_FALSE = -1
+CONST_TRUE = -2
+
+REDUCTION_GATES = {
+    ("AND", False): "AND",
+    ("AND", True): "NAND",
+    ("OR", False): "OR",
+    ("OR", True): "NOR",
+    ("XOR", False): "XOR",
+    ("XOR", True): "XNOR",
+}
+
+
+@dataclass
+class PassStatistics:
+    pass_name: str
+    iteration: int
+    nodes_before: int
+    nodes_after: int
+    edges_before: int
+    edges_after: int
+
+    @property
+    def nodes_removed(self) -> int:
+        return self.nodes_before - self.nodes_after
+
+
+# --------------------------------- REWRITER -----------------------------------
+class NetlistRewriter:
+    name = "copy"
+
+    def __init__(self, source: CompactNetlist):
+        """
+        Rebuilds a netlist node by node in topological order. Subclasses
+        override rewrite_node to replace a node with another signal, a
+        constant, or a different gate. By default every node is copied.
+
+        Args:
+            source: The netlist to rewrite.
+        """
+        self.source = source
+        self.input_set = set(source.input_ids)
+        self.output_set = set(source.output_ids)
+        self.nodes: List[List[Optional[str]]] = []
+        self.fanin: List[Tuple[int, ...]] = []
+        self.constants: Dict[int, int] = {}
+
+    # ----------------------------- CONSTRUCTION -------------------------------
+    def add_node(
+            self,
+            node_name: Optional[str],
+            function_name: Optional[str] = None,
+            fanin: Sequence[int] = (),
+    ) -> int:
+        # Constants among the drivers are built first, so they don't take
+        # the place of this node.
+        drivers = tuple(self.materialize(signal) for signal in fanin)
+        node_id = len(self.nodes)
+        self.nodes.append([node_name, function_name])
+        self.fanin.append(drivers)
+        return node_id
+
+    def materialize(self, signal: int) -> int:
+        """
+        Returns a node carrying the passed in signal. Constants are built as
+        an undriven node for False and its inversion for True.
+        """
+        if signal >= 0:
+            return signal
+        if signal not in self.constants:
+            if signal == CONST_FALSE:
+                self.constants[signal] = self.add_node(self.get_constant_name())
+            else:
+                self.constants[signal] = self.add_node(
+                    None,
+                    "NOT",
+                    (CONST_FALSE,),
+                )
+        return self.constants[signal]
+
+    def get_constant_name(self) -> str:
+        """
+        A name for the constant False node that no kept node carries: CONST0,
+        or else the first free one of CONST0_1, CONST0_2, ... Names of
+        undriven internal nodes count as free, as they are folded into the
+        constant, so rewriting a rewritten netlist keeps the same name.
+        """
+        node_name = "CONST0"
+        suffix = 0
+        while True:
+            node_id = self.source.find(node_name)
+            if node_id is None or (
+                    not len(self.source.get_fanin(node_id))
+                    and node_id not in self.input_set
+                    and node_id not in self.output_set
+            ):
+                return node_name
+            suffix += 1
+            node_name = f"CONST0_{suffix}"
+
+    def emit(
+            self,
+            node_id: int,
+            function_name: Optional[str],
+            fanin: Sequence[int],
+    ) -> int:
+        """
+        Adds a node in place of a node of the source netlist. Ports and other
+        function-less nodes keep their names.
+        """
+        node_name = self.source.names[node_id] if function_name is None else None
+        return self.add_node(node_name, function_name, fanin)
+
+    def get_gate_type(self, signal: int) -> Optional[str]:
+        if signal < 0:
+            return None
+        return self.nodes[signal][1]
+
+    # ------------------------------- REWRITING --------------------------------
+    def keep_node(self, node_id: int) -> bool:
+        """
+        Whether a node of the source netlist is rewritten at all. A dropped
+        node must not drive any node that is kept.
+        """
+        return True
+
+    def rewrite_node(self, node_id: int, fanin: List[int]) -> int:
+        """
+        Rewrites a single node of the source netlist.
+
+        Args:
+            node_id: ID of the node in the source netlist.
+            fanin: The rewritten signals of the node's drivers.
+
+        Returns:
+            The signal that replaces the node.
+        """
+        return self.emit(node_id, self.source.get_gate_type(node_id), fanin)
+
+    def rewrite(self) -> dict:
+        """
+        Performs the rewrite.
+
+        Returns:
+            The rewritten, serialized netlist.
+        """
+        source = self.source
+        fanin = source.get_fanin_lists()
+        signals: Dict[int, int] = {}
+        for node_id in source.input_ids:
+            if node_id not in signals:
+                signals[node_id] = self.emit(node_id, None, ())
+        # Levelizing also rejects combinational loops.
+        order = np.argsort(source.get_schedule().node_levels, kind="stable")
+        for node_id in order.tolist():
+            if node_id in signals or not self.keep_node(node_id):
+                continue
+            signals[node_id] = self.rewrite_node(
+                node_id,
+                [signals[driver] for driver in fanin[node_id].tolist()],
+            )
+        outputs = []
+        for node_id in source.output_ids:
+            if signals[node_id] == CONST_FALSE:
+                # An undriven port reads as False.
+                outputs.append(self.emit(node_id, None, ()))
+                continue
+            signal = self.materialize(signals[node_id])
+            if self.nodes[signal][0] != source.names[node_id]:
+                # The output has been folded into another signal, so it gets
+                # a port of its own.
+                signal = self.emit(node_id, None, (signal,))
+            outputs.append(signal)
+        return {
+            "nodes": self.nodes,
+            "edges": [
+                [driver, node_id]
+                for node_id, drivers in enumerate(self.fanin)
+                for driver in drivers
+            ],
+            "inputs": [signals[node_id] for node_id in source.input_ids],
+            "outputs": outputs,
+        }
+
+
+# ---------------------------------- PASSES ------------------------------------
+class SweepWires(NetlistRewriter):
+    name = "sweep_wires"
+
+    def rewrite_node(self, node_id: int, fanin: List[int]) -> int:
+        gate_type = self.source.get_gate_type(node_id)
+        if (
+                gate_type in (None, "WIRE")
+                and len(fanin) == 1
+                and node_id not in self.output_set
+        ):
+            return fanin[0]
+        return super().rewrite_node(node_id, fanin)
+
+
+class CollapseDoubleInversions(NetlistRewriter):
+    name = "collapse_double_inversions"
+
+    def rewrite_node(self, node_id: int, fanin: List[int]) -> int:
+        if (
+                self.source.get_gate_type(node_id) == "NOT"
+                and len(fanin) == 1
+                and self.get_gate_type(fanin[0]) == "NOT"
+                and len(self.fanin[fanin[0]]) == 1
+        ):
+            return self.fanin[fanin[0]][0]
+        return super().rewrite_node(node_id, fanin)
+
+
+class PropagateConstants(NetlistRewriter):
+    name = "propagate_constants"
+
+    def rewrite_node(self, node_id: int, fanin: List[int]) -> int:
+        if not fanin:
+            # Undriven nodes read as False.
+            return CONST_FALSE
+        constants = [signal for signal in fanin if signal < 0]
+        if not constants:
+            return super().rewrite_node(node_id, fanin)
+        gate_type = self.source.get_gate_type(node_id)
+        reduction, invert = GATE_REDUCTIONS[gate_type]
+        remaining = [signal for signal in fanin if signal >= 0]
+        if reduction == "AND":
+            if CONST_FALSE in constants:
+                return CONST_TRUE if invert else CONST_FALSE
+        elif reduction == "OR":
+            if CONST_TRUE in constants:
+                return CONST_FALSE if invert else CONST_TRUE
+        else:
+            # Every True driving an XOR flips its output.
+            invert ^= constants.count(CONST_TRUE) % 2 == 1
+        if not remaining:
+            # What's left is the identity of the reduction.
+            value = reduction == "AND"
+            return CONST_TRUE if value != invert else CONST_FALSE
+        if len(remaining) == 1:
+            if not invert:
+                return remaining[0]
+            return self.emit(node_id, "NOT", remaining)
+        if gate_type is None or gate_type == "WIRE":
+            return self.emit(node_id, gate_type, remaining)
+        return self.emit(node_id, REDUCTION_GATES[(reduction, invert)], remaining)
+
+
+class RemoveDeadGates(NetlistRewriter):
+    name = "remove_dead_gates"
+
+    def __init__(self, source: CompactNetlist):
+        super().__init__(source)
+        # Everything the outputs transitively depend on.
+        self.live = set(source.output_ids)
+        stack = list(self.live)
+        while stack:
+            for driver in source.get_fanin(stack.pop()).tolist():
+                if driver not in self.live:
+                    self.live.add(driver)
+                    stack.append(driver)
+
+    def keep_node(self, node_id: int) -> bool:
+        return node_id in self.live
+
+
+DEFAULT_PASSES = (
+    SweepWires,
+    CollapseDoubleInversions,
+    PropagateConstants,
+    RemoveDeadGates,
+)
+
+
+# --------------------------------- PIPELINE -----------------------------------
+def get_structural_hash(netlist: CompactNetlist) -> int:
+    """
+    Hashes the structure of a netlist independently of its node numbering:
+    every node is hashed from its function, its name if it has no function,
+    and the hashes of its drivers.
+    """
+    fanin = netlist.get_fanin_lists()
+    order = np.argsort(netlist.get_schedule().node_levels, kind="stable")
+    node_hashes = [0] * netlist.number_of_nodes()
+    for node_id in order.tolist():
+        gate_type = netlist.get_gate_type(node_id)
+        node_hashes[node_id] = hash((
+            netlist.names[node_id] if gate_type is None else None,
+            gate_type,
+            tuple(sorted(node_hashes[driver] for driver in fanin[node_id].tolist())),
+        ))
+    return hash((
+        tuple(node_hashes[node_id] for node_id in netlist.input_ids),
+        tuple(node_hashes[node_id] for node_id in netlist.output_ids),
+        tuple(sorted(node_hashes)),
+    ))
+
+
+def optimize_netlist(
+        netlist: CompactNetlist,
+        passes: Sequence[Type[NetlistRewriter]] = DEFAULT_PASSES,
+        max_iterations: int = 16,
+) -> Tuple[dict, List[PassStatistics]]:
+    """
+    Runs the optimization passes over a netlist until a whole iteration
+    leaves its structure unchanged. Passes may rewrite the netlist without
+    changing its size, so structures rather than sizes are compared, see
+    get_structural_hash.
+
+    Args:
+        netlist: The netlist to optimize.
+        passes: The passes to run, in order, on every iteration.
+        max_iterations: Upper bound on the number of iterations.
+
+    Returns:
+        The optimized, serialized netlist, and the statistics of every pass
+        that was run.
+    """
+    statistics = []
+    serialized = netlist.serialize()
+    structural_hash = get_structural_hash(netlist)
+    for iteration in range(max_iterations):
+        for rewriter in passes:
+            nodes_before = netlist.number_of_nodes()
+            edges_before = netlist.number_of_edges()
+            serialized = rewriter(netlist).rewrite()
+            netlist = CompactNetlist.from_serialized(serialized)
+            statistics.append(
+                PassStatistics(
+                    pass_name=rewriter.name,
+                    iteration=iteration,
+                    nodes_before=nodes_before,
+                    nodes_after=netlist.number_of_nodes(),
+                    edges_before=edges_before,
+                    edges_after=netlist.number_of_edges(),
+                )
+            )
+        previous_hash = structural_hash
+        structural_hash = get_structural_hash(netlist)
+        if structural_hash == previous_hash:
+            break
+    return serialized, statistics
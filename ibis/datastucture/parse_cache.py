@@ -0,0 +1,348 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Persistent caching for verilog and UCF parsing.
+
+Pyverilog regenerates its PLY grammar tables on every construction and writes
+both the tables and its preprocessor output into the current working directory,
+which is slow and causes parallel jobs sharing a directory to trample each
+other. Everything here instead lives in a private per-user cache directory:
+
+    - The grammar tables are generated once, published atomically, and each
+      process only ever reads from its own private copy.
+    - Parsed netlists are stored keyed by the content hash of the verilog file,
+      so re-parsing an unchanged circuit skips pyverilog entirely.
+    - Parsed UCF files are pickled along with the size, mtime and content hash
+      of the source. An untouched file is recognized from a single stat call,
+      and a touched but unchanged file from its hash.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from typing import (
+    Any,
+    Optional,
+)
+
+import pyverilog
+from ply.yacc import yacc
+from pyverilog.vparser.lexer import VerilogLexer
+from pyverilog.vparser.parser import VerilogParser
+from pyverilog.vparser.preprocessor import VerilogPreprocessor
+
+from .structural_verilog import STRUCTURAL_VERILOG_PARSER_VERSION
+
+# Bump this whenever the way a netlist is constructed or serialized changes, so
+# stale entries are never loaded.
+NETLIST_CACHE_VERSION = 3
+# The same, for the parsed objects of UCF files.
+UCF_CACHE_VERSION = 2
+
+_VERILOG_PARSER = None
+
+
+# ------------------------------- CACHE LOCATION -------------------------------
+def get_cache_directory(subdirectory: Optional[str] = None) -> str:
+    """
+    Returns the private cache directory for Ibis, creating it if needed. The
+    location can be overridden with the IBIS_CACHE_DIR environment variable,
+    and otherwise follows XDG_CACHE_HOME.
+
+    Args:
+        subdirectory: Optional subdirectory within the cache.
+
+    Returns:
+        Path to the requested cache directory.
+    """
+    cache_root = os.environ.get("IBIS_CACHE_DIR")
+    if cache_root is None:
+        xdg_cache = os.environ.get(
+            "XDG_CACHE_HOME",
+            os.path.join(os.path.expanduser("~"), ".cache"),
+        )
+        cache_root = os.path.join(xdg_cache, "ibis")
+    cache_dir = cache_root
+    if subdirectory is not None:
+        cache_dir = os.path.join(cache_root, subdirectory)
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    return cache_dir
+
+
+def hash_file(fp: str) -> str:
+    """
+    Generates the SHA256 content hash of a file.
+
+    Args:
+        fp: Filepath of the file to hash.
+
+    Returns:
+        Hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(fp, "rb") as input_file:
+        for block in iter(lambda: input_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def atomic_write(fp: str, data: bytes):
+    """
+    Writes a file such that concurrent readers only ever see either the prior
+    contents or the complete new contents.
+
+    Args:
+        fp: Filepath to write.
+        data: Contents of the file.
+    """
+    handle, scratch_fp = tempfile.mkstemp(
+        prefix=".scratch-",
+        dir=os.path.dirname(fp),
+    )
+    try:
+        with os.fdopen(handle, "wb") as scratch_file:
+            scratch_file.write(data)
+        os.replace(scratch_fp, fp)
+    except BaseException:
+        if os.path.isfile(scratch_fp):
+            os.remove(scratch_fp)
+        raise
+
+
+# ------------------------------- VERILOG PARSER -------------------------------
+class CachedVerilogParser(VerilogParser):
+    def __init__(self, table_dir: str):
+        """
+        Pyverilog's parser with its grammar tables kept in the cache rather
+        than the current working directory.
+
+        The published table file is never handed to PLY directly. We copy it
+        to a private scratch file, let PLY read (or regenerate) that, and then
+        atomically publish the result, so no process can ever observe another
+        one half way through writing it.
+
+        Args:
+            table_dir: Directory to keep the grammar tables in.
+        """
+        self.lexer = VerilogLexer(error_func=self._lexer_error_func)
+        self.lexer.build()
+        self.tokens = self.lexer.tokens
+        table_fp = os.path.join(
+            table_dir,
+            f"parsetab-{pyverilog.__version__}.pickle",
+        )
+        handle, scratch_fp = tempfile.mkstemp(
+            prefix=".parsetab-",
+            dir=table_dir,
+        )
+        os.close(handle)
+        try:
+            if os.path.isfile(table_fp):
+                shutil.copyfile(table_fp, scratch_fp)
+            else:
+                # PLY regenerates the tables when the file doesn't exist.
+                os.remove(scratch_fp)
+            self.parser = yacc(
+                module=self,
+                method="LALR",
+                debug=False,
+                outputdir=table_dir,
+                picklefile=scratch_fp,
+            )
+            os.replace(scratch_fp, table_fp)
+        finally:
+            if os.path.isfile(scratch_fp):
+                os.remove(scratch_fp)
+
+
+def get_verilog_parser() -> CachedVerilogParser:
+    """
+    Returns the verilog parser for this process, only constructing it once.
+    """
+    global _VERILOG_PARSER
+    if _VERILOG_PARSER is None:
+        _VERILOG_PARSER = CachedVerilogParser(get_cache_directory("pyverilog"))
+    return _VERILOG_PARSER
+
+
+def parse_verilog_ast(verilog_fp: str):
+    """
+    Preprocesses and parses a verilog file with pyverilog. The preprocessor
+    output is written to a private temporary file rather than the current
+    working directory.
+
+    Args:
+        verilog_fp: Filepath of the verilog file.
+
+    Returns:
+        The pyverilog AST of the verilog file.
+    """
+    handle, preprocess_fp = tempfile.mkstemp(
+        prefix="preprocess-",
+        suffix=".output",
+        dir=get_cache_directory("pyverilog"),
+    )
+    os.close(handle)
+    try:
+        # Note the list containing the filepath. This will give you a very
+        # confusing error message if not wrapped in an iterable even though
+        # there documentation and code make it very clear you should be able to
+        # do both.
+        preprocessor = VerilogPreprocessor(
+            [verilog_fp],
+            preprocess_fp,
+            [],
+            [],
+        )
+        preprocessor.preprocess()
+        with open(preprocess_fp, "r") as preprocess_file:
+            text = preprocess_file.read()
+    finally:
+        os.remove(preprocess_fp)
+    return get_verilog_parser().parse(text)
+
+
+# ------------------------------- NETLIST CACHE --------------------------------
+def get_parser_tag(use_native_parser: bool = True) -> str:
+    """
+    Identifies the parsers a netlist may have been built by, along with their
+    versions. The native parser falls back to pyverilog, so both count.
+    """
+    tag = f"pyverilog-{pyverilog.__version__}"
+    if use_native_parser:
+        tag = f"native-{STRUCTURAL_VERILOG_PARSER_VERSION}.{tag}"
+    return tag
+
+
+def get_netlist_cache_fp(digest: str, parser_tag: str) -> str:
+    """
+    Returns where a netlist with the passed in content hash, parsed by the
+    passed in parsers, lives.
+    """
+    return os.path.join(
+        get_cache_directory("netlists"),
+        f"{digest}.{parser_tag}.v{NETLIST_CACHE_VERSION}.json",
+    )
+
+
+def load_cached_netlist(digest: str, parser_tag: str) -> Optional[dict]:
+    """
+    Loads a previously parsed netlist.
+
+    Args:
+        digest: Content hash of the verilog file.
+        parser_tag: The parsers it was parsed with, see get_parser_tag.
+
+    Returns:
+        The serialized netlist, or None if the netlist has not been cached.
+    """
+    cache_fp = get_netlist_cache_fp(digest, parser_tag)
+    if not os.path.isfile(cache_fp):
+        return None
+    try:
+        with open(cache_fp, "r") as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        # A damaged entry is just a cache miss; it'll get rewritten.
+        return None
+
+
+def store_cached_netlist(digest: str, parser_tag: str, netlist: dict):
+    """
+    Stores a parsed netlist.
+
+    Args:
+        digest: Content hash of the verilog file.
+        parser_tag: The parsers it was parsed with, see get_parser_tag.
+        netlist: The serialized netlist.
+    """
+    atomic_write(
+        get_netlist_cache_fp(digest, parser_tag),
+        json.dumps(netlist).encode("utf-8"),
+    )
+
+
+# --------------------------------- UCF CACHE ----------------------------------
+def get_ucf_cache_fp(fp: str, kind: str) -> str:
+    """
+    Returns where the parsed contents of a UCF file live. Entries are keyed by
+    the absolute path of the file, as each is validated against the file on
+    load anyway.
+
+    Args:
+        fp: Filepath of the UCF file.
+        kind: What was parsed from the file, e.g. 'inputs' or 'gates'.
+    """
+    path_digest = hashlib.sha256(os.path.abspath(fp).encode("utf-8")).hexdigest()
+    return os.path.join(
+        get_cache_directory("ucf"),
+        f"{path_digest}.{kind}.v{UCF_CACHE_VERSION}.pickle",
+    )
+
+
+def load_cached_ucf(fp: str, kind: str) -> Optional[Any]:
+    """
+    Loads the previously parsed contents of a UCF file, if the file hasn't
+    changed since. A matching size and mtime is trusted as is, and otherwise
+    the content hash decides.
+
+    Args:
+        fp: Filepath of the UCF file.
+        kind: What was parsed from the file.
+
+    Returns:
+        The parsed contents, or None if they have not been cached or are
+        stale.
+    """
+    cache_fp = get_ucf_cache_fp(fp, kind)
+    try:
+        with open(cache_fp, "rb") as cache_file:
+            entry = pickle.load(cache_file)
+        stat = os.stat(fp)
+        if (entry["size"], entry["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+            return entry["value"]
+        if entry["digest"] != hash_file(fp):
+            return None
+    except (OSError, EOFError, KeyError, pickle.UnpicklingError, AttributeError):
+        # A damaged entry is just a cache miss; it'll get rewritten.
+        return None
+    # The file was touched but not changed, so only the entry's mtime is stale.
+    store_cached_ucf(fp, kind, entry["value"], entry["digest"], stat)
+    return entry["value"]
+
+
+def store_cached_ucf(
+        fp: str,
+        kind: str,
+        value: Any,
+        digest: str,
+        stat: Optional[os.stat_result] = None,
+):
+    """
+    Stores the parsed contents of a UCF file.
+
+    Args:
+        fp: Filepath of the UCF file.
+        kind: What was parsed from the file.
+        value: The parsed contents. Must be picklable.
+        digest: Content hash of the contents that were parsed.
+        stat: The stat of the file taken before it was read. A file modified
+            while being parsed then never matches the entry by mtime.
+    """
+    if stat is None:
+        stat = os.stat(fp)
+    entry = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "digest": digest,
+        "value": value,
+    }
+    atomic_write(
+        get_ucf_cache_fp(fp, kind),
+        pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL),
+    )
@@ -0,0 +1,360 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Monte Carlo simulation with random input vectors, for networks too wide to
+enumerate. Rows are drawn uniformly at random from a seeded generator and
+simulated 64 to a machine word, and every statistic comes with a confidence
+interval. Sampling stops once every interval is tight enough, or once the
+sample budget runs out.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+from dataclasses import dataclass
+import math
+from statistics import NormalDist
+from typing import (
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
+
+from .simulation import (
+    LevelizedSchedule,
+    unpack_words,
+)
+from .truth_table import popcount
+
+
+def wilson_interval(
+        successes: int,
+        num_samples: int,
+        confidence: float = 0.95,
+) -> Tuple[float, float]:
+    """
+    The Wilson score interval of a binomial proportion, which unlike the
+    normal approximation stays inside [0, 1] and behaves for proportions close
+    to either end.
+
+    Args:
+        successes: Number of samples that were True.
+        num_samples: Total number of samples.
+        confidence: Confidence level of the interval.
+
+    Returns:
+        The lower and upper bound of the interval.
+    """
+    if num_samples == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    proportion = successes / num_samples
+    denominator = 1 + z ** 2 / num_samples
+    center = (proportion + z ** 2 / (2 * num_samples)) / denominator
+    half_width = z * math.sqrt(
+        proportion * (1 - proportion) / num_samples
+        + z ** 2 / (4 * num_samples ** 2)
+    ) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+@dataclass
+class ProportionEstimate:
+    name: str
+    successes: int
+    num_samples: int
+    confidence: float
+
+    @property
+    def estimate(self) -> float:
+        return self.successes / self.num_samples if self.num_samples else 0.0
+
+    @property
+    def interval(self) -> Tuple[float, float]:
+        return wilson_interval(self.successes, self.num_samples, self.confidence)
+
+    @property
+    def half_width(self) -> float:
+        low, high = self.interval
+        return (high - low) / 2
+
+
+def get_tail_rank_interval(
+        num_samples: int,
+        quantile: float,
+        confidence: float = 0.95,
+) -> Tuple[int, int, int]:
+    """
+    How many of num_samples draws fall below the quantile of their
+    distribution is Binomial(num_samples, quantile), so the quantile lies
+    between the order statistics at the ends of that count's interval. Uses
+    the normal approximation of the binomial.
+
+    Returns:
+        The rank (from one, counting from the tail) of the point estimate of
+        the quantile, and the lowest and highest number of draws beyond the
+        quantile at the passed in confidence.
+    """
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    mean = num_samples * quantile
+    spread = z * math.sqrt(mean * (1 - quantile))
+    return (
+        max(1, round(mean)),
+        max(0, math.floor(mean - spread)),
+        min(num_samples, math.ceil(mean + spread)),
+    )
+
+
+@dataclass
+class MarginEstimate:
+    # log10 of the (1 - quantile) quantile of the OFF levels over the quantile
+    # quantile of the ON levels, of the worst output.
+    estimate: float
+    interval: Tuple[float, float]
+    # The same, from the most extreme levels drawn.
+    observed: float
+    quantile: float
+    confidence: float
+    num_samples: int
+
+    @property
+    def half_width(self) -> float:
+        low, high = self.interval
+        return (high - low) / 2
+
+
+class MarginTracker:
+    def __init__(
+            self,
+            num_outputs: int,
+            quantile: float = 1e-3,
+            confidence: float = 0.95,
+            max_samples: int = 1 << 20,
+    ):
+        """
+        Estimates the ON/OFF margin of every output from sampled rows,
+        log10(highest OFF level / lowest ON level), where the highest and
+        lowest are taken at the quantile rather than over every row. Unlike
+        the extremes, quantiles converge and have distribution-free
+        confidence intervals from the order statistics of the sample, so only
+        the tail of the OFF and ON levels of every output is kept.
+
+        Args:
+            num_outputs: Number of outputs.
+            quantile: Fraction of the worst rows left out of the margin.
+            confidence: Confidence level of the interval. Split evenly
+                between the OFF and the ON quantile.
+            max_samples: Upper bound on the rows that will be added, which
+                sets how much of the tail is kept.
+        """
+        self.quantile = quantile
+        self.confidence = confidence
+        _, _, highest = get_tail_rank_interval(max_samples, quantile, confidence)
+        self.capacity = highest + 16
+        # Per output, the highest OFF levels and the lowest ON levels seen.
+        self.high_off = [np.empty(0) for _ in range(num_outputs)]
+        self.low_on = [np.empty(0) for _ in range(num_outputs)]
+        self.off_counts = np.zeros(num_outputs, dtype=np.int64)
+        self.on_counts = np.zeros(num_outputs, dtype=np.int64)
+
+    def keep_tail(self, values: np.ndarray) -> np.ndarray:
+        if len(values) > self.capacity:
+            values = np.partition(values, self.capacity - 1)[:self.capacity]
+        return values
+
+    def update(self, output_levels: np.ndarray, output_truth: np.ndarray):
+        """
+        Adds a block of rows.
+
+        Args:
+            output_levels: Float array of shape (outputs, rows).
+            output_truth: Boolean array of shape (outputs, rows).
+        """
+        for index, (levels, truth) in enumerate(zip(output_levels, output_truth)):
+            off, on = levels[~truth], levels[truth]
+            self.off_counts[index] += len(off)
+            self.on_counts[index] += len(on)
+            # Stored negated, so both tails are the smallest values.
+            self.high_off[index] = self.keep_tail(np.concatenate([self.high_off[index], -off]))
+            self.low_on[index] = self.keep_tail(np.concatenate([self.low_on[index], on]))
+
+    def get_tail_quantile(
+            self,
+            tail: np.ndarray,
+            num_samples: int,
+    ) -> Tuple[float, float, float]:
+        """
+        The quantile of a tail sorted from the extreme inwards, at half of
+        the overall confidence.
+
+        Returns:
+            The point estimate, and the outer and inner end of the interval.
+            An outer end past the most extreme draw is -inf.
+        """
+        point, lowest, highest = get_tail_rank_interval(
+            num_samples,
+            self.quantile,
+            1 - (1 - self.confidence) / 2,
+        )
+
+        def get_rank(rank: int) -> float:
+            # Nothing is known beyond the most extreme draw.
+            if rank < 1:
+                return -np.inf
+            return float(tail[min(rank, len(tail)) - 1])
+
+        return get_rank(point), get_rank(lowest), get_rank(highest + 1)
+
+    def get_estimate(self) -> MarginEstimate:
+        """
+        The margin of the worst output. An output that hasn't been seen both
+        ON and OFF has no margin, and makes the estimate infinite.
+        """
+        estimates, lows, highs, observed = [], [], [], []
+        for index in range(len(self.high_off)):
+            if not self.off_counts[index] or not self.on_counts[index]:
+                estimates.append(np.inf)
+                lows.append(-np.inf)
+                highs.append(np.inf)
+                observed.append(np.inf)
+                continue
+            high_off = np.sort(self.high_off[index])
+            low_on = np.sort(self.low_on[index])
+            off, off_outer, off_inner = self.get_tail_quantile(
+                high_off,
+                int(self.off_counts[index]),
+            )
+            on, on_outer, on_inner = self.get_tail_quantile(
+                low_on,
+                int(self.on_counts[index]),
+            )
+            # The margin grows with the OFF quantile and shrinks with the ON
+            # quantile, so its interval runs from the inner to the outer
+            # ends of theirs.
+            with np.errstate(divide="ignore"):
+                estimates.append(np.log10(-off / on))
+                lows.append(np.log10(-off_inner / on_inner))
+                if np.isfinite(off_outer) and np.isfinite(on_outer):
+                    highs.append(np.log10(-off_outer / on_outer))
+                else:
+                    highs.append(np.inf)
+                observed.append(np.log10(-high_off[0] / low_on[0]))
+        return MarginEstimate(
+            estimate=float(max(estimates)),
+            interval=(float(max(lows)), float(max(highs))),
+            observed=float(max(observed)),
+            quantile=self.quantile,
+            confidence=self.confidence,
+            num_samples=int(self.off_counts[0] + self.on_counts[0]),
+        )
+
+
+class RandomVectorSampler:
+    def __init__(self, schedule: LevelizedSchedule, seed: Optional[int] = None):
+        """
+        Draws random input rows and simulates them bit-parallel. The same seed
+        always produces the same rows.
+
+        Args:
+            schedule: The levelized schedule of the network to simulate.
+            seed: Seed of the random number generator.
+        """
+        self.schedule = schedule
+        self.rng = np.random.default_rng(seed)
+
+    def draw_batch(self, num_words: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Simulates 64 * num_words random rows.
+
+        Returns:
+            The packed inputs and the packed outputs, as uint64 arrays of
+            shape (inputs, words) and (outputs, words).
+        """
+        packed_inputs = self.rng.integers(
+            0,
+            np.iinfo(np.uint64).max,
+            size=(len(self.schedule.input_ids), num_words),
+            dtype=np.uint64,
+            endpoint=True,
+        )
+        values = self.schedule.evaluate_packed(packed_inputs)
+        return packed_inputs, values[self.schedule.output_ids]
+
+    def iterate_batches(
+            self,
+            batch_size: int = 1 << 14,
+            max_samples: Optional[int] = None,
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Streams random rows in batches, unpacked in the same layout as
+        LogicNetwork.simulate.
+
+        Args:
+            batch_size: Number of rows per batch, rounded up to a multiple of
+                64.
+            max_samples: Stop after this many rows. Runs forever if not
+                passed, so the consumer decides when to stop.
+
+        Yields:
+            Boolean arrays of the inputs, of shape (inputs, rows), and of the
+            outputs, of shape (outputs, rows).
+        """
+        num_words = max(1, -(-batch_size // 64))
+        drawn = 0
+        while max_samples is None or drawn < max_samples:
+            packed_inputs, packed_outputs = self.draw_batch(num_words)
+            count = num_words * 64
+            if max_samples is not None:
+                count = min(count, max_samples - drawn)
+            drawn += count
+            yield (
+                unpack_words(packed_inputs, count),
+                unpack_words(packed_outputs, count),
+            )
+
+    def estimate_output_balance(
+            self,
+            output_names: List[str],
+            confidence: float = 0.95,
+            tolerance: float = 0.01,
+            batch_size: int = 1 << 14,
+            max_samples: int = 1 << 24,
+    ) -> List[ProportionEstimate]:
+        """
+        Estimates the fraction of the truth table where each output is ON.
+
+        Args:
+            output_names: Names of the outputs, in output order.
+            confidence: Confidence level of the intervals.
+            tolerance: Sampling stops once every interval is no wider than
+                plus or minus this.
+            batch_size: Number of rows simulated between checks.
+            max_samples: Upper bound on the number of rows drawn.
+
+        Returns:
+            The estimated ON fraction of every output.
+        """
+        num_words = max(1, -(-batch_size // 64))
+        successes = np.zeros(len(output_names), dtype=np.int64)
+        num_samples = 0
+        while True:
+            # The last batch is cut short at max_samples.
+            count = min(num_words * 64, max_samples - num_samples)
+            _, packed_outputs = self.draw_batch(-(-count // 64))
+            if count % 64:
+                packed_outputs[:, -1] &= np.uint64((1 << (count % 64)) - 1)
+            successes += popcount(packed_outputs.view(np.uint8).reshape(
+                packed_outputs.shape[0], -1,
+            ))
+            num_samples += count
+            estimates = [
+                ProportionEstimate(name, int(count), num_samples, confidence)
+                for name, count in zip(output_names, successes.tolist())
+            ]
+            if num_samples >= max_samples:
+                break
+            if all(estimate.half_width <= tolerance for estimate in estimates):
+                break
+        return estimates
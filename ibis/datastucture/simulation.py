@@ -0,0 +1,423 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Levelized, vectorized simulation of logic networks. The network is sorted into
+levels once, and every gate is then evaluated over a boolean column that holds
+every requested input row at the same time. Packed evaluation does the same
+with 64 rows to a machine word.
+
+The event driven simulator instead walks the rows in Gray code order, so only a
+single input changes from one row to the next, and re-evaluates only the gates
+that the change reaches.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+from collections import deque
+from functools import reduce
+import heapq
+import operator
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+
+
+# -------------------------------- GATE KERNELS --------------------------------
+# Every gate is evaluated as a reduction across its fanin followed by an
+# optional inversion. This lets n-input gates and their inverted counterparts
+# share one code path; NOT and WIRE are simply the single input cases of NOR
+# and OR. A BUFFER is a node without a logical function that is driven by
+# another node, e.g. an output port sitting behind a gate.
+GATE_KERNELS = {
+    "BUFFER": (np.logical_or, False),
+    "WIRE": (np.logical_or, False),
+    "NOT": (np.logical_or, True),
+    "AND": (np.logical_and, False),
+    "OR": (np.logical_or, False),
+    "XOR": (np.logical_xor, False),
+    "NAND": (np.logical_and, True),
+    "NOR": (np.logical_or, True),
+    "XNOR": (np.logical_xor, True),
+}
+
+
+# The same reductions over packed words, where every bit is a separate row.
+BITWISE_REDUCTIONS = {
+    np.logical_and: np.bitwise_and,
+    np.logical_or: np.bitwise_or,
+    np.logical_xor: np.bitwise_xor,
+}
+
+
+# The same kernels for single boolean values, used when walking the network one
+# input vector at a time.
+SCALAR_KERNELS = {
+    "BUFFER": (operator.or_, False),
+    "WIRE": (operator.or_, False),
+    "NOT": (operator.or_, True),
+    "AND": (operator.and_, False),
+    "OR": (operator.or_, False),
+    "XOR": (operator.xor, False),
+    "NAND": (operator.and_, True),
+    "NOR": (operator.or_, True),
+    "XNOR": (operator.xor, True),
+}
+
+
+def evaluate_gate(gate_type: str, input_values: Sequence[bool]) -> bool:
+    """
+    Evaluates a single gate for a single input vector.
+
+    Args:
+        gate_type: The function name of the gate, e.g. 'NOR'.
+        input_values: The boolean values of every node driving the gate.
+
+    Returns:
+        The boolean output of the gate. (True | False)
+    """
+    reduction, invert = SCALAR_KERNELS[gate_type]
+    result = bool(reduce(reduction, (bool(value) for value in input_values)))
+    return not result if invert else result
+
+
+def canonical_input_matrix(
+        num_inputs: int,
+        start: int = 0,
+        stop: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Generates the input half of a truth table in canonical discrete
+    mathematics ordering, i.e. the same ordering produced by
+    itertools.product([True, False], repeat=num_inputs).
+
+    Args:
+        num_inputs: Number of inputs into the circuit.
+        start: First row of the truth table to generate.
+        stop: One past the last row of the truth table to generate. Defaults
+            to the full table.
+
+    Returns:
+        Boolean array of shape (num_inputs, stop - start). Each row is one
+        input signal and each column is one row of the truth table.
+    """
+    if stop is None:
+        stop = 2 ** num_inputs
+    rows = np.arange(start, stop, dtype=np.int64)
+    # The first input is the most significant bit, and True comes first.
+    shifts = np.arange(num_inputs - 1, -1, -1, dtype=np.int64)
+    return ((rows[np.newaxis, :] >> shifts[:, np.newaxis]) & 1) == 0
+
+
+# ----------------------------- LEVELIZED SCHEDULE -----------------------------
+class LevelizedSchedule:
+    def __init__(
+            self,
+            gate_types: Sequence[str],
+            fanin: Sequence[Sequence[int]],
+            input_ids: Sequence[int],
+            output_ids: Sequence[int],
+    ):
+        """
+        A levelized schedule is a flattened, integer indexed view of a logic
+        network that has been topologically sorted. Gates that share a level,
+        a function, and a number of inputs are batched together so that a whole
+        group is evaluated with a single NumPy operation.
+
+        Args:
+            gate_types: The function name of each node, e.g. 'NOR', or 'INPUT'
+                for a primary input.
+            fanin: For each node, the indices of the nodes that drive it.
+            input_ids: Indices of the primary inputs, in input order.
+            output_ids: Indices of the primary outputs, in output order.
+        """
+        self.num_nodes = len(gate_types)
+        self.gate_types = list(gate_types)
+        self.fanin = [list(drivers) for drivers in fanin]
+        self.input_ids = np.asarray(input_ids, dtype=np.int64)
+        self.output_ids = np.asarray(output_ids, dtype=np.int64)
+        self.node_levels = self.levelize()
+        self.groups = self.group_levels()
+
+    def levelize(self) -> np.ndarray:
+        """
+        Assigns every node a level one greater than its deepest driver via
+        Kahn's algorithm. Primary inputs and undriven nodes sit at level zero.
+
+        Returns:
+            Array containing the level of each node.
+        """
+        fanout: List[List[int]] = [[] for _ in range(self.num_nodes)]
+        remaining = np.zeros(self.num_nodes, dtype=np.int64)
+        for node_id, drivers in enumerate(self.fanin):
+            remaining[node_id] = len(drivers)
+            for driver in drivers:
+                fanout[driver].append(node_id)
+        levels = np.zeros(self.num_nodes, dtype=np.int64)
+        queue = deque(np.flatnonzero(remaining == 0).tolist())
+        visited = 0
+        while queue:
+            node_id = queue.popleft()
+            visited += 1
+            for child in fanout[node_id]:
+                levels[child] = max(levels[child], levels[node_id] + 1)
+                remaining[child] -= 1
+                if not remaining[child]:
+                    queue.append(child)
+        if visited != self.num_nodes:
+            raise RuntimeError(
+                "Unable to levelize the logic network as it contains a "
+                "combinational loop. Please investigate."
+            )
+        return levels
+
+    def group_levels(self) -> List[Tuple[np.ndarray, np.ndarray, np.ufunc, bool]]:
+        """
+        Batches the gates of each level by function and number of inputs.
+
+        Returns:
+            An ordered list of (node ids, fanin matrix, reduction, inversion)
+            tuples that can be evaluated one after the other.
+        """
+        buckets: Dict[Tuple[int, str, int], List[int]] = {}
+        for node_id, gate_type in enumerate(self.gate_types):
+            # Inputs are set directly, and nodes that nothing drives are left
+            # at their initial value of False.
+            if gate_type == "INPUT" or not self.fanin[node_id]:
+                continue
+            if gate_type not in GATE_KERNELS:
+                raise RuntimeError(
+                    f"Unable to simulate gate type {gate_type}. Please "
+                    f"investigate."
+                )
+            key = (
+                int(self.node_levels[node_id]),
+                gate_type,
+                len(self.fanin[node_id]),
+            )
+            buckets.setdefault(key, []).append(node_id)
+        groups = []
+        for key in sorted(buckets):
+            _, gate_type, _ = key
+            node_ids = buckets[key]
+            reduction, invert = GATE_KERNELS[gate_type]
+            groups.append(
+                (
+                    np.asarray(node_ids, dtype=np.int64),
+                    np.asarray(
+                        [self.fanin[node_id] for node_id in node_ids],
+                        dtype=np.int64,
+                    ),
+                    reduction,
+                    invert,
+                )
+            )
+        return groups
+
+    def evaluate(self, input_matrix: np.ndarray) -> np.ndarray:
+        """
+        Simulates every node of the network for every column of the input
+        matrix in a single pass.
+
+        Args:
+            input_matrix: Boolean array of shape (number of inputs, rows).
+
+        Returns:
+            Boolean array of shape (number of nodes, rows) holding the value of
+            every node for every row.
+        """
+        input_matrix = np.asarray(input_matrix, dtype=bool)
+        if input_matrix.shape[0] != len(self.input_ids):
+            raise RuntimeError(
+                f"Requested input signals do not match with available inputs. "
+                f"Expected {len(self.input_ids)} input rows, received "
+                f"{input_matrix.shape[0]}."
+            )
+        values = np.zeros((self.num_nodes, input_matrix.shape[1]), dtype=bool)
+        values[self.input_ids] = input_matrix
+        for node_ids, fanin, reduction, invert in self.groups:
+            # Fancy indexing gives us (gates, inputs, rows), which we collapse
+            # across the inputs axis.
+            result = reduction.reduce(values[fanin], axis=1)
+            if invert:
+                np.logical_not(result, out=result)
+            values[node_ids] = result
+        return values
+
+    def evaluate_packed(self, packed_inputs: np.ndarray) -> np.ndarray:
+        """
+        Bit-parallel simulation, where each uint64 word carries 64 rows at
+        once and every gate is a bitwise operation across words.
+
+        Args:
+            packed_inputs: uint64 array of shape (number of inputs, words).
+
+        Returns:
+            uint64 array of shape (number of nodes, words) holding the packed
+            value of every node.
+        """
+        packed_inputs = np.asarray(packed_inputs, dtype=np.uint64)
+        if packed_inputs.shape[0] != len(self.input_ids):
+            raise RuntimeError(
+                f"Requested input signals do not match with available inputs. "
+                f"Expected {len(self.input_ids)} input rows, received "
+                f"{packed_inputs.shape[0]}."
+            )
+        values = np.zeros((self.num_nodes, packed_inputs.shape[1]), dtype=np.uint64)
+        values[self.input_ids] = packed_inputs
+        for node_ids, fanin, reduction, invert in self.groups:
+            result = BITWISE_REDUCTIONS[reduction].reduce(values[fanin], axis=1)
+            if invert:
+                np.invert(result, out=result)
+            values[node_ids] = result
+        return values
+
+    def evaluate_outputs(self, input_matrix: np.ndarray) -> np.ndarray:
+        """
+        Simulates the network and only returns the primary outputs.
+
+        Args:
+            input_matrix: Boolean array of shape (number of inputs, rows).
+
+        Returns:
+            Boolean array of shape (number of outputs, rows).
+        """
+        return self.evaluate(input_matrix)[self.output_ids]
+
+
+# -------------------------- EVENT DRIVEN SIMULATION ---------------------------
+def gray_code_flips(num_inputs: int) -> np.ndarray:
+    """
+    The input flipped at each step of a reflected binary Gray code walk over
+    every row of a truth table. Step i (for i >= 1) flips the lowest set bit of
+    i, which as the first input is the most significant bit is the input at
+    num_inputs - 1 - trailing zeros of i.
+
+    Returns:
+        Array of length 2 ** num_inputs - 1 holding input indices.
+    """
+    steps = np.arange(1, 2 ** num_inputs, dtype=np.int64)
+    trailing_zeros = np.zeros(len(steps), dtype=np.int64)
+    remaining = steps.copy()
+    while True:
+        even = (remaining & 1) == 0
+        if not even.any():
+            break
+        trailing_zeros[even] += 1
+        remaining[even] >>= 1
+    return num_inputs - 1 - trailing_zeros
+
+
+class EventDrivenSimulator:
+    def __init__(self, schedule: LevelizedSchedule):
+        """
+        Simulates a network one input vector at a time, but only re-evaluates
+        the part of the network that an input change actually reaches. Changes
+        are propagated in level order, and a gate whose value doesn't change
+        stops the event from travelling any further.
+
+        Args:
+            schedule: The levelized schedule of the network to simulate.
+        """
+        self.schedule = schedule
+        self.fanout: List[List[int]] = [[] for _ in range(schedule.num_nodes)]
+        for node_id, drivers in enumerate(schedule.fanin):
+            for driver in drivers:
+                self.fanout[driver].append(node_id)
+        self.node_levels = schedule.node_levels.tolist()
+        self.kernels = [
+            SCALAR_KERNELS.get(gate_type) for gate_type in schedule.gate_types
+        ]
+        self.values: List[bool] = [False] * schedule.num_nodes
+        # Number of gate evaluations performed by toggle_input.
+        self.gate_evaluations = 0
+
+    def initialize(self, input_values: Sequence[bool]):
+        """
+        Evaluates the whole network for a single input vector.
+        """
+        column = np.asarray(input_values, dtype=bool)[:, np.newaxis]
+        self.values = self.schedule.evaluate(column)[:, 0].tolist()
+
+    def toggle_input(self, input_index: int):
+        """
+        Flips a single primary input and propagates the change through its
+        fanout cone.
+
+        Args:
+            input_index: Position of the input, in input order.
+        """
+        values = self.values
+        node_id = int(self.schedule.input_ids[input_index])
+        values[node_id] = not values[node_id]
+        pending = set()
+        queue: List[Tuple[int, int]] = []
+        for child in self.fanout[node_id]:
+            if child not in pending:
+                pending.add(child)
+                heapq.heappush(queue, (self.node_levels[child], child))
+        while queue:
+            _, node_id = heapq.heappop(queue)
+            pending.discard(node_id)
+            reduction, invert = self.kernels[node_id]
+            self.gate_evaluations += 1
+            value = bool(
+                reduce(reduction, [values[d] for d in self.schedule.fanin[node_id]])
+            )
+            if invert:
+                value = not value
+            if value == values[node_id]:
+                continue
+            values[node_id] = value
+            for child in self.fanout[node_id]:
+                if child not in pending:
+                    pending.add(child)
+                    heapq.heappush(queue, (self.node_levels[child], child))
+
+    def evaluate_gray_code(self) -> np.ndarray:
+        """
+        Walks every row of the truth table in Gray code order, so each step
+        flips exactly one input, and collects the outputs in canonical order.
+
+        Returns:
+            Boolean array of shape (number of outputs, 2 ** inputs).
+        """
+        num_inputs = len(self.schedule.input_ids)
+        output_ids = self.schedule.output_ids.tolist()
+        outputs = np.zeros((len(output_ids), 2 ** num_inputs), dtype=bool)
+        # Row 0 of the canonical ordering has every input True.
+        self.initialize([True] * num_inputs)
+        self.gate_evaluations = 0
+        outputs[:, 0] = [self.values[node_id] for node_id in output_ids]
+        for step, input_index in enumerate(gray_code_flips(num_inputs).tolist(), 1):
+            self.toggle_input(input_index)
+            # The step's Gray code is the canonical row index.
+            row = step ^ (step >> 1)
+            outputs[:, row] = [self.values[node_id] for node_id in output_ids]
+        return outputs
+
+
+# ------------------------------ PACKED ROWS -----------------------------------
+def unpack_words(packed: np.ndarray, count: Optional[int] = None) -> np.ndarray:
+    """
+    Unpacks uint64 words into booleans, bit j of word w being row 64 * w + j.
+
+    Args:
+        packed: uint64 array of shape (signals, words).
+        count: Number of rows to keep. Defaults to every bit.
+
+    Returns:
+        Boolean array of shape (signals, rows).
+    """
+    packed = np.ascontiguousarray(packed, dtype="<u8")
+    bits = np.unpackbits(
+        packed.view(np.uint8).reshape(packed.shape[0], -1),
+        axis=1,
+        bitorder="little",
+    ).astype(bool)
+    return bits if count is None else bits[:, :count]
@@ -0,0 +1,364 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+A native parser for flat, gate-level structural verilog. It understands port
+lists (both ANSI and non-ANSI), input/output/wire declarations, primitive gate
+instances, and single operator continuous assignments, e.g.:
+
+    module struct(output x, input a, b, c);
+       wire w1, w2;
+       not (w1, c);
+       nor g0 (w2, a, b), g1 (x, w1, w2);
+       assign y = a & b;
+    endmodule
+
+This avoids pyverilog's external preprocessing step and full AST construction
+for the netlists we actually feed Ibis. Anything outside of this subset raises
+an UnsupportedVerilogError, at which point the caller should fall back to
+pyverilog.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+import re
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+
+# Bump this whenever the netlists the parser produces change, so netlists cached
+# from an older parser are never loaded.
+STRUCTURAL_VERILOG_PARSER_VERSION = 1
+
+
+class UnsupportedVerilogError(RuntimeError):
+    """
+    Raised when the native parser encounters a construct outside of the
+    gate-level structural subset.
+    """
+
+
+GATE_PRIMITIVES = {
+    "and": "AND",
+    "or": "OR",
+    "nand": "NAND",
+    "nor": "NOR",
+    "xor": "XOR",
+    "xnor": "XNOR",
+    "not": "NOT",
+    "buf": "WIRE",
+}
+ASSIGN_OPERATORS = {
+    "&": "AND",
+    "|": "OR",
+    "^": "XOR",
+}
+INVERTED_OPERATORS = {
+    "AND": "NAND",
+    "OR": "NOR",
+    "XOR": "XNOR",
+}
+DIRECTIONS = ("input", "output")
+
+TOKEN_PATTERN = re.compile(
+    r"""
+      (?P<space>\s+)
+    | (?P<line_comment>//.*)
+    | (?P<block_comment>/\*)
+    | (?P<escaped>\\\S+)
+    | (?P<identifier>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<symbol>[(),;=~&|^])
+    | (?P<other>.)
+    """,
+    re.VERBOSE,
+)
+
+Token = Tuple[str, str, int]
+
+
+# --------------------------------- TOKENIZER ----------------------------------
+def tokenize_verilog(stream: Iterable[str]) -> Iterator[Token]:
+    """
+    Lazily tokenizes verilog line by line, so arbitrarily large netlists are
+    never held in memory as a single string.
+
+    Args:
+        stream: Any iterable of lines, e.g. an open file.
+
+    Yields:
+        (kind, value, line number) tuples. Kinds are 'identifier', 'symbol',
+        and 'other' for any character the structural subset doesn't use.
+    """
+    in_block_comment = False
+    for line_number, line in enumerate(stream, start=1):
+        position = 0
+        if in_block_comment:
+            end = line.find("*/")
+            if end == -1:
+                continue
+            position = end + 2
+            in_block_comment = False
+        line_length = len(line)
+        while position < line_length:
+            match = TOKEN_PATTERN.match(line, position)
+            kind = match.lastgroup
+            position = match.end()
+            if kind in ("space", "line_comment"):
+                continue
+            if kind == "block_comment":
+                end = line.find("*/", position)
+                if end == -1:
+                    in_block_comment = True
+                    break
+                position = end + 2
+                continue
+            if kind == "escaped":
+                # An escaped identifier is equivalent to the bare identifier.
+                yield "identifier", match.group()[1:], line_number
+                continue
+            yield kind, match.group(), line_number
+
+
+# ---------------------------------- PARSER ------------------------------------
+class StructuralVerilogParser:
+    def __init__(self, tokens: Iterator[Token]):
+        """
+        A recursive descent parser over the structural subset that emits a
+        netlist in the same serialized format as LogicNetwork, ready to be
+        loaded with LogicNetwork.deserialize_netlist.
+
+        Args:
+            tokens: Token stream from tokenize_verilog.
+        """
+        self.tokens = tokens
+        self.current: Optional[Token] = next(self.tokens, None)
+        self.nodes: List[List[Optional[str]]] = []
+        self.edges: List[List[int]] = []
+        self.net_index: Dict[str, int] = {}
+        self.port_names: List[str] = []
+        self.directions: Dict[str, str] = {}
+
+    # ---------------------------- TOKEN HANDLING ------------------------------
+    def unsupported(self, reason: str):
+        line_number = self.current[2] if self.current is not None else "EOF"
+        raise UnsupportedVerilogError(
+            f"Line {line_number}: {reason} is not supported by the structural "
+            f"verilog parser."
+        )
+
+    def advance(self) -> Token:
+        token = self.current
+        if token is None:
+            self.unsupported("Unexpected end of file")
+        self.current = next(self.tokens, None)
+        return token
+
+    def peek_value(self) -> Optional[str]:
+        return self.current[1] if self.current is not None else None
+
+    def expect(self, value: str):
+        if self.peek_value() != value:
+            self.unsupported(f"Expected '{value}' but found '{self.peek_value()}'")
+        self.advance()
+
+    def expect_identifier(self) -> str:
+        if self.current is None or self.current[0] != "identifier":
+            self.unsupported(f"Expected an identifier but found '{self.peek_value()}'")
+        return self.advance()[1]
+
+    def accept(self, value: str) -> bool:
+        if self.peek_value() == value:
+            self.advance()
+            return True
+        return False
+
+    # -------------------------- NETLIST CONSTRUCTION --------------------------
+    def add_node(
+            self,
+            node_name: Optional[str],
+            function_name: Optional[str] = None,
+    ) -> int:
+        self.nodes.append([node_name, function_name])
+        return len(self.nodes) - 1
+
+    def get_net(self, net_name: str, function_name: Optional[str] = None) -> int:
+        # Referencing an undeclared net implicitly declares a wire, as per the
+        # standard.
+        if net_name not in self.net_index:
+            self.net_index[net_name] = self.add_node(net_name, function_name)
+        return self.net_index[net_name]
+
+    def add_gate(self, function_name: str, output_name: str, input_names: List[str]):
+        # Gates are left unnamed so that LogicNetwork labels them by function,
+        # e.g. NOR3, the same as when parsing via pyverilog.
+        gate_index = self.add_node(None, function_name)
+        for input_name in input_names:
+            self.edges.append([self.get_net(input_name), gate_index])
+        self.edges.append([gate_index, self.get_net(output_name)])
+
+    # -------------------------------- GRAMMAR ---------------------------------
+    def parse(self) -> dict:
+        """
+        Parses a single module.
+
+        Returns:
+            The serialized netlist.
+        """
+        self.expect("module")
+        self.expect_identifier()
+        if self.accept("("):
+            self.parse_port_list()
+        self.expect(";")
+        while not self.accept("endmodule"):
+            self.parse_module_item()
+        if self.current is not None:
+            self.unsupported("Multiple module definitions")
+        for port_name in self.port_names:
+            if port_name not in self.directions:
+                self.unsupported(f"Port {port_name} without a direction")
+        return {
+            "nodes": self.nodes,
+            "edges": self.edges,
+            "inputs": [
+                self.net_index[name] for name in self.port_names
+                if self.directions[name] == "input"
+            ],
+            "outputs": [
+                self.net_index[name] for name in self.port_names
+                if self.directions[name] == "output"
+            ],
+        }
+
+    def parse_port_list(self):
+        if self.accept(")"):
+            return
+        direction = None
+        while True:
+            if self.peek_value() in DIRECTIONS:
+                direction = self.advance()[1]
+                self.accept("wire")
+            elif self.peek_value() == "inout":
+                self.unsupported("Bidirectional port")
+            port_name = self.expect_identifier()
+            self.port_names.append(port_name)
+            self.get_net(port_name)
+            if direction is not None:
+                self.directions[port_name] = direction
+            if self.accept(")"):
+                return
+            self.expect(",")
+
+    def parse_identifier_list(self) -> List[str]:
+        names = [self.expect_identifier()]
+        while self.accept(","):
+            names.append(self.expect_identifier())
+        self.expect(";")
+        return names
+
+    def parse_module_item(self):
+        keyword = self.peek_value()
+        if self.current is None or self.current[0] != "identifier":
+            self.unsupported(f"Unexpected '{keyword}'")
+        if keyword in DIRECTIONS:
+            self.advance()
+            self.accept("wire")
+            for name in self.parse_identifier_list():
+                if name not in self.port_names:
+                    self.unsupported(f"Declaration of {name} outside of the port list")
+                self.directions[name] = keyword
+        elif keyword == "wire":
+            self.advance()
+            names = self.parse_identifier_list()
+            # Mirrors the pyverilog path, where each net of a multi-net wire
+            # declaration becomes a WIRE node.
+            function_name = "WIRE" if len(names) > 1 else None
+            for name in names:
+                self.get_net(name, function_name)
+        elif keyword in GATE_PRIMITIVES:
+            self.advance()
+            self.parse_gate_instances(GATE_PRIMITIVES[keyword])
+        elif keyword == "assign":
+            self.advance()
+            self.parse_assignment()
+        else:
+            self.unsupported(f"'{keyword}'")
+
+    def parse_gate_instances(self, function_name: str):
+        while True:
+            if self.current is not None and self.current[0] == "identifier":
+                # Instance names are optional and carry no logical meaning.
+                self.advance()
+            self.expect("(")
+            terminals = [self.expect_identifier()]
+            while self.accept(","):
+                terminals.append(self.expect_identifier())
+            self.expect(")")
+            if len(terminals) < 2:
+                self.unsupported(f"{function_name} gate without inputs")
+            if function_name in ("NOT", "WIRE") and len(terminals) != 2:
+                self.unsupported(f"{function_name} gate with multiple terminals")
+            self.add_gate(function_name, terminals[0], terminals[1:])
+            if self.accept(";"):
+                return
+            self.expect(",")
+
+    def parse_assignment(self):
+        output_name = self.expect_identifier()
+        self.expect("=")
+        inverted = self.accept("~")
+        if inverted and self.accept("("):
+            function_name, input_names = self.parse_operation()
+            self.expect(")")
+            function_name = INVERTED_OPERATORS.get(function_name)
+            if function_name is None:
+                self.unsupported("Inversion of a bare identifier in parentheses")
+        elif inverted:
+            function_name, input_names = "NOT", [self.expect_identifier()]
+        else:
+            function_name, input_names = self.parse_operation()
+        self.expect(";")
+        self.add_gate(function_name, output_name, input_names)
+
+    def parse_operation(self) -> Tuple[str, List[str]]:
+        left_name = self.expect_identifier()
+        operator = self.peek_value()
+        if operator not in ASSIGN_OPERATORS:
+            return "WIRE", [left_name]
+        self.advance()
+        return ASSIGN_OPERATORS[operator], [left_name, self.expect_identifier()]
+
+
+def parse_structural_verilog(stream: Iterable[str]) -> dict:
+    """
+    Parses flat, gate-level structural verilog.
+
+    Args:
+        stream: Any iterable of lines, e.g. an open file.
+
+    Returns:
+        The serialized netlist, see LogicNetwork.serialize_netlist.
+
+    Raises:
+        UnsupportedVerilogError: If the verilog falls outside of the structural
+            subset.
+    """
+    return StructuralVerilogParser(tokenize_verilog(stream)).parse()
+
+
+def parse_structural_verilog_file(verilog_fp: str) -> dict:
+    """
+    Parses a flat, gate-level structural verilog file.
+
+    Args:
+        verilog_fp: Filepath of the verilog file.
+
+    Returns:
+        The serialized netlist, see LogicNetwork.serialize_netlist.
+    """
+    with open(verilog_fp, "r") as verilog_file:
+        return parse_structural_verilog(verilog_file)
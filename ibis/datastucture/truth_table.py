@@ -0,0 +1,354 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Packed bit vector truth tables.
+
+A truth table never needs to store its input columns, since rows are always in
+canonical discrete mathematics ordering (the same ordering as
+itertools.product([True, False], repeat=inputs)) and the inputs of a row follow
+from its index. Each output is stored as a packed bit vector, one bit per row,
+which is 64 times smaller than a float64 table and makes comparing tables a
+matter of XORing bytes.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+import csv
+import hashlib
+from typing import (
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Union,
+)
+
+import numpy as np
+
+from .simulation import canonical_input_matrix
+
+# Number of set bits in every possible byte.
+POPCOUNT_TABLE = np.array(
+    [bin(value).count("1") for value in range(256)],
+    dtype=np.uint8,
+)
+
+
+def popcount(packed: np.ndarray, axis: int = -1) -> np.ndarray:
+    """
+    Counts the set bits of packed bit vectors along an axis.
+    """
+    return POPCOUNT_TABLE[packed].sum(axis=axis, dtype=np.int64)
+
+
+class TruthTableChunk(NamedTuple):
+    """
+    A block of consecutive rows of a truth table.
+
+    Args:
+        start: Index of the first row of the block.
+        input_matrix: Boolean array of shape (inputs, rows).
+        output_matrix: Boolean array of shape (outputs, rows).
+    """
+    start: int
+    input_matrix: np.ndarray
+    output_matrix: np.ndarray
+
+    def to_array(self) -> np.ndarray:
+        """
+        The block in the layout of LogicNetwork.generate_truth_table.
+        """
+        return np.vstack([self.input_matrix, self.output_matrix]).T.astype(float)
+
+
+class TruthTable:
+    def __init__(
+            self,
+            num_inputs: int,
+            packed_outputs: np.ndarray,
+            input_names: Optional[List[str]] = None,
+            output_names: Optional[List[str]] = None,
+    ):
+        """
+        A truth table whose outputs are stored as packed bit vectors. Tables
+        are treated as immutable; two tables are equal if they have the same
+        number of inputs and the same outputs, regardless of names.
+
+        Args:
+            num_inputs: Number of inputs. The table has 2 ** num_inputs rows.
+            packed_outputs: uint8 array of shape (outputs, bytes) as produced
+                by np.packbits over each output column. Padding bits must be
+                zero.
+            input_names: Optional names of the inputs.
+            output_names: Optional names of the outputs.
+        """
+        self.num_inputs = num_inputs
+        self.packed_outputs = np.ascontiguousarray(packed_outputs, dtype=np.uint8)
+        self.packed_outputs.setflags(write=False)
+        self.input_names = input_names
+        self.output_names = output_names
+
+    # ----------------------------- CONSTRUCTION -------------------------------
+    @classmethod
+    def from_output_matrix(
+            cls,
+            output_matrix: np.ndarray,
+            num_inputs: int,
+            input_names: Optional[List[str]] = None,
+            output_names: Optional[List[str]] = None,
+    ) -> "TruthTable":
+        """
+        Packs the output of LogicNetwork.simulate, i.e. a boolean array of
+        shape (outputs, rows).
+        """
+        output_matrix = np.asarray(output_matrix, dtype=bool)
+        if output_matrix.ndim == 1:
+            output_matrix = output_matrix[np.newaxis, :]
+        if output_matrix.shape[1] != 2 ** num_inputs:
+            raise RuntimeError(
+                f"A truth table with {num_inputs} inputs has {2 ** num_inputs} "
+                f"rows, received {output_matrix.shape[1]}."
+            )
+        return cls(
+            num_inputs=num_inputs,
+            packed_outputs=np.packbits(output_matrix, axis=1),
+            input_names=input_names,
+            output_names=output_names,
+        )
+
+    @classmethod
+    def from_array(cls, truth_table: np.ndarray, num_inputs: int) -> "TruthTable":
+        """
+        Packs a table in the layout of LogicNetwork.generate_truth_table, i.e.
+        shape (rows, inputs + outputs).
+        """
+        truth_table = np.asarray(truth_table)
+        return cls.from_output_matrix(truth_table[:, num_inputs:].T != 0, num_inputs)
+
+    @classmethod
+    def from_vector(
+            cls,
+            values: Iterable[Union[int, bool]],
+            num_inputs: Optional[int] = None,
+    ) -> "TruthTable":
+        """
+        Packs a single output truth vector, e.g. [0, 0, 0, 1].
+        """
+        values = np.asarray(list(values))
+        if num_inputs is None:
+            num_inputs = int(len(values)).bit_length() - 1
+        return cls.from_output_matrix(values != 0, num_inputs)
+
+    # -------------------------------- ACCESSORS -------------------------------
+    @property
+    def num_rows(self) -> int:
+        return 2 ** self.num_inputs
+
+    @property
+    def num_outputs(self) -> int:
+        return self.packed_outputs.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.packed_outputs.nbytes
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def get_output(self, output_index: int = 0) -> np.ndarray:
+        """
+        Unpacks a single output column as a boolean array.
+        """
+        return np.unpackbits(
+            self.packed_outputs[output_index],
+            count=self.num_rows,
+        ).astype(bool)
+
+    def get_output_matrix(self) -> np.ndarray:
+        """
+        Unpacks every output, as a boolean array of shape (outputs, rows).
+        """
+        return np.unpackbits(
+            self.packed_outputs,
+            axis=1,
+            count=self.num_rows,
+        ).astype(bool)
+
+    def get_truth_vector(self, output_index: int = 0) -> np.ndarray:
+        """
+        The 0/1 column of a single output.
+        """
+        return self.get_output(output_index).astype(np.uint8)
+
+    def to_vector(self) -> np.ndarray:
+        """
+        Every output as a single 0/1 vector, row by row, with the outputs of a
+        row next to each other. This is the layout GeneticCircuit and Blade
+        experimental data use.
+        """
+        return self.get_output_matrix().T.reshape(-1).astype(np.uint8)
+
+    def to_array(self) -> np.ndarray:
+        """
+        Expands the table to the layout of LogicNetwork.generate_truth_table,
+        i.e. a float array of shape (rows, inputs + outputs).
+        """
+        input_matrix = canonical_input_matrix(self.num_inputs)
+        return np.vstack(
+            [input_matrix, self.get_output_matrix()]
+        ).T.astype(float)
+
+    # ------------------------------- COMPARISON -------------------------------
+    def check_compatible(self, other: "TruthTable"):
+        if (self.num_inputs, self.num_outputs) != (other.num_inputs, other.num_outputs):
+            raise RuntimeError(
+                f"Unable to compare a truth table with {self.num_inputs} inputs "
+                f"and {self.num_outputs} outputs to one with {other.num_inputs} "
+                f"inputs and {other.num_outputs} outputs."
+            )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, TruthTable):
+            return NotImplemented
+        return (
+            self.num_inputs == other.num_inputs
+            and np.array_equal(self.packed_outputs, other.packed_outputs)
+        )
+
+    def __hash__(self) -> int:
+        return hash((self.num_inputs, self.packed_outputs.tobytes()))
+
+    def canonical_hash(self) -> str:
+        """
+        A stable SHA256 digest of the table's function, e.g. to deduplicate a
+        library of circuits across runs. Names are not part of the hash.
+        """
+        digest = hashlib.sha256()
+        digest.update(
+            np.array(
+                [self.num_inputs, self.num_outputs],
+                dtype="<i8",
+            ).tobytes()
+        )
+        digest.update(self.packed_outputs.tobytes())
+        return digest.hexdigest()
+
+    def hamming_distance(self, other: "TruthTable") -> np.ndarray:
+        """
+        Counts the rows in which each output differs between two tables.
+
+        Returns:
+            Array with the distance of each output.
+        """
+        self.check_compatible(other)
+        return popcount(self.packed_outputs ^ other.packed_outputs)
+
+    # --------------------------------- SETS -----------------------------------
+    def count_on(self, output_index: int = 0) -> int:
+        return int(popcount(self.packed_outputs[output_index]))
+
+    def get_on_set(self, output_index: int = 0) -> np.ndarray:
+        """
+        The indices of every row where an output is True.
+        """
+        return np.flatnonzero(self.get_output(output_index))
+
+    def get_off_set(self, output_index: int = 0) -> np.ndarray:
+        """
+        The indices of every row where an output is False.
+        """
+        return np.flatnonzero(~self.get_output(output_index))
+
+
+def hamming_distance_matrix(
+        tables: Sequence[TruthTable],
+        output_index: int = 0,
+) -> np.ndarray:
+    """
+    Pairwise Hamming distances of an output across a library of tables, all
+    at once.
+
+    Args:
+        tables: Tables with the same number of inputs.
+        output_index: Which output to compare.
+
+    Returns:
+        Array of shape (tables, tables).
+    """
+    for table in tables[1:]:
+        if table.num_inputs != tables[0].num_inputs:
+            raise RuntimeError(
+                "Unable to compare truth tables with differing numbers of "
+                "inputs."
+            )
+    packed = np.stack([table.packed_outputs[output_index] for table in tables])
+    return popcount(packed[:, np.newaxis, :] ^ packed[np.newaxis, :, :])
+
+
+# ---------------------------------- STREAMING ---------------------------------
+def write_truth_table_csv(
+        output_fp: str,
+        chunks: Iterable[TruthTableChunk],
+        input_names: Sequence[str],
+        output_names: Sequence[str],
+):
+    """
+    Writes a streamed truth table as CSV, one row per line with 0/1 values
+    and a header of input and output names.
+
+    Args:
+        output_fp: Filepath to write to.
+        chunks: Blocks of the table, e.g. from LogicNetwork.iterate_truth_table.
+        input_names: Names of the inputs.
+        output_names: Names of the outputs.
+    """
+    with open(output_fp, "w", newline="") as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(list(input_names) + list(output_names))
+        for chunk in chunks:
+            writer.writerows(
+                np.vstack([chunk.input_matrix, chunk.output_matrix]).T.astype(np.uint8)
+            )
+
+
+def write_truth_table_binary(output_fp: str, chunks: Iterable[TruthTableChunk]):
+    """
+    Writes the outputs of a streamed truth table as a packed bit stream: row
+    by row, with the outputs of a row next to each other, most significant bit
+    first, and the final byte zero padded. Every block but the last must hold
+    a multiple of eight rows.
+
+    Args:
+        output_fp: Filepath to write to.
+        chunks: Blocks of the table, e.g. from LogicNetwork.iterate_truth_table.
+    """
+    with open(output_fp, "wb") as output_file:
+        final_chunk = False
+        for chunk in chunks:
+            if final_chunk:
+                raise RuntimeError(
+                    "Only the final block of a binary truth table may hold a "
+                    "number of rows that isn't a multiple of eight."
+                )
+            final_chunk = chunk.output_matrix.shape[1] % 8 != 0
+            output_file.write(np.packbits(chunk.output_matrix.T.reshape(-1)).tobytes())
+
+
+def read_truth_table_binary(
+        input_fp: str,
+        num_inputs: int,
+        num_outputs: int,
+) -> TruthTable:
+    """
+    Loads a truth table written by write_truth_table_binary.
+    """
+    num_rows = 2 ** num_inputs
+    bits = np.unpackbits(
+        np.fromfile(input_fp, dtype=np.uint8),
+        count=num_rows * num_outputs,
+    )
+    return TruthTable.from_output_matrix(
+        bits.reshape(num_rows, num_outputs).T.astype(bool),
+        num_inputs,
+    )
@@ -6,19 +6,28 @@ Datastructure describing the various attributes of a Genetic Circuit
 Written by W.R. Jackson, Ben Bremer, Eric South
 --------------------------------------------------------------------------------
 """
-from collections import namedtuple
 import copy
 import dataclasses
+import hashlib
 import os
 import json
 from typing import (
+    Callable,
     Dict,
     List,
+    Optional,
     Union,
     Tuple,
 )
 
+import numpy as np
 import sympy
+from sympy.printing.numpy import NumPyPrinter
+
+from .parse_cache import (
+    load_cached_ucf,
+    store_cached_ucf,
+)
 
 
 @dataclasses.dataclass
@@ -38,6 +47,24 @@ class SensorParameter:
     description: str
 
 
+def generate_numpy_source(expression: sympy.Expr, argument_names: List[str]) -> str:
+    """
+    Prints an expression as the source of a NumPy lambda. Unlike a lambdified
+    function, the source can be pickled, and compiling it needs no sympy.
+    """
+    return (
+        f"lambda {', '.join(argument_names)}: "
+        f"({NumPyPrinter().doprint(expression)})"
+    )
+
+
+def compile_numpy_source(source: str) -> Callable:
+    """
+    Compiles the source generated by generate_numpy_source.
+    """
+    return eval(source, {"numpy": np})
+
+
 @dataclasses.dataclass
 class ResponseFunction:
     """"""
@@ -50,13 +77,96 @@ class ResponseFunction:
     def __post_init__(self):
         self.equation = self.equation.replace("$STATE", "state")
         self.expression = sympy.sympify(self.equation)
+        # The parameters the equation actually depends on, in sorted order.
+        self.argument_names = sorted(
+            symbol.name for symbol in self.expression.free_symbols
+            if symbol.name != "state"
+        )
+        self.source = generate_numpy_source(
+            self.expression,
+            ["state"] + self.argument_names,
+        )
+        self._function: Optional[Callable] = None
+
+    def __getstate__(self):
+        # Pickles only carry the source of the compiled function, and the
+        # expression is rebuilt should the symbolic path ever be used.
+        state = self.__dict__.copy()
+        state["_function"] = None
+        state["expression"] = None
+        return state
+
+    def get_expression(self) -> sympy.Expr:
+        if self.expression is None:
+            self.expression = sympy.sympify(self.equation)
+        return self.expression
+
+    def get_function(self) -> Callable:
+        """
+        The equation compiled into a NumPy function of the state and of every
+        parameter in argument_names, in that order.
+        """
+        if self._function is None:
+            self._function = compile_numpy_source(self.source)
+        return self._function
+
+    def evaluate(
+            self,
+            state_input: np.ndarray,
+            parameter_values: Dict[str, np.ndarray],
+    ) -> np.ndarray:
+        """
+        Evaluates the equation with arrays of parameter values, e.g. a batch
+        of perturbed sensor parameters, broadcast against the state.
+        """
+        return np.asarray(
+            self.get_function()(
+                state_input,
+                *[parameter_values[name] for name in self.argument_names],
+            ),
+            dtype=np.float64,
+        )
+
+    def compile(
+            self, sensor_constants: Dict[str, SensorParameter]
+    ) -> Callable[[Union[float, np.ndarray]], Union[float, np.ndarray]]:
+        """
+        Compiles the equation into a NumPy function of the state, with the
+        sensor parameters bound as constants. The equation is only compiled
+        once per response function, however many sensors share it.
+
+        Args:
+            sensor_constants: The parameters of a sensor.
+
+        Returns:
+            A function taking a state or an array of states, and returning a
+            float or an array of floats respectively. The results match
+            calculate_score.
+        """
+        function = self.get_function()
+        constants = [
+            float(sensor_constants[name].value) for name in self.argument_names
+        ]
+
+        def response(state_input):
+            state_input = np.asarray(state_input, dtype=np.float64)
+            # Equations that don't depend on the state return a scalar.
+            result = np.broadcast_to(
+                np.asarray(function(state_input, *constants), dtype=np.float64),
+                state_input.shape,
+            )
+            if result.ndim == 0:
+                return float(result)
+            return result.copy()
+
+        return response
 
     def calculate_score(
             self, state_input: float, sensor_constants: Dict[str, SensorParameter]
     ):
         # We want our primary equation to remain 'clean' but we need to mutate
         # the symbolic representation of the equation to get what we want.
-        temp_resolve = copy.copy(self.expression)
+        temp_resolve = copy.copy(self.get_expression())
         param_list = [["state", state_input]]
         for param in self.parameters:
             param_key = param.parameter_name
@@ -74,14 +184,29 @@ class CelloInputSensor:
     sensor_parameters: Dict[str, SensorParameter]
     sensor_output: List[str]
 
+    def __post_init__(self):
+        self.compiled_response = self.response_function.compile(
+            self.sensor_parameters
+        )
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["compiled_response"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.compiled_response = self.response_function.compile(
+            self.sensor_parameters
+        )
+
     def get_response_function(self):
         return self.response_function
 
-    def get_score(self, state_input: float):
-        return self.response_function.calculate_score(
-            state_input=state_input,
-            sensor_constants=self.sensor_parameters,
-        )
+    def get_score(
+            self, state_input: Union[float, np.ndarray]
+    ) -> Union[float, np.ndarray]:
+        return self.compiled_response(state_input)
 
 
 @dataclasses.dataclass
@@ -90,9 +215,35 @@ class CelloInputs:
 
     def __post_init__(self):
         self.sensor_table = {}
+        self.level_table: Optional[np.ndarray] = None
 
     def add_sensor(self, name: str, sensor: CelloInputSensor):
         self.sensor_table[name] = sensor
+        self.level_table = None
+
+    def get_level_table(self) -> np.ndarray:
+        """
+        The OFF and ON level of every sensor, of shape (sensors, 2) in sensor
+        order. A sensor only ever has those two states, so its response
+        function is evaluated twice here rather than once per truth table row.
+        """
+        if self.level_table is None:
+            self.level_table = np.array(
+                [
+                    sensor.get_score(np.array([0.0, 1.0]))
+                    for sensor in self.sensor_table.values()
+                ]
+            ).reshape(len(self.sensor_table), 2)
+        return self.level_table
+
+    def get_sensor_levels(self, sensor_names: List[str]) -> np.ndarray:
+        """
+        The rows of the level table for the passed in sensors, in order.
+        """
+        order = list(self.sensor_table.keys())
+        return self.get_level_table()[
+            [order.index(name) for name in sensor_names]
+        ].reshape(len(sensor_names), 2)
 
     def get_sensor(self, sensor_name: str):
         return self.sensor_table[sensor_name]
@@ -110,86 +261,275 @@ class CelloInputs:
             self,
             logical_input: Union[List[bool], Tuple[bool], Dict[str, bool]],
     ):
+        level_table = self.get_level_table()
+        order = {name: index for index, name in enumerate(self.sensor_table)}
         out_scores = []
         for key in logical_input:
             boolean_value = logical_input[key]
-            internal_sensor = self.get_sensor(key)
             # I think what I should be doing is kind of sweeping across
             # -1 to +1 and getting the curve that way and comparing the two
-            out_scores.append(internal_sensor.get_score(int(boolean_value)))
+            out_scores.append(float(level_table[order[key], int(boolean_value)]))
         return out_scores
 
 
-def parse_cello_input_file(fp: str):
+def read_ucf_records(fp: str) -> Tuple[Dict[Tuple[str, str], dict], str, os.stat_result]:
+    """
+    Reads a UCF file and indexes its records by collection and name, so
+    references between records resolve in constant time.
+
+    Args:
+        fp: Filepath of the UCF file.
+
+    Returns:
+        The indexed records in file order, the content hash of the file, and
+        the stat of the file taken before it was read.
+    """
     if not os.path.isfile(fp):
         raise RuntimeError(f"Unable to locate input file {fp}, please investigate.")
-    with open(fp, "r") as input_file:
-        cello_input = CelloInputs()
-        raw_input_file: List[dict] = json.load(input_file)
-        # Collect all possible input sensor names, and then aggregate them
-        sensor_list = []
-        SensorField = namedtuple("SensorField", ["name", "model", "structure"])
-        for obj in raw_input_file:
-            if "collection" in obj:
-                if obj["collection"] == "input_sensors":
-                    temp_sensor = SensorField(
-                        obj["name"],
-                        obj["model"],
-                        obj["structure"],
+    stat = os.stat(fp)
+    with open(fp, "rb") as input_file:
+        raw_bytes = input_file.read()
+    raw_input_file: List[dict] = json.loads(raw_bytes)
+    records = {}
+    for obj in raw_input_file:
+        if "collection" in obj and "name" in obj:
+            records[(obj["collection"], obj["name"])] = obj
+    return records, hashlib.sha256(raw_bytes).hexdigest(), stat
+
+
+def get_ucf_record(
+        records: Dict[Tuple[str, str], dict],
+        collection: str,
+        name: str,
+        referrer: str,
+) -> dict:
+    record = records.get((collection, name))
+    if record is None:
+        raise RuntimeError(
+            f"Unable to find {collection} record {name} referenced by "
+            f"{referrer}, please investigate."
+        )
+    return record
+
+
+def parse_cello_input_file(fp: str, use_cache: bool = True) -> CelloInputs:
+    """
+    Parses the input sensors of a Cello UCF, resolving their models, response
+    functions and structures in a single pass over the indexed records.
+
+    Args:
+        fp: Filepath of the input file.
+        use_cache: Whether to load the parsed sensors from the on-disk cache,
+            which is validated against the size, mtime and content hash of
+            the file.
+
+    Returns:
+        The input sensors, in file order.
+    """
+    if use_cache and os.path.isfile(fp):
+        cello_input = load_cached_ucf(fp, "inputs")
+        if cello_input is not None:
+            return cello_input
+    records, digest, stat = read_ucf_records(fp)
+    cello_input = CelloInputs()
+    # Sensors sharing a response function share its compiled form too.
+    response_functions: Dict[str, ResponseFunction] = {}
+    for (collection, name), sensor in records.items():
+        if collection != "input_sensors":
+            continue
+        model = get_ucf_record(records, "models", sensor["model"], name)
+        func_name = model["functions"]["response_function"]
+        if func_name not in response_functions:
+            function = get_ucf_record(records, "functions", func_name, name)
+            response_functions[func_name] = ResponseFunction(
+                function_name=func_name,
+                equation=function["equation"],
+                parameters=[
+                    ResponseFunctionParameter(
+                        parameter_name=parameter["name"],
+                        parameter_map=parameter["map"],
                     )
-                    sensor_list.append(temp_sensor)
-        for sensor in sensor_list:
-            # Name Parsing
-            name = sensor.name
-            # Model and Response Function Parsing
-            sensor_model_label = sensor.model
-            sensor_parameters = {}
-            response_function = None
-            for i in raw_input_file:
-                # We assume no duplicates within the input file.
-                if i["name"] == sensor_model_label:
-                    # Get the response function for this sensor.
-                    func_name = i["functions"]["response_function"]
-                    for j in raw_input_file:
-                        if j["collection"] == "functions":
-                            if j["name"] == func_name:
-                                parameter_list = []
-                                for k in j["parameters"]:
-                                    c_param = ResponseFunctionParameter(
-                                        parameter_name=k["name"],
-                                        parameter_map=k["map"],
-                                    )
-                                    parameter_list.append(c_param)
-                                response_function = ResponseFunction(
-                                    function_name=func_name,
-                                    equation=j["equation"],
-                                    parameters=parameter_list,
-                                )
-                    for l in i["parameters"]:
-                        sensor_parameters[l["name"]] = SensorParameter(
-                            name=l["name"],
-                            value=l["value"],
-                            description=l["description"],
-                        )
-            # Output
-            sensor_outputs = None
-            for i in raw_input_file:
-                # We assume no duplicates within the input file.
-                if i["name"] == sensor.structure:
-                    sensor_outputs = i["outputs"]
-            sensor_obj = CelloInputSensor(
-                sensor_name=name,
-                response_function=response_function,
-                sensor_parameters=sensor_parameters,
-                sensor_output=sensor_outputs,
-            )
-            cello_input.add_sensor(
-                name=sensor.name,
-                sensor=sensor_obj,
+                    for parameter in function["parameters"]
+                ],
             )
+        structure = records.get(("structures", sensor["structure"]))
+        cello_input.add_sensor(
+            name=name,
+            sensor=CelloInputSensor(
+                sensor_name=name,
+                response_function=response_functions[func_name],
+                sensor_parameters={
+                    parameter["name"]: SensorParameter(
+                        name=parameter["name"],
+                        value=parameter["value"],
+                        description=parameter["description"],
+                    )
+                    for parameter in model["parameters"]
+                },
+                sensor_output=None if structure is None else structure["outputs"],
+            ),
+        )
+    # Built up front, so cached input files carry it too.
+    cello_input.get_level_table()
+    if use_cache:
+        store_cached_ucf(fp, "inputs", cello_input, digest, stat)
     return cello_input
 
 
+@dataclasses.dataclass
+class CelloGate:
+    """"""
+
+    gate_name: str
+    group: str
+    gate_type: str
+    parameters: Dict[str, float]
+
+
+@dataclasses.dataclass
+class CelloGateLibrary:
+    """
+    The repressor gates of a UCF, all sharing a single response function.
+    Parameters are also kept as one array per parameter across every gate, so
+    a whole batch of gate assignments can be evaluated at once.
+    """
+
+    gates: List[CelloGate]
+    equation: str
+    variable_name: str = "x"
+
+    def __post_init__(self):
+        self.parameter_names = sorted(self.gates[0].parameters) if self.gates else []
+        self.parameter_arrays = {
+            name: np.array([gate.parameters[name] for gate in self.gates])
+            for name in self.parameter_names
+        }
+        self.groups = [gate.group for gate in self.gates]
+        argument_names = [self.variable_name] + self.parameter_names
+        # Names such as 'beta' would otherwise resolve to sympy functions.
+        symbols = {name: sympy.Symbol(name) for name in argument_names}
+        self.source = generate_numpy_source(
+            sympy.sympify(self.equation, locals=symbols),
+            argument_names,
+        )
+        self._response: Optional[Callable] = None
+
+    def __len__(self) -> int:
+        return len(self.gates)
+
+    def __getstate__(self):
+        # Compiled functions can't be pickled, so they're recompiled from
+        # their source on first use.
+        state = self.__dict__.copy()
+        state["_response"] = None
+        return state
+
+    def get_gate_names(self) -> List[str]:
+        return [gate.gate_name for gate in self.gates]
+
+    def get_response_function(self) -> Callable:
+        """
+        The response function compiled into a NumPy function of the input
+        and every parameter, in that order.
+        """
+        if self._response is None:
+            self._response = compile_numpy_source(self.source)
+        return self._response
+
+    def evaluate(self, gate_indices: np.ndarray, state_input: np.ndarray) -> np.ndarray:
+        """
+        Evaluates the response of many gates at once.
+
+        Args:
+            gate_indices: Indices of gates within the library. Broadcast
+                against state_input.
+            state_input: The input activity of each gate.
+
+        Returns:
+            The output activity of each gate.
+        """
+        return self.evaluate_parameters(
+            {name: self.parameter_arrays[name][gate_indices] for name in self.parameter_names},
+            state_input,
+        )
+
+    def evaluate_parameters(
+            self,
+            parameters: Dict[str, np.ndarray],
+            state_input: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Evaluates the response function with arbitrary parameter values, e.g.
+        perturbed copies of the parameters of assigned gates.
+
+        Args:
+            parameters: Value of every parameter in parameter_names.
+                Broadcast against state_input.
+            state_input: The input activity of each gate.
+
+        Returns:
+            The output activity of each gate.
+        """
+        return self.get_response_function()(
+            state_input,
+            *[parameters[name] for name in self.parameter_names],
+        )
+
+
+def parse_cello_gate_library(fp: str, use_cache: bool = True) -> CelloGateLibrary:
+    """
+    Parses the gates of a Cello UCF, along with their models and response
+    function.
+
+    Args:
+        fp: Filepath of the UCF.
+        use_cache: Whether to load the parsed library from the on-disk cache,
+            which is validated against the size, mtime and content hash of
+            the file.
+
+    Returns:
+        The gate library.
+    """
+    if use_cache and os.path.isfile(fp):
+        gate_library = load_cached_ucf(fp, "gates")
+        if gate_library is not None:
+            return gate_library
+    records, digest, stat = read_ucf_records(fp)
+    gates = []
+    function_names = set()
+    for (collection, name), obj in records.items():
+        if collection != "gates":
+            continue
+        model = get_ucf_record(records, "models", obj["model"], name)
+        function_names.add(model["functions"]["response_function"])
+        gates.append(
+            CelloGate(
+                gate_name=name,
+                group=obj.get("group", name),
+                gate_type=obj.get("gate_type", "NOR"),
+                parameters={
+                    parameter["name"]: float(parameter["value"])
+                    for parameter in model["parameters"]
+                },
+            )
+        )
+    if len(function_names) != 1:
+        raise RuntimeError(
+            f"Expected every gate in {fp} to share one response function, "
+            f"found {sorted(function_names)}. Please investigate."
+        )
+    function = get_ucf_record(records, "functions", function_names.pop(), fp)
+    variables = function.get("variables", [{"name": "x"}])
+    gate_library = CelloGateLibrary(
+        gates=gates,
+        equation=function["equation"].replace("$STATE", "x"),
+        variable_name=variables[0]["name"],
+    )
+    if use_cache:
+        store_cached_ucf(fp, "gates", gate_library, digest, stat)
+    return gate_library
+
+
 if __name__ == "__main__":
     fn = "../../tests/test_cello/test_ucf_files/Eco1C1G1T1.input.json"
     out = parse_cello_input_file(fn)
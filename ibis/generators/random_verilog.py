@@ -0,0 +1,107 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Generates random, flat gate-level structural verilog netlists. Useful for
+benchmarking and stress testing anything that consumes a LogicNetwork.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+import random
+from typing import (
+    List,
+    Optional,
+)
+
+from ibis.datastucture.netlist import CompactNetlist
+from ibis.datastucture.structural_verilog import parse_structural_verilog
+
+GATE_CHOICES = ["and", "or", "nand", "nor", "xor", "xnor", "not"]
+
+
+def generate_random_structural_verilog(
+        num_inputs: int = 8,
+        num_outputs: int = 2,
+        num_gates: int = 1000,
+        seed: Optional[int] = None,
+        locality: int = 64,
+        module_name: str = "random_netlist",
+) -> str:
+    """
+    Generates a random combinational netlist. Each gate draws its inputs from
+    the primary inputs and previously generated gates, so the result is always
+    acyclic, and fanout and reconvergence happen naturally.
+
+    Args:
+        num_inputs: Number of primary inputs.
+        num_outputs: Number of primary outputs. The final gates of the netlist
+            drive the outputs.
+        num_gates: Total number of gates, including the output gates.
+        seed: Seed for the random number generator.
+        locality: Gates preferentially draw their inputs from the last
+            `locality` signals, which keeps the netlist deep rather than wide.
+        module_name: Name of the generated module.
+
+    Returns:
+        The verilog source of the netlist.
+    """
+    if num_gates < num_outputs:
+        raise RuntimeError(
+            f"Unable to drive {num_outputs} outputs with {num_gates} gates."
+        )
+    rng = random.Random(seed)
+    input_names = [f"in{index}" for index in range(num_inputs)]
+    output_names = [f"out{index}" for index in range(num_outputs)]
+    wire_names = [f"w{index}" for index in range(num_gates - num_outputs)]
+    signals = list(input_names)
+    lines: List[str] = [
+        f"module {module_name}("
+        f"output {', '.join(output_names)}, input {', '.join(input_names)});",
+        "",
+    ]
+    if wire_names:
+        lines.append(f"   wire {', '.join(wire_names)};")
+    driven_names = wire_names + output_names
+    for gate_index, driven_name in enumerate(driven_names):
+        gate = rng.choice(GATE_CHOICES)
+        fanin_count = 1 if gate == "not" else 2
+        window = signals[-locality:]
+        fanin = rng.sample(window, min(fanin_count, len(window)))
+        if len(fanin) < fanin_count:
+            gate = "not"
+            fanin = fanin[:1]
+        lines.append(f"   {gate} g{gate_index} ({driven_name}, {', '.join(fanin)});")
+        if driven_name not in output_names:
+            signals.append(driven_name)
+    lines.append("")
+    lines.append("endmodule")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def write_random_structural_verilog(output_fp: str, **kwargs):
+    """
+    Writes a random netlist to disk. Keyword arguments are passed through to
+    generate_random_structural_verilog.
+
+    Args:
+        output_fp: Filepath to write the verilog to.
+    """
+    with open(output_fp, "w") as output_file:
+        output_file.write(generate_random_structural_verilog(**kwargs))
+
+
+def write_random_binary_netlist(output_fp: str, **kwargs):
+    """
+    Writes a random netlist to disk in the binary netlist format, ready to be
+    memory mapped. Keyword arguments are passed through to
+    generate_random_structural_verilog.
+
+    Args:
+        output_fp: Filepath to write the netlist to.
+    """
+    verilog_code = generate_random_structural_verilog(**kwargs)
+    netlist = CompactNetlist.from_serialized(
+        parse_structural_verilog(verilog_code.splitlines(keepends=True))
+    )
+    netlist.write_binary(output_fp)
@@ -5,4 +5,12 @@
 Written by W.R. Jackson, Ben Bremer, Eric South
 --------------------------------------------------------------------------------
 """
+from .experimental_data import (
+    ExperimentalData,
+    ExperimentalDataSchema,
+    infer_experimental_data_schema,
+    iterate_experimental_data,
+    read_experimental_data,
+    read_experimental_data_row,
+)
 from .ingress import parse_sbol_xml_tree
@@ -0,0 +1,290 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Streaming reader for plate reader style experimental data, such as the Blade
+supplementary data. Every row is a circuit, measured under each of the 2^n
+input conditions, with one column per output for its intended logic, its mean
+measurement and optionally its standard error.
+
+Where those columns live is described by an ExperimentalDataSchema, which is
+either passed in or inferred from a header labelling conditions as 'Z01',
+'Z01 MEAN' and 'Z01 SEM', with any further outputs of a condition in the
+unlabelled columns that follow it. Rows are parsed straight into typed NumPy
+arrays a chunk at a time, so whole campaigns with millions of rows are read
+with bounded memory.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+from dataclasses import dataclass, field
+from itertools import islice
+import re
+from typing import (
+    Iterator,
+    List,
+    Optional,
+)
+
+import numpy as np
+
+CONDITION_PATTERN = re.compile(r"^Z([01]+)(?: (MEAN|SEM))?$", re.IGNORECASE)
+
+
+@dataclass
+class ExperimentalDataSchema:
+    num_inputs: int
+    num_outputs: int
+    # Column indices of every state, condition by condition with the outputs
+    # of each condition next to each other.
+    logic_columns: List[int]
+    mean_columns: List[int]
+    sem_columns: List[int] = field(default_factory=list)
+    gate_column: Optional[int] = None
+    angle_column: Optional[int] = None
+
+    def __post_init__(self):
+        num_states = (1 << self.num_inputs) * self.num_outputs
+        for name in ("logic_columns", "mean_columns"):
+            if len(getattr(self, name)) != num_states:
+                raise RuntimeError(
+                    f"A schema for {self.num_inputs} inputs and "
+                    f"{self.num_outputs} outputs needs {num_states} "
+                    f"{name}, got {len(getattr(self, name))}. Please "
+                    f"investigate."
+                )
+        if self.sem_columns and len(self.sem_columns) != num_states:
+            raise RuntimeError(
+                f"Expected {num_states} sem_columns, got "
+                f"{len(self.sem_columns)}. Please investigate."
+            )
+
+    @property
+    def num_states(self) -> int:
+        return len(self.logic_columns)
+
+
+@dataclass
+class ExperimentalData:
+    gate_ids: np.ndarray
+    # Of shape (rows, states).
+    binary_logic: np.ndarray
+    exp_means: np.ndarray
+    exp_sems: Optional[np.ndarray] = None
+    published_angles: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.binary_logic)
+
+
+def split_csv_line(line: str) -> List[str]:
+    return [cell.strip().strip('"') for cell in line.rstrip("\r\n").split(",")]
+
+
+def infer_experimental_data_schema(
+        header: List[str],
+        first_row: List[str],
+) -> ExperimentalDataSchema:
+    """
+    Infers the schema from the header and the first row of a file.
+    Unsuffixed condition labels may appear more than once, e.g. for the
+    parts of each condition as well as for its logic, and only the block
+    whose first row is binary is taken as the logic.
+
+    Args:
+        header: Cells of the header.
+        first_row: Cells of the first row of data.
+
+    Returns:
+        The schema of the file.
+    """
+    # Runs of consecutive conditions of the same kind, each condition being
+    # its label column followed by any unlabelled columns.
+    blocks = []
+    index = 0
+    while index < len(header):
+        match = CONDITION_PATTERN.match(header[index])
+        if match is None:
+            index += 1
+            continue
+        columns = [index]
+        index += 1
+        while index < len(header) and header[index] == "":
+            columns.append(index)
+            index += 1
+        kind = (match.group(2) or "LOGIC").upper()
+        # A repeated condition starts the next block of the same kind.
+        if (
+            not blocks
+            or blocks[-1]["kind"] != kind
+            or blocks[-1]["end"] != columns[0]
+            or match.group(1) in dict(blocks[-1]["conditions"])
+        ):
+            blocks.append({"kind": kind, "conditions": [], "end": None})
+        blocks[-1]["conditions"].append((match.group(1), columns))
+        blocks[-1]["end"] = index
+
+    def is_binary(cell: str) -> bool:
+        return cell in ("0", "1")
+
+    def flatten(block) -> List[int]:
+        return [column for _, columns in block["conditions"] for column in columns]
+
+    logic = [
+        block for block in blocks
+        if block["kind"] == "LOGIC"
+        and all(is_binary(first_row[column]) for column in flatten(block))
+    ]
+    means = [block for block in blocks if block["kind"] == "MEAN"]
+    sems = [block for block in blocks if block["kind"] == "SEM"]
+    if len(logic) != 1 or len(means) != 1 or len(sems) > 1:
+        raise RuntimeError(
+            "Unable to infer the schema of the experimental data from its "
+            "header, please pass one in."
+        )
+    conditions = logic[0]["conditions"]
+    num_inputs = len(conditions[0][0])
+    num_outputs = len(conditions[0][1])
+    if len(conditions) != 1 << num_inputs:
+        raise RuntimeError(
+            f"Found {len(conditions)} conditions of {num_inputs} inputs in "
+            f"the header, rather than {1 << num_inputs}. Please investigate."
+        )
+    header_names = [cell.upper() for cell in header]
+    return ExperimentalDataSchema(
+        num_inputs=num_inputs,
+        num_outputs=num_outputs,
+        logic_columns=flatten(logic[0]),
+        mean_columns=flatten(means[0]),
+        sem_columns=flatten(sems[0]) if sems else [],
+        gate_column=header_names.index("GATE") if "GATE" in header_names else None,
+        angle_column=header_names.index("ANGLE") if "ANGLE" in header_names else None,
+    )
+
+
+def parse_experimental_data_lines(
+        lines: List[str],
+        schema: ExperimentalDataSchema,
+        cap_value: Optional[float] = None,
+) -> ExperimentalData:
+    """
+    Parses a block of rows into typed arrays. Gate IDs are kept as strings.
+    """
+    num_states = schema.num_states
+    columns = schema.logic_columns + schema.mean_columns + schema.sem_columns
+    if schema.angle_column is not None:
+        columns = columns + [schema.angle_column]
+    values = np.loadtxt(lines, delimiter=",", usecols=columns, ndmin=2)
+    exp_means = values[:, num_states:2 * num_states]
+    if cap_value is not None:
+        exp_means = np.minimum(exp_means, cap_value)
+    if schema.gate_column is not None:
+        gate_ids = np.loadtxt(
+            lines,
+            delimiter=",",
+            usecols=[schema.gate_column],
+            dtype=str,
+            ndmin=1,
+        )
+    else:
+        gate_ids = np.array([], dtype=str)
+    sem_stop = 2 * num_states + len(schema.sem_columns)
+    return ExperimentalData(
+        gate_ids=gate_ids,
+        binary_logic=values[:, :num_states].astype(np.int8),
+        exp_means=exp_means,
+        exp_sems=values[:, 2 * num_states:sem_stop] if schema.sem_columns else None,
+        published_angles=values[:, -1] if schema.angle_column is not None else None,
+    )
+
+
+def iterate_experimental_data(
+        fp: str,
+        schema: Optional[ExperimentalDataSchema] = None,
+        chunk_size: int = 1 << 16,
+        cap_value: Optional[float] = None,
+) -> Iterator[ExperimentalData]:
+    """
+    Streams an experimental data file, holding at most chunk_size rows in
+    memory at a time.
+
+    Args:
+        fp: Filepath of the experimental data.
+        schema: Where the columns are. Inferred from the header if not
+            passed.
+        chunk_size: Number of rows per chunk.
+        cap_value: Mean measurements are capped at this value, if passed.
+
+    Yields:
+        Consecutive chunks of rows, skipping blank lines.
+    """
+    with open(fp, "r") as input_file:
+        header = split_csv_line(input_file.readline())
+        while True:
+            lines = list(islice(input_file, chunk_size))
+            if not lines:
+                return
+            lines = [line for line in lines if line.strip()]
+            if not lines:
+                continue
+            if schema is None:
+                schema = infer_experimental_data_schema(header, split_csv_line(lines[0]))
+            yield parse_experimental_data_lines(lines, schema, cap_value)
+
+
+def read_experimental_data_row(
+        fp: str,
+        row_index: int,
+        schema: Optional[ExperimentalDataSchema] = None,
+        cap_value: Optional[float] = None,
+) -> ExperimentalData:
+    """
+    Reads a single row of an experimental data file. Rows before it are
+    skipped as raw lines, so only the requested row is ever parsed.
+
+    Args:
+        fp: Filepath of the experimental data.
+        row_index: Index of the row, counting from zero and skipping blank
+            lines, the same as the rows of read_experimental_data.
+        schema: Where the columns are. Inferred from the header if not
+            passed.
+        cap_value: Mean measurements are capped at this value, if passed.
+
+    Returns:
+        The data of that row alone.
+    """
+    with open(fp, "r") as input_file:
+        header = split_csv_line(input_file.readline())
+        rows = (line for line in input_file if line.strip())
+        line = next(islice(rows, row_index, None), None) if row_index >= 0 else None
+    if line is None:
+        raise RuntimeError(f"{fp} has no row {row_index}. Please investigate.")
+    if schema is None:
+        schema = infer_experimental_data_schema(header, split_csv_line(line))
+    return parse_experimental_data_lines([line], schema, cap_value)
+
+
+def read_experimental_data(
+        fp: str,
+        schema: Optional[ExperimentalDataSchema] = None,
+        chunk_size: int = 1 << 16,
+        cap_value: Optional[float] = None,
+) -> ExperimentalData:
+    """
+    Reads a whole experimental data file. See iterate_experimental_data.
+    """
+    chunks = list(iterate_experimental_data(fp, schema, chunk_size, cap_value))
+    if not chunks:
+        raise RuntimeError(f"No data found in {fp}. Please investigate.")
+
+    def concatenate(name: str):
+        if getattr(chunks[0], name) is None:
+            return None
+        return np.concatenate([getattr(chunk, name) for chunk in chunks])
+
+    return ExperimentalData(
+        gate_ids=concatenate("gate_ids"),
+        binary_logic=concatenate("binary_logic"),
+        exp_means=concatenate("exp_means"),
+        exp_sems=concatenate("exp_sems"),
+        published_angles=concatenate("published_angles"),
+    )
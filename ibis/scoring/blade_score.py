@@ -5,10 +5,29 @@ Description:
 
 --------------------------------------------------------------------------------
 """
+from typing import (
+    Optional,
+)
+
+import numpy as np
 
 from ibis.datastucture import (
+    CircuitMetrics,
     GeneticCircuit,
     LogicNetwork,
+    batch_circuit_metrics,
+    batch_vector_proximity,
+    canonical_input_matrix,
+)
+from ibis.ingress import (
+    ExperimentalData,
+    ExperimentalDataSchema,
+    read_experimental_data,
+    read_experimental_data_row,
+)
+from ibis.scoring.blade_uncertainty import (
+    AngleIntervals,
+    bootstrap_vector_proximity,
 )
 from ibis.scoring.scorer import BaseRequirement, BaseScoring
 
@@ -17,6 +36,26 @@ from rich.table import Table
 from rich.panel import Panel
 from rich.text import Text
 
+# Measurements are capped here, as in the paper.
+BLADE_CAP_VALUE = 20000.0
+
+
+def get_blade_state_order(num_inputs: int, num_outputs: int) -> np.ndarray:
+    """
+    Where every state of a truth table vector (see TruthTable.to_vector) sits
+    in the Blade layout. Blade conditions are labelled Z<first input><second
+    input>..., so the first input varies fastest and all inputs off comes
+    first, whereas truth tables are in canonical ordering.
+
+    Returns:
+        Integer array of length 2^num_inputs * num_outputs, indexing the
+        Blade layout.
+    """
+    input_matrix = canonical_input_matrix(num_inputs).astype(np.int64)
+    conditions = (input_matrix << np.arange(num_inputs)[:, np.newaxis]).sum(axis=0)
+    return (conditions[:, np.newaxis] * num_outputs + np.arange(num_outputs)).reshape(-1)
+
+
 class BladeRequirement(BaseRequirement):
     """
     Built-in Blade module which predicts how well its circuits are likely to
@@ -28,6 +67,7 @@ class BladeRequirement(BaseRequirement):
         num_outputs: <Number of Outputs into Circuit>
         experimental_data_fp: <Filepath to experimental data>
         column_index: <Which vector column to extract from>
+        schema: <Column layout of the experimental data, inferred if None>
     """
 
     def __init__(
@@ -37,12 +77,14 @@ class BladeRequirement(BaseRequirement):
             num_outputs: int,
             experimental_data_fp: str,
             column_index: int,
+            schema: Optional[ExperimentalDataSchema] = None,
     ):
         self.verilog_file_fp = verilog_file_fp
         self.num_inputs = num_inputs
         self.num_outputs = num_outputs
         self.experimental_data_fp = experimental_data_fp
         self.column_index = column_index
+        self.schema = schema
 
     def get_required_inputs(self):
         pass
@@ -55,6 +97,7 @@ class BladeScoring:
     def __init__(
             self,
             requirement: BladeRequirement,
+            optimize_logic: bool = True,
     ):
         self.gc = GeneticCircuit(
             num_inputs=requirement.num_inputs,
@@ -63,23 +106,49 @@ class BladeScoring:
         self.verilog_file_fp = requirement.verilog_file_fp
         self.experimental_data_fp = requirement.experimental_data_fp
         self.logic_network = LogicNetwork(self.verilog_file_fp)
-        self.truth_table = self.logic_network.generate_truth_table()
-        self.gc.intended_truth_table = self.logic_network.generate_truth_vector(
-            input_array=self.truth_table,
-            output_index=0,
-        )
+        # Only the truth table is scored against the measurements, and it is
+        # the same with or without redundant logic, which only costs time.
+        if optimize_logic:
+            self.logic_network.optimize()
+        self.truth_table = self.logic_network.get_truth_table()
+        if self.truth_table.num_outputs != requirement.num_outputs:
+            raise RuntimeError(
+                f"{self.verilog_file_fp} has {self.truth_table.num_outputs} "
+                f"outputs, but {requirement.num_outputs} were requested. "
+                f"Please investigate."
+            )
+        # Every output, with the outputs of each row next to each other.
+        self.gc.intended_truth_table = self.truth_table
         self.column_index = requirement.column_index
-        self.binary_logic, self.gc.exp_data, self.true_angle = self.parse_blade_data()
+        self.schema = requirement.schema
+        self.binary_logic, exp_means, exp_sems, self.true_angle = self.parse_blade_data()
+        # The measurements are reordered to match the truth table.
+        state_order = get_blade_state_order(
+            self.truth_table.num_inputs,
+            self.truth_table.num_outputs,
+        )
+        self.gc.exp_data = [exp_means[index] for index in state_order]
+        self.exp_sems = None
+        if exp_sems is not None:
+            self.exp_sems = [exp_sems[index] for index in state_order]
 
     def parse_blade_data(self):
-        cap_value = 20000.0
-        with open(self.experimental_data_fp) as fp:
-            lines = fp.readlines()
-            query_line = lines[self.column_index+1].split(',') # Offset for Header.
-            binary_logic = [int(x) for x in query_line[5:13]]
-            exp_means = [float(x) if float(x) < cap_value else cap_value for x in query_line[13:21]]
-            true_angle = float(query_line[29])
-        return binary_logic, exp_means, true_angle
+        # Rows before the requested one are skipped unparsed.
+        row = read_experimental_data_row(
+            self.experimental_data_fp,
+            self.column_index,
+            schema=self.schema,
+            cap_value=BLADE_CAP_VALUE,
+        )
+        binary_logic = row.binary_logic[0].tolist()
+        exp_means = row.exp_means[0].tolist()
+        exp_sems = None
+        if row.exp_sems is not None:
+            exp_sems = row.exp_sems[0].tolist()
+        true_angle = None
+        if row.published_angles is not None:
+            true_angle = float(row.published_angles[0])
+        return binary_logic, exp_means, exp_sems, true_angle
 
     def score(self):
         """
@@ -87,6 +156,31 @@ class BladeScoring:
         """
         return round(self.gc.vector_proximity(), 1)
 
+    def estimate_uncertainty(
+            self,
+            num_samples: int = 4096,
+            confidence: float = 0.95,
+            seed: Optional[int] = 0,
+    ) -> AngleIntervals:
+        """
+        Confidence interval of the score, from measurements resampled from
+        the means and standard errors of the gate. See blade_uncertainty.py.
+        """
+        if self.exp_sems is None:
+            raise RuntimeError(
+                f"{self.experimental_data_fp} has no standard errors to "
+                f"resample from. Please investigate."
+            )
+        return bootstrap_vector_proximity(
+            self.gc.get_intended_vector()[np.newaxis],
+            np.array([self.gc.exp_data]),
+            np.array([self.exp_sems]),
+            num_samples=num_samples,
+            confidence=confidence,
+            seed=seed,
+            cap_value=BLADE_CAP_VALUE,
+        )
+
     def get_requirements(self):
         return BladeRequirement
 
@@ -96,17 +190,173 @@ class BladeScoring:
             table.add_column(f'TT Vec Pos. {index}')
         table.add_column('Final Metric')
         table.add_row(
-            f'{self.binary_logic[0]}',
-            f'{self.binary_logic[1]}',
-            f'{self.binary_logic[2]}',
-            f'{self.binary_logic[3]}',
-            f'{self.binary_logic[4]}',
-            f'{self.binary_logic[5]}',
-            f'{self.binary_logic[6]}',
-            f'{self.binary_logic[7]}',
+            *[f'{value}' for value in self.binary_logic],
             f'{self.score()}°',
         )
         console = Console()
         console.print(table)
 
 
+# ------------------------------ Dataset Scoring -------------------------------
+def parse_blade_dataset(
+        experimental_data_fp: str,
+        cap_value: float = BLADE_CAP_VALUE,
+        schema: Optional[ExperimentalDataSchema] = None,
+) -> ExperimentalData:
+    """
+    Loads every gate of a Blade experimental data file at once.
+
+    Args:
+        experimental_data_fp: Filepath to the experimental data.
+        cap_value: Measurements are capped at this value.
+        schema: Column layout of the experimental data. Inferred from the
+            header if not passed.
+
+    Returns:
+        The dataset, with one row per gate in file order.
+    """
+    return read_experimental_data(
+        experimental_data_fp,
+        schema=schema,
+        cap_value=cap_value,
+    )
+
+
+class BladeDatasetScoring:
+    def __init__(
+            self,
+            experimental_data_fp: str,
+            cap_value: float = BLADE_CAP_VALUE,
+            schema: Optional[ExperimentalDataSchema] = None,
+    ):
+        """
+        Scores every gate of a Blade dataset in one pass, rather than
+        constructing a BladeScoring, and reading the file, per gate.
+
+        Args:
+            experimental_data_fp: Filepath to the experimental data.
+            cap_value: Measurements are capped at this value.
+            schema: Column layout of the experimental data. Inferred from the
+                header if not passed.
+        """
+        self.experimental_data_fp = experimental_data_fp
+        self.cap_value = cap_value
+        self.dataset = parse_blade_dataset(experimental_data_fp, cap_value, schema)
+        self.angles: Optional[np.ndarray] = None
+
+    def score(self) -> np.ndarray:
+        """
+        The vector proximity angle of every gate, in file order.
+        """
+        if self.angles is None:
+            self.angles = batch_vector_proximity(
+                self.dataset.binary_logic,
+                self.dataset.exp_means,
+            )
+        return self.angles
+
+    def get_metrics(self) -> CircuitMetrics:
+        """
+        The angle, dynamic range and related metrics of every gate, in file
+        order.
+        """
+        return batch_circuit_metrics(
+            self.dataset.binary_logic,
+            self.dataset.exp_means,
+        )
+
+    def estimate_uncertainty(
+            self,
+            num_samples: int = 4096,
+            confidence: float = 0.95,
+            seed: Optional[int] = 0,
+    ) -> AngleIntervals:
+        """
+        Confidence intervals of the angle of every gate, from measurements
+        resampled from the mean and standard error columns. See
+        blade_uncertainty.py.
+
+        Args:
+            num_samples: Number of resampled measurement vectors per gate.
+            confidence: Coverage of the intervals.
+            seed: Seed of the resampling.
+
+        Returns:
+            The nominal angle and the interval of every gate, in file order.
+        """
+        if self.dataset.exp_sems is None:
+            raise RuntimeError(
+                f"{self.experimental_data_fp} has no standard errors to "
+                f"resample from. Please investigate."
+            )
+        return bootstrap_vector_proximity(
+            self.dataset.binary_logic,
+            self.dataset.exp_means,
+            self.dataset.exp_sems,
+            num_samples=num_samples,
+            confidence=confidence,
+            seed=seed,
+            cap_value=self.cap_value,
+        )
+
+    def get_ranking(self) -> np.ndarray:
+        """
+        Row indices of the gates from best (smallest angle) to worst.
+        """
+        return np.argsort(self.score(), kind="stable")
+
+    def report(self, top: Optional[int] = None):
+        angles = self.score()
+        gate_ids = self.dataset.gate_ids
+        published_angles = self.dataset.published_angles
+        table = Table(title=f"Blade Scores: {len(angles)} Gates")
+        table.add_column('Rank')
+        table.add_column('Gate')
+        table.add_column('Score')
+        if published_angles is not None:
+            table.add_column('Published Angle')
+            table.add_column('Difference')
+        for rank, index in enumerate(self.get_ranking()[:top].tolist(), start=1):
+            score = round(float(angles[index]), 1)
+            # Without a gate column, gates are numbered by row.
+            cells = [
+                f'{rank}',
+                f'{gate_ids[index]}' if len(gate_ids) else f'{index + 1}',
+                f'{score}°',
+            ]
+            if published_angles is not None:
+                published = float(published_angles[index])
+                cells += [f'{published}°', f'{round(score - published, 1)}°']
+            table.add_row(*cells)
+        console = Console()
+        console.print(table)
+
+    def report_uncertainty(
+            self,
+            intervals: Optional[AngleIntervals] = None,
+            top: Optional[int] = None,
+    ):
+        if intervals is None:
+            intervals = self.estimate_uncertainty()
+        gate_ids = self.dataset.gate_ids
+        table = Table(
+            title=f"Blade Score Intervals: {len(intervals.nominal)} Gates "
+                  f"({intervals.num_samples} samples, "
+                  f"{intervals.confidence:.0%} confidence)"
+        )
+        table.add_column('Rank')
+        table.add_column('Gate')
+        table.add_column('Score')
+        table.add_column('Interval')
+        table.add_column('Standard Error')
+        for rank, index in enumerate(self.get_ranking()[:top].tolist(), start=1):
+            table.add_row(
+                f'{rank}',
+                f'{gate_ids[index]}' if len(gate_ids) else f'{index + 1}',
+                f'{round(float(intervals.nominal[index]), 1)}°',
+                f'[{round(float(intervals.lower[index]), 1)}°, '
+                f'{round(float(intervals.upper[index]), 1)}°]',
+                f'{round(float(intervals.standard_errors[index]), 2)}°',
+            )
+        console = Console()
+        console.print(table)
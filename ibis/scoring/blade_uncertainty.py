@@ -0,0 +1,125 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Uncertainty of Blade angles. Every mean measurement comes with its standard
+error, so rather than a single angle, a gate gets a distribution of angles
+over measurement vectors resampled from those means and standard errors.
+
+Measurements are resampled as independent normals, floored at zero as they
+are fluorescence values, and capped as in the paper. States whose mean is at
+or above the cap stay at the cap, as only the capped value enters the angle.
+Resamples of every gate are scored together, a batch of samples at a time,
+and batches are seeded from a single seed sequence so the intervals are
+reproducible for a given seed and batch size.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+from dataclasses import dataclass
+from typing import (
+    Optional,
+)
+
+import numpy as np
+
+from ibis.datastucture import batch_vector_proximity
+
+
+@dataclass
+class AngleIntervals:
+    # All of shape (gates,).
+    nominal: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    standard_errors: np.ndarray
+    confidence: float
+    num_samples: int
+
+
+def resample_measurements(
+        rng: np.random.Generator,
+        means: np.ndarray,
+        sems: np.ndarray,
+        num_samples: int,
+        cap_value: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Draws measurement vectors around the means of every gate.
+
+    Args:
+        rng: Source of the draws.
+        means: Mean measurements, of shape (gates, states).
+        sems: Their standard errors, in the same layout.
+        num_samples: Number of vectors per gate.
+        cap_value: Measurements are capped at this value, if passed.
+
+    Returns:
+        Float array of shape (gates, samples, states).
+    """
+    if cap_value is not None:
+        sems = np.where(means >= cap_value, 0.0, sems)
+    noise = rng.standard_normal((len(means), num_samples, means.shape[1]))
+    samples = means[:, np.newaxis, :] + sems[:, np.newaxis, :] * noise
+    return np.clip(samples, 0.0, np.inf if cap_value is None else cap_value)
+
+
+def bootstrap_vector_proximity(
+        intended: np.ndarray,
+        means: np.ndarray,
+        sems: np.ndarray,
+        num_samples: int = 4096,
+        confidence: float = 0.95,
+        seed: Optional[int] = 0,
+        batch_size: int = 512,
+        cap_value: Optional[float] = None,
+) -> AngleIntervals:
+    """
+    Percentile confidence intervals of the vector proximity angle of every
+    gate, from resampled measurement vectors.
+
+    Args:
+        intended: Intended truth tables, of shape (gates, states).
+        means: Mean measurements in the same layout.
+        sems: Their standard errors, in the same layout.
+        num_samples: Number of resampled vectors per gate.
+        confidence: Coverage of the intervals.
+        seed: Seed of the resampling.
+        batch_size: Number of samples per gate drawn at once, bounding memory
+            to gates * batch_size * states values.
+        cap_value: Measurements are capped at this value, if passed.
+
+    Returns:
+        The nominal angle and the interval of every gate, in degrees.
+    """
+    intended = np.asarray(intended, dtype=np.float64)
+    means = np.asarray(means, dtype=np.float64)
+    sems = np.asarray(sems, dtype=np.float64)
+    num_gates, num_states = means.shape
+    angles = np.empty((num_gates, num_samples))
+    starts = list(range(0, num_samples, batch_size))
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    for start, batch_seed in zip(starts, seeds):
+        size = min(batch_size, num_samples - start)
+        samples = resample_measurements(
+            np.random.default_rng(batch_seed),
+            means,
+            sems,
+            size,
+            cap_value,
+        )
+        angles[:, start:start + size] = batch_vector_proximity(
+            np.repeat(intended, size, axis=0),
+            samples.reshape(-1, num_states),
+        ).reshape(num_gates, size)
+    tail = (1 - confidence) / 2 * 100
+    lower, upper = np.percentile(angles, [tail, 100 - tail], axis=1)
+    if cap_value is not None:
+        means = np.minimum(means, cap_value)
+    return AngleIntervals(
+        nominal=batch_vector_proximity(intended, means),
+        lower=lower,
+        upper=upper,
+        standard_errors=angles.std(axis=1, ddof=1),
+        confidence=confidence,
+        num_samples=num_samples,
+    )
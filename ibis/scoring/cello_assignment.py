@@ -0,0 +1,383 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Gate assignment for Cello circuits. A NOR mapped circuit only becomes a genetic
+design once every NOR and NOT gate is assigned a repressor from the UCF gate
+library, and the choice decides how well the ON and OFF states of the output
+are separated.
+
+Circuits are scored as log10(lowest ON output / highest OFF output) over the
+whole truth table, where every gate's input is the summed activity of the
+promoters driving it and input sensors sit at their ON or OFF level. Each
+repressor (group) may only be used once.
+
+The search combines two strategies:
+
+    - Simulated annealing chains propose a whole batch of neighbouring
+      assignments per step, which are evaluated in a single vectorized pass.
+      Chains are independent and deterministically seeded, so they can run
+      across a process pool.
+    - Branch and bound then tries to improve on the best chain. Gates are
+      assigned in topological order, and a partial assignment is pruned as
+      soon as interval propagation shows it can't beat the incumbent. When the
+      search completes, the result is proven optimal.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import math
+import time
+from typing import (
+    Dict,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
+
+from ibis.datastucture import (
+    CelloGateLibrary,
+    LogicNetwork,
+    canonical_input_matrix,
+)
+from ibis.datastucture.ucf_parse import CelloInputs
+from ibis.scoring.cello_propagation import (
+    UNASSIGNED,
+    SignalPropagator,
+    get_on_off_ratio,
+)
+
+
+@dataclass
+class AssignmentResult:
+    # Circuit gate name -> library gate name.
+    assignment: Dict[str, str]
+    score: float
+    evaluations: int
+    elapsed: float
+    proven_optimal: bool
+
+    @property
+    def assignments_per_second(self) -> float:
+        return self.evaluations / self.elapsed if self.elapsed else float("inf")
+
+
+class GateAssignmentProblem:
+    def __init__(
+            self,
+            logic_network: LogicNetwork,
+            gate_library: CelloGateLibrary,
+            input_sensors: CelloInputs,
+    ):
+        """
+        Scores batches of gate assignments of a NOR mapped network at once,
+        over every row of its truth table.
+
+        Args:
+            logic_network: A NOR mapped network.
+            gate_library: The repressor gates to assign from.
+            input_sensors: Input sensors, assigned to the primary inputs in
+                order.
+        """
+        self.propagator = SignalPropagator(logic_network, gate_library, input_sensors)
+        input_matrix = canonical_input_matrix(logic_network.get_number_of_inputs())
+        self.input_levels = self.propagator.get_input_levels(input_matrix)
+        self.output_truth = logic_network.simulate(input_matrix)
+        for output_name, truth in zip(
+                logic_network.get_available_outputs(),
+                self.output_truth,
+        ):
+            if truth.all() or not truth.any():
+                raise RuntimeError(
+                    f"Output {output_name} is constant, so it has no ON/OFF "
+                    f"ratio to optimize. Please investigate."
+                )
+        self.gate_names = self.propagator.gate_names
+        self.num_gates = self.propagator.num_gates
+        self.gate_library = gate_library
+        group_names = sorted(set(gate_library.groups))
+        self.group_codes = np.array(
+            [group_names.index(group) for group in gate_library.groups],
+            dtype=np.int64,
+        )
+        if len(group_names) < self.num_gates:
+            raise RuntimeError(
+                f"The circuit has {self.num_gates} gates, but the library only "
+                f"has {len(group_names)} distinct repressors. Please "
+                f"investigate."
+            )
+        # Number of (partial) assignments evaluated so far.
+        self.evaluations = 0
+
+    # ------------------------------- EVALUATION -------------------------------
+    def score_bounds(self, assignments: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Bounds the score of a batch of (partial) assignments.
+
+        Returns:
+            The lower and upper bound of every assignment's score. Both are
+            the exact score for complete assignments.
+        """
+        self.evaluations += len(assignments)
+        lower, upper = self.propagator.propagate_bounds(assignments, self.input_levels)
+        on_rows = self.output_truth[:, np.newaxis, :]
+        worst = get_on_off_ratio(np.where(on_rows, lower, upper), self.output_truth)
+        best = get_on_off_ratio(np.where(on_rows, upper, lower), self.output_truth)
+        # A circuit is only as good as its worst output.
+        return worst.min(axis=0), best.min(axis=0)
+
+    def evaluate(self, assignments: np.ndarray) -> np.ndarray:
+        """
+        Scores a batch of complete assignments.
+        """
+        self.evaluations += len(assignments)
+        output_levels = self.propagator.propagate(assignments, self.input_levels)
+        return get_on_off_ratio(output_levels, self.output_truth).min(axis=0)
+
+    # --------------------------------- MOVES ----------------------------------
+    def random_assignment(self, rng: np.random.Generator) -> np.ndarray:
+        """
+        Draws an assignment that uses every repressor at most once.
+        """
+        groups = rng.permutation(self.group_codes.max() + 1)[:self.num_gates]
+        return np.array(
+            [rng.choice(np.flatnonzero(self.group_codes == group)) for group in groups],
+            dtype=np.int64,
+        )
+
+    def propose(
+            self,
+            rng: np.random.Generator,
+            assignment: np.ndarray,
+            num_candidates: int,
+    ) -> np.ndarray:
+        """
+        Draws neighbouring assignments, each either swapping the gates of two
+        circuit positions or replacing one gate with an unused one.
+
+        Returns:
+            Integer array of shape (num_candidates, gates).
+        """
+        candidates = np.repeat(assignment[np.newaxis, :], num_candidates, axis=0)
+        used_groups = self.group_codes[assignment]
+        for candidate in candidates:
+            if self.num_gates > 1 and rng.random() < 0.5:
+                first, second = rng.choice(self.num_gates, size=2, replace=False)
+                candidate[[first, second]] = candidate[[second, first]]
+                continue
+            position = rng.integers(self.num_gates)
+            # Any gate whose repressor isn't used elsewhere in the circuit.
+            blocked = np.delete(used_groups, position)
+            options = np.flatnonzero(
+                ~np.isin(self.group_codes, blocked)
+                & (np.arange(len(self.group_codes)) != assignment[position])
+            )
+            if len(options):
+                candidate[position] = rng.choice(options)
+        return candidates
+
+    def describe(self, assignment: np.ndarray) -> Dict[str, str]:
+        """
+        Converts an assignment into circuit gate names and library gate names.
+        """
+        gate_names = self.gate_library.get_gate_names()
+        return {
+            name: gate_names[index]
+            for name, index in zip(self.gate_names, assignment.tolist())
+        }
+
+
+# ---------------------------------- SEARCH ------------------------------------
+def run_annealing_chain(
+        problem: GateAssignmentProblem,
+        seed: int,
+        steps: int = 200,
+        batch_size: int = 64,
+        initial_temperature: float = 0.5,
+        cooling: float = 0.98,
+) -> Tuple[np.ndarray, float, int]:
+    """
+    Runs a single simulated annealing chain. Every step evaluates a batch of
+    neighbours in one pass and moves to the best of them, or, if it's worse
+    than the current assignment, with the Metropolis probability.
+
+    Returns:
+        The best assignment found, its score, and the number of assignments
+        evaluated.
+    """
+    evaluations = problem.evaluations
+    rng = np.random.default_rng(seed)
+    current = problem.random_assignment(rng)
+    current_score = float(problem.evaluate(current[np.newaxis, :])[0])
+    best, best_score = current.copy(), current_score
+    temperature = initial_temperature
+    for _ in range(steps):
+        candidates = problem.propose(rng, current, batch_size)
+        scores = problem.evaluate(candidates)
+        index = int(np.argmax(scores))
+        delta = float(scores[index]) - current_score
+        if delta >= 0 or rng.random() < math.exp(delta / temperature):
+            current, current_score = candidates[index], float(scores[index])
+            if current_score > best_score:
+                best, best_score = current.copy(), current_score
+        temperature *= cooling
+    return best, best_score, problem.evaluations - evaluations
+
+
+def branch_and_bound(
+        problem: GateAssignmentProblem,
+        incumbent: Optional[np.ndarray] = None,
+        incumbent_score: float = float("-inf"),
+        node_limit: int = 10000,
+) -> Tuple[Optional[np.ndarray], float, bool]:
+    """
+    Depth first search over assignments in topological gate order. All
+    children of a node are bounded in a single batch, and every child that
+    can't beat the incumbent is pruned.
+
+    Args:
+        problem: The assignment problem.
+        incumbent: The best known assignment, if any.
+        incumbent_score: The score of the incumbent.
+        node_limit: Upper bound on the number of nodes expanded.
+
+    Returns:
+        The best assignment, its score, and whether the search completed,
+        i.e. whether the result is proven optimal.
+    """
+    best, best_score = incumbent, incumbent_score
+    library_indices = np.arange(len(problem.group_codes))
+    stack = [np.full(problem.num_gates, UNASSIGNED, dtype=np.int64)]
+    expanded = 0
+    while stack:
+        if expanded >= node_limit:
+            return best, best_score, False
+        partial = stack.pop()
+        expanded += 1
+        position = int(np.argmax(partial == UNASSIGNED))
+        used_groups = problem.group_codes[partial[:position]]
+        options = library_indices[~np.isin(problem.group_codes, used_groups)]
+        children = np.repeat(partial[np.newaxis, :], len(options), axis=0)
+        children[:, position] = options
+        lower, upper = problem.score_bounds(children)
+        if position == problem.num_gates - 1:
+            index = int(np.argmax(lower))
+            if lower[index] > best_score:
+                best, best_score = children[index], float(lower[index])
+            continue
+        # The most promising child is explored first.
+        for index in np.argsort(upper).tolist():
+            if upper[index] > best_score:
+                stack.append(children[index])
+    return best, best_score, True
+
+
+def optimize_gate_assignment(
+        logic_network: LogicNetwork,
+        gate_library: CelloGateLibrary,
+        input_sensors: CelloInputs,
+        seed: int = 0,
+        chains: int = 4,
+        steps: int = 200,
+        batch_size: int = 64,
+        processes: int = 1,
+        node_limit: int = 10000,
+) -> AssignmentResult:
+    """
+    Searches for the repressor assignment that maximizes the ON/OFF ratio of
+    a NOR mapped circuit. The result only depends on the seed, not on the
+    number of processes.
+
+    Args:
+        logic_network: A NOR mapped network.
+        gate_library: The repressor gates to assign from.
+        input_sensors: Input sensors, assigned to the primary inputs in order.
+        seed: Seed of the search.
+        chains: Number of independent annealing chains.
+        steps: Steps per chain.
+        batch_size: Neighbouring assignments evaluated per step.
+        processes: Number of worker processes to spread the chains across.
+        node_limit: Upper bound on the nodes expanded by branch and bound.
+
+    Returns:
+        The best assignment found and the statistics of the search.
+    """
+    start_time = time.perf_counter()
+    problem = GateAssignmentProblem(logic_network, gate_library, input_sensors)
+    seeds = [
+        int(sequence.generate_state(1)[0])
+        for sequence in np.random.SeedSequence(seed).spawn(chains)
+    ]
+    arguments = [(problem, chain_seed, steps, batch_size) for chain_seed in seeds]
+    if processes == 1:
+        results = [run_annealing_chain(*argument) for argument in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(run_annealing_chain, *zip(*arguments)))
+    best, best_score, _ = max(results, key=lambda result: result[1])
+    evaluations = sum(result[2] for result in results)
+    search_evaluations = problem.evaluations
+    best, best_score, complete = branch_and_bound(
+        problem,
+        incumbent=best,
+        incumbent_score=best_score,
+        node_limit=node_limit,
+    )
+    evaluations += problem.evaluations - search_evaluations
+    return AssignmentResult(
+        assignment=problem.describe(best),
+        score=best_score,
+        evaluations=evaluations,
+        elapsed=time.perf_counter() - start_time,
+        proven_optimal=complete,
+    )
+
+
+def greedy_gate_assignment(
+        logic_network: LogicNetwork,
+        gate_library: CelloGateLibrary,
+        input_sensors: CelloInputs,
+) -> Dict[str, str]:
+    """
+    A deterministic assignment that never simulates the truth table, for
+    circuits too large to search. Library gates are ranked by their dynamic
+    range between the weakest and the strongest input the circuit's sensors
+    can produce, and handed out in topological order, one per repressor.
+
+    Args:
+        logic_network: A NOR mapped network.
+        gate_library: The repressor gates to assign from.
+        input_sensors: Input sensors, assigned to the primary inputs in order.
+
+    Returns:
+        Circuit gate name -> library gate name.
+    """
+    propagator = SignalPropagator(logic_network, gate_library, input_sensors)
+    gate_indices = np.arange(len(gate_library))
+    low = gate_library.evaluate(
+        gate_indices,
+        np.full(len(gate_library), propagator.sensor_levels.min()),
+    )
+    high = gate_library.evaluate(
+        gate_indices,
+        np.full(len(gate_library), propagator.sensor_levels[:, 1].sum()),
+    )
+    assignment = []
+    used_groups = set()
+    for index in np.argsort(-(low / high), kind="stable").tolist():
+        if gate_library.groups[index] not in used_groups:
+            used_groups.add(gate_library.groups[index])
+            assignment.append(index)
+    if len(assignment) < propagator.num_gates:
+        raise RuntimeError(
+            f"The circuit has {propagator.num_gates} gates, but the library "
+            f"only has {len(assignment)} distinct repressors. Please "
+            f"investigate."
+        )
+    gate_names = gate_library.get_gate_names()
+    return {
+        name: gate_names[index]
+        for name, index in zip(propagator.gate_names, assignment)
+    }
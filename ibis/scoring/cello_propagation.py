@@ -0,0 +1,282 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Analog signal propagation through Cello circuits. Rather than treating the
+circuit as Boolean, every input sensor emits its ON or OFF promoter activity
+(in RPU), every gate's input is the summed activity of the promoters driving
+it, and every NOR and NOT gate maps that input through the response function
+of the repressor assigned to it.
+
+A NOR mapped network is flattened once into an evaluation plan in topological
+order, after which every row of the truth table, and optionally a whole batch
+of gate assignments, is propagated at once as arrays of shape (batch, rows).
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
+
+from ibis.datastucture import (
+    CelloGateLibrary,
+    LogicNetwork,
+)
+from ibis.datastucture.ucf_parse import CelloInputs
+
+UNASSIGNED = -1
+
+
+class SignalPropagator:
+    def __init__(
+            self,
+            logic_network: LogicNetwork,
+            gate_library: CelloGateLibrary,
+            input_sensors: CelloInputs,
+            sensor_names: Optional[List[str]] = None,
+    ):
+        """
+        Flattens a NOR mapped network into an evaluation plan. An assignment
+        is an integer array holding, for every NOR and NOT gate of the circuit
+        in topological order, the index of a gate within the library, or
+        UNASSIGNED.
+
+        Args:
+            logic_network: A NOR mapped network.
+            gate_library: The repressor gates to assign from.
+            input_sensors: The available input sensors.
+            sensor_names: The sensor driving each primary input, in input
+                order. Defaults to the first sensors of the input file.
+        """
+        netlist = logic_network.netlist
+        num_inputs = logic_network.get_number_of_inputs()
+        if sensor_names is None:
+            sensor_names = input_sensors.get_available_sensors()[:num_inputs]
+        if len(sensor_names) != num_inputs:
+            raise RuntimeError(
+                f"The circuit has {num_inputs} inputs, but "
+                f"{len(sensor_names)} input sensors are available. Please "
+                f"investigate."
+            )
+        self.sensor_names = list(sensor_names)
+        # The OFF and ON activity of every input sensor.
+        self.sensor_levels = input_sensors.get_sensor_levels(self.sensor_names)
+        input_index = {
+            node_id: index for index, node_id in enumerate(netlist.input_ids)
+        }
+        fanin = netlist.get_fanin_lists()
+        order = np.argsort(
+            logic_network.get_simulation_schedule().node_levels,
+            kind="stable",
+        )
+        gate_node_ids = []
+        # (node ID, kind, input or gate index, drivers) in evaluation order.
+        self.plan: List[Tuple[int, str, Optional[int], List[int]]] = []
+        for node_id in order.tolist():
+            drivers = fanin[node_id].tolist()
+            if node_id in input_index:
+                self.plan.append((node_id, "input", input_index[node_id], []))
+                continue
+            if not drivers:
+                self.plan.append((node_id, "undriven", None, []))
+                continue
+            gate_type = netlist.get_gate_type(node_id)
+            if gate_type in ("NOR", "NOT"):
+                self.plan.append((node_id, "gate", len(gate_node_ids), drivers))
+                gate_node_ids.append(node_id)
+            elif gate_type in (None, "WIRE"):
+                self.plan.append((node_id, "buffer", None, drivers))
+            else:
+                raise RuntimeError(
+                    f"Unable to assign a repressor to a {gate_type} gate. "
+                    f"Please run perform_nor_logic_expansion first."
+                )
+        self.gate_names = [netlist.names[node_id] for node_id in gate_node_ids]
+        self.num_gates = len(gate_node_ids)
+        self.num_nodes = netlist.number_of_nodes()
+        self.output_ids = list(netlist.output_ids)
+        self.output_names = [netlist.names[node_id] for node_id in self.output_ids]
+        self.gate_library = gate_library
+
+    def get_input_levels(self, input_matrix: np.ndarray) -> np.ndarray:
+        """
+        The activity of every input sensor in every row.
+
+        Args:
+            input_matrix: Boolean array of shape (inputs, rows).
+
+        Returns:
+            Float array of shape (inputs, rows).
+        """
+        return np.where(
+            input_matrix,
+            self.sensor_levels[:, 1:2],
+            self.sensor_levels[:, 0:1],
+        )
+
+    def get_assignment_indices(self, assignment: Dict[str, str]) -> np.ndarray:
+        """
+        Converts an assignment of circuit gate names to library gate names
+        into its array form.
+        """
+        library_names = self.gate_library.get_gate_names()
+        missing = [name for name in self.gate_names if name not in assignment]
+        if missing:
+            raise RuntimeError(
+                f"No repressor is assigned to the gates {missing}. Please "
+                f"investigate."
+            )
+        return np.array(
+            [library_names.index(assignment[name]) for name in self.gate_names],
+            dtype=np.int64,
+        )
+
+    def propagate(
+            self,
+            assignments: np.ndarray,
+            input_levels: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Propagates the input levels through the circuit for a batch of
+        complete assignments.
+
+        Args:
+            assignments: Integer array of shape (batch, gates).
+            input_levels: Float array of shape (inputs, rows).
+
+        Returns:
+            The activity of every output, of shape (outputs, batch, rows).
+        """
+        assignments = np.asarray(assignments, dtype=np.int64)
+        return self.propagate_parameters(
+            {
+                name: values[assignments]
+                for name, values in self.gate_library.parameter_arrays.items()
+            },
+            input_levels,
+        )
+
+    def propagate_parameters(
+            self,
+            gate_parameters: Dict[str, np.ndarray],
+            input_levels: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Propagates the input levels through the circuit, with the response
+        function parameters of every gate passed in directly. This is what
+        lets a batch of perturbed parameter sets be evaluated at once.
+
+        Args:
+            gate_parameters: Value of every library parameter for every gate,
+                as arrays of shape (batch, gates).
+            input_levels: Float array of shape (inputs, rows), or of shape
+                (batch, inputs, rows) if the inputs vary across the batch.
+
+        Returns:
+            The activity of every output, of shape (outputs, batch, rows).
+        """
+        library = self.gate_library
+        batch_size = len(next(iter(gate_parameters.values())))
+        values = np.zeros((self.num_nodes, batch_size, input_levels.shape[-1]))
+        for node_id, kind, index, drivers in self.plan:
+            if kind == "input":
+                values[node_id] = input_levels[..., index, :]
+            elif kind == "buffer":
+                values[node_id] = values[drivers].sum(axis=0)
+            elif kind == "gate":
+                # Input composition is the sum of the driving promoters.
+                values[node_id] = library.evaluate_parameters(
+                    {
+                        name: parameter[:, index, np.newaxis]
+                        for name, parameter in gate_parameters.items()
+                    },
+                    values[drivers].sum(axis=0),
+                )
+        return values[self.output_ids]
+
+    def propagate_bounds(
+            self,
+            assignments: np.ndarray,
+            input_levels: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Propagates bounds on every node's activity for a batch of (partial)
+        assignments. Repressors never increase their output as their input
+        increases, so an input interval maps onto an output interval through
+        its end points, and an unassigned gate may be any gate of the library.
+
+        Args:
+            assignments: Integer array of shape (batch, gates).
+            input_levels: Float array of shape (inputs, rows).
+
+        Returns:
+            The lower and upper bound of every output's activity, as arrays
+            of shape (outputs, batch, rows). For complete assignments both
+            are the exact activity.
+        """
+        library = self.gate_library
+        assignments = np.asarray(assignments, dtype=np.int64)
+        shape = (self.num_nodes, len(assignments), input_levels.shape[1])
+        lower = np.zeros(shape)
+        upper = np.zeros(shape)
+        every_gate = np.arange(len(library))[:, np.newaxis, np.newaxis]
+        for node_id, kind, index, drivers in self.plan:
+            if kind == "input":
+                lower[node_id] = input_levels[index]
+                upper[node_id] = input_levels[index]
+            elif kind in ("gate", "buffer"):
+                input_lower = lower[drivers].sum(axis=0)
+                input_upper = upper[drivers].sum(axis=0)
+                if kind == "buffer":
+                    lower[node_id] = input_lower
+                    upper[node_id] = input_upper
+                    continue
+                gate_indices = assignments[:, index]
+                assigned = gate_indices != UNASSIGNED
+                gate_indices = np.where(assigned, gate_indices, 0)[:, np.newaxis]
+                lower[node_id] = library.evaluate(gate_indices, input_upper)
+                upper[node_id] = library.evaluate(gate_indices, input_lower)
+                if not assigned.all():
+                    open_rows = ~assigned
+                    lower[node_id, open_rows] = library.evaluate(
+                        every_gate,
+                        input_upper[open_rows][np.newaxis],
+                    ).min(axis=0)
+                    upper[node_id, open_rows] = library.evaluate(
+                        every_gate,
+                        input_lower[open_rows][np.newaxis],
+                    ).max(axis=0)
+        return lower[self.output_ids], upper[self.output_ids]
+
+
+def get_on_off_ratio(
+        output_levels: np.ndarray,
+        output_truth: np.ndarray,
+) -> np.ndarray:
+    """
+    The separation of the ON and OFF states of every output, as
+    log10(lowest ON activity / highest OFF activity).
+
+    Args:
+        output_levels: Float array of shape (outputs, ..., rows).
+        output_truth: Boolean array of shape (outputs, rows).
+
+    Returns:
+        Float array of shape (outputs, ...). An output that is never ON or
+        never OFF has no separation, and scores -inf.
+    """
+    truth = output_truth.reshape(
+        output_truth.shape[:1]
+        + (1,) * (output_levels.ndim - 2)
+        + output_truth.shape[1:]
+    )
+    low_on = np.where(truth, output_levels, np.inf).min(axis=-1)
+    high_off = np.where(truth, -np.inf, output_levels).max(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.log10(low_on / high_off)
+    return np.where(np.isfinite(low_on) & np.isfinite(high_off), ratio, -np.inf)
@@ -0,0 +1,250 @@
+"""
+--------------------------------------------------------------------------------
+Description:
+Robustness of Cello scores to parameter uncertainty. The parameters of input
+sensors and repressors come from noisy measurements, so rather than a single
+score, a design gets a distribution of scores over perturbed parameter sets.
+
+Every parameter is perturbed by an independent log-normal factor. Thousands of
+perturbed parameter sets are propagated through the circuit at once, as one
+batch dimension of the signal propagation, and batches can be spread across a
+process pool. Batches are seeded from a single seed sequence, so the results
+only depend on the seed and not on the number of processes.
+
+Scores are the log10 ON/OFF ratio of the worst output, as in
+cello_assignment.py, and the sensitivity of the score to each parameter is the
+rank correlation between the parameter's perturbation and the score.
+
+Written by W.R. Jackson, Ben Bremer, Eric South
+--------------------------------------------------------------------------------
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+
+from ibis.datastucture.ucf_parse import CelloInputs
+from ibis.scoring.cello_propagation import (
+    SignalPropagator,
+    get_on_off_ratio,
+)
+
+
+@dataclass
+class RobustnessReport:
+    nominal_score: float
+    # Score of every perturbed parameter set.
+    scores: np.ndarray
+    parameter_names: List[str]
+    # Rank correlation between the perturbation of each parameter and the
+    # score.
+    sensitivities: np.ndarray
+
+    def get_percentiles(
+            self,
+            percentiles: Sequence[float] = (5, 25, 50, 75, 95),
+    ) -> Dict[float, float]:
+        return dict(zip(percentiles, np.percentile(self.scores, percentiles).tolist()))
+
+    def get_most_sensitive(self, count: int = 5) -> List[Tuple[str, float]]:
+        """
+        The parameters the score is most sensitive to, with their rank
+        correlation. A positive correlation means the score improves as the
+        parameter grows.
+        """
+        order = np.argsort(-np.abs(self.sensitivities), kind="stable")[:count]
+        return [
+            (self.parameter_names[index], float(self.sensitivities[index]))
+            for index in order.tolist()
+        ]
+
+
+class ParameterUncertaintyModel:
+    def __init__(
+            self,
+            propagator: SignalPropagator,
+            input_sensors: CelloInputs,
+            assignment: np.ndarray,
+            input_matrix: np.ndarray,
+            output_truth: np.ndarray,
+            relative_sd: float = 0.1,
+            parameter_sd: Optional[Dict[str, float]] = None,
+    ):
+        """
+        Flattens the sensor parameters and the parameters of every assigned
+        gate into a single parameter vector, which is perturbed as a whole.
+
+        Args:
+            propagator: The signal propagation of the circuit.
+            input_sensors: The input sensors of the propagator.
+            assignment: Library gate index of every circuit gate.
+            input_matrix: Boolean array of the rows to score, of shape
+                (inputs, rows).
+            output_truth: Boolean array of the logical outputs of those rows,
+                of shape (outputs, rows).
+            relative_sd: Standard deviation of the log of every perturbation
+                factor, i.e. roughly the relative error of the parameters.
+            parameter_sd: Overrides of relative_sd by parameter name, e.g.
+                {'n': 0.05}.
+        """
+        parameter_sd = parameter_sd or {}
+        self.propagator = propagator
+        self.input_matrix = input_matrix
+        self.output_truth = output_truth
+        names = []
+        nominal = []
+        deviations = []
+        library = propagator.gate_library
+        library_names = library.get_gate_names()
+        # Gate parameters are stored per parameter across every gate.
+        self.gate_slices = {}
+        for parameter_name in library.parameter_names:
+            start = len(nominal)
+            for gate_name, gate_index in zip(propagator.gate_names, assignment.tolist()):
+                names.append(f"{gate_name} ({library_names[gate_index]}).{parameter_name}")
+                nominal.append(library.parameter_arrays[parameter_name][gate_index])
+                deviations.append(parameter_sd.get(parameter_name, relative_sd))
+            self.gate_slices[parameter_name] = slice(start, len(nominal))
+        # (response function, {parameter name: index}) of every input sensor.
+        self.sensor_functions = []
+        for sensor_name in propagator.sensor_names:
+            sensor = input_sensors.get_sensor(sensor_name)
+            function = sensor.get_response_function()
+            indices = {}
+            for parameter_name in function.argument_names:
+                indices[parameter_name] = len(nominal)
+                names.append(f"{sensor_name}.{parameter_name}")
+                nominal.append(float(sensor.sensor_parameters[parameter_name].value))
+                deviations.append(parameter_sd.get(parameter_name, relative_sd))
+            self.sensor_functions.append((function, indices))
+        self.parameter_names = names
+        self.nominal = np.array(nominal, dtype=np.float64)
+        self.deviations = np.array(deviations, dtype=np.float64)
+
+    def sample(self, rng: np.random.Generator, num_samples: int) -> np.ndarray:
+        """
+        Draws the log perturbation factor of every parameter, of shape
+        (samples, parameters).
+        """
+        return rng.standard_normal((num_samples, len(self.nominal))) * self.deviations
+
+    def score(self, log_factors: np.ndarray) -> np.ndarray:
+        """
+        Scores a batch of perturbed parameter sets in a single propagation.
+
+        Args:
+            log_factors: Float array of shape (samples, parameters). Zeros
+                are the nominal parameters.
+
+        Returns:
+            The score of every sample.
+        """
+        parameters = self.nominal * np.exp(log_factors)
+        states = np.array([0.0, 1.0])
+        sensor_levels = np.stack(
+            [
+                np.broadcast_to(
+                    function.evaluate(
+                        states,
+                        {
+                            name: parameters[:, index, np.newaxis]
+                            for name, index in indices.items()
+                        },
+                    ),
+                    (len(parameters), 2),
+                )
+                for function, indices in self.sensor_functions
+            ],
+            axis=1,
+        )
+        input_levels = np.where(
+            self.input_matrix,
+            sensor_levels[:, :, 1:2],
+            sensor_levels[:, :, 0:1],
+        )
+        output_levels = self.propagator.propagate_parameters(
+            {name: parameters[:, index] for name, index in self.gate_slices.items()},
+            input_levels,
+        )
+        return get_on_off_ratio(output_levels, self.output_truth).min(axis=0)
+
+
+def score_parameter_batch(
+        model: ParameterUncertaintyModel,
+        seed: np.random.SeedSequence,
+        num_samples: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Draws and scores one batch of perturbed parameter sets.
+
+    Returns:
+        The log perturbation factors and the scores.
+    """
+    log_factors = model.sample(np.random.default_rng(seed), num_samples)
+    return log_factors, model.score(log_factors)
+
+
+def get_rank_correlations(samples: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """
+    The Spearman rank correlation between every column of samples and the
+    scores. Columns without any variation have no correlation.
+    """
+    sample_ranks = np.argsort(np.argsort(samples, axis=0), axis=0).astype(np.float64)
+    score_ranks = np.argsort(np.argsort(scores)).astype(np.float64)
+    sample_ranks -= sample_ranks.mean(axis=0)
+    score_ranks -= score_ranks.mean()
+    denominator = np.sqrt((sample_ranks ** 2).sum(axis=0) * (score_ranks ** 2).sum())
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correlations = (sample_ranks * score_ranks[:, np.newaxis]).sum(axis=0) / denominator
+    return np.nan_to_num(correlations)
+
+
+def estimate_score_distribution(
+        model: ParameterUncertaintyModel,
+        num_samples: int = 4096,
+        seed: Optional[int] = 0,
+        batch_size: int = 1024,
+        processes: int = 1,
+) -> RobustnessReport:
+    """
+    Monte Carlo estimate of the distribution of scores under parameter
+    uncertainty.
+
+    Args:
+        model: The parameter uncertainty of the circuit.
+        num_samples: Number of perturbed parameter sets.
+        seed: Seed of the perturbations.
+        batch_size: Number of parameter sets propagated at once.
+        processes: Number of worker processes to spread the batches across.
+
+    Returns:
+        The score distribution and the sensitivity of the score to every
+        parameter.
+    """
+    batch_sizes = [
+        min(batch_size, num_samples - start)
+        for start in range(0, num_samples, batch_size)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    arguments = [(model, batch_seed, size) for batch_seed, size in zip(seeds, batch_sizes)]
+    if processes == 1 or len(arguments) <= 1:
+        results = [score_parameter_batch(*argument) for argument in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(score_parameter_batch, *zip(*arguments)))
+    log_factors = np.concatenate([result[0] for result in results])
+    scores = np.concatenate([result[1] for result in results])
+    nominal_score = model.score(np.zeros((1, len(model.nominal))))[0]
+    return RobustnessReport(
+        nominal_score=float(nominal_score),
+        scores=scores,
+        parameter_names=model.parameter_names,
+        sensitivities=get_rank_correlations(log_factors, scores),
+    )
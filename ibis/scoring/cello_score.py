@@ -7,11 +7,15 @@ Roadmap:
 Written by W.R. Jackson <wrjackso@bu.edu>, DAMP Lab 2020
 --------------------------------------------------------------------------------
 """
-import itertools
-import math
+from dataclasses import dataclass
 from pathlib import Path
 from typing import (
     Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
 )
 
 import matplotlib.pyplot as plt
@@ -20,10 +24,30 @@ import pandas as pd
 from matplotlib import ticker
 
 from ibis.datastucture import (
+    CircuitMetrics,
     NetworkGeneticCircuit,
     LogicNetwork,
+    MarginEstimate,
+    MarginTracker,
+    ProportionEstimate,
+    batch_circuit_metrics,
+    canonical_input_matrix,
+    parse_cello_gate_library,
     parse_cello_input_file,
 )
+from ibis.scoring.cello_assignment import (
+    greedy_gate_assignment,
+    optimize_gate_assignment,
+)
+from ibis.scoring.cello_propagation import (
+    SignalPropagator,
+    get_on_off_ratio,
+)
+from ibis.scoring.cello_robustness import (
+    ParameterUncertaintyModel,
+    RobustnessReport,
+    estimate_score_distribution,
+)
 from ibis.scoring.scorer import BaseRequirement, BaseScoring
 
 from rich.console import Console
@@ -41,6 +65,7 @@ class CelloRequirement(BaseRequirement):
         input_signal_fp: <Absolute Filepath to Input Signal File>
         output_signal_fp: <Absolute Filepath to Output Signal File>
         verilog_file_fp: <Absolute Filepath to Input Signal File>
+        gate_assignment: <Library gate of every NOR and NOT gate, chosen if None>
     """
 
     def __init__(
@@ -49,11 +74,13 @@ class CelloRequirement(BaseRequirement):
             input_signal_fp: str,
             output_signal_fp: str,
             verilog_file_fp: str,
+            gate_assignment: Optional[Dict[str, str]] = None,
     ):
         self.ucf_fp = ucf_fp
         self.input_signal_fp = input_signal_fp
         self.output_signal_fp = output_signal_fp
         self.verilog_file_fp = verilog_file_fp
+        self.gate_assignment = gate_assignment
 
     def get_required_inputs(self):
         pass
@@ -62,12 +89,76 @@ class CelloRequirement(BaseRequirement):
         pass
 
 
+@dataclass
+class CelloResult:
+    """
+    Everything computed while scoring a design, so it can be reported without
+    simulating anything again.
+    """
+
+    score: float
+    sensor_names: List[str]
+    output_names: List[str]
+    gate_assignment: Dict[str, str]
+    # Per row results in canonical ordering, of shape (inputs, rows) and
+    # (outputs, rows) respectively. Not kept when the truth table is sampled.
+    input_matrix: Optional[np.ndarray] = None
+    output_truth: Optional[np.ndarray] = None
+    output_levels: Optional[np.ndarray] = None
+    sampling_estimate: Optional[ProportionEstimate] = None
+    margin_estimate: Optional[MarginEstimate] = None
+
+    def get_circuit_metrics(self) -> CircuitMetrics:
+        """
+        The angle, dynamic range and related metrics of every output, taking
+        its truth table as the intended vector and its activity as the
+        measurement. Only available when every row was evaluated.
+        """
+        if self.output_levels is None:
+            raise RuntimeError(
+                "Circuit metrics need every row of the truth table, which "
+                "isn't kept when the truth table is sampled."
+            )
+        return batch_circuit_metrics(self.output_truth, self.output_levels)
+
+
 class CelloScoring(BaseScoring):
     def __init__(
             self,
             network_graph: NetworkGeneticCircuit,
             requirement: CelloRequirement,
+            optimize_logic: bool = True,
+            sampling_threshold: int = 20,
+            sampling_seed: Optional[int] = None,
+            gate_assignment: Optional[Dict[str, str]] = None,
+            optimize_assignment: bool = True,
+            assignment_seed: int = 0,
     ):
+        """
+        Scores a circuit by propagating the ON and OFF levels of its input
+        sensors through the response functions of the repressors assigned to
+        its gates, for every row of the truth table at once.
+
+        Args:
+            network_graph: The genetic circuit.
+            requirement: Filepaths of the UCF, the input sensors, and the
+                verilog file, and optionally a gate assignment.
+            optimize_logic: Whether to optimize the logic before NOR mapping.
+            sampling_threshold: Past this many inputs the truth table is
+                sampled rather than enumerated.
+            sampling_seed: Seed of the sampled rows.
+            gate_assignment: The library gate of every NOR and NOT gate of
+                the mapped circuit. Defaults to the one in the requirement.
+                May also be set on the gate_assignment attribute after
+                construction, as the gate names are only known once the
+                circuit is mapped. If there is none, one is chosen on first
+                use, see get_gate_assignment.
+            optimize_assignment: Whether a missing gate assignment is
+                searched for with optimize_gate_assignment, for circuits
+                whose truth table is enumerated. Otherwise, and for sampled
+                circuits, greedy_gate_assignment is used.
+            assignment_seed: Seed of that search.
+        """
         super().__init__(network_graph, requirement)
         self.ucf_fp = requirement.ucf_fp
         self.input_signal_fp = requirement.input_signal_fp
@@ -75,95 +166,347 @@ class CelloScoring(BaseScoring):
         self.verilog_file_fp = requirement.verilog_file_fp
 
         self.input_sensors = parse_cello_input_file(self.input_signal_fp)
+        self.gate_library = parse_cello_gate_library(self.ucf_fp)
         self.logic_network = LogicNetwork(self.verilog_file_fp)
+        # Every gate left after NOR mapping needs a repressor of its own, so
+        # redundant logic costs gates from the library and adds their
+        # response curves to the propagated levels.
+        if optimize_logic:
+            self.logic_network.optimize()
+        # Cello only builds circuits out of NOR and NOT gates.
+        self.logic_network.perform_nor_logic_expansion()
+        self.propagator = SignalPropagator(
+            self.logic_network,
+            self.gate_library,
+            self.input_sensors,
+        )
+        # Past this many inputs the truth table is sampled rather than
+        # enumerated.
+        self.sampling_threshold = sampling_threshold
+        self.sampling_seed = sampling_seed
+        self.sampling_estimate: Optional[ProportionEstimate] = None
+        self.margin_estimate: Optional[MarginEstimate] = None
+        if gate_assignment is None:
+            gate_assignment = requirement.gate_assignment
+        self.gate_assignment = gate_assignment
+        self.optimize_assignment = optimize_assignment
+        self.assignment_seed = assignment_seed
+        self.result: Optional[CelloResult] = None
 
-    def score(self):
+    def use_sampling(self) -> bool:
+        return self.logic_network.get_number_of_inputs() > self.sampling_threshold
+
+    def get_gate_assignment(self) -> Dict[str, str]:
+        """
+        The library gate assigned to every NOR and NOT gate of the circuit.
+        If none was passed, one is chosen and kept: a seeded search when the
+        truth table is enumerated and optimize_assignment is set, and the
+        greedy assignment otherwise, as a search would have to simulate every
+        row.
+        """
+        if self.gate_assignment is None:
+            if self.optimize_assignment and not self.use_sampling():
+                self.gate_assignment = optimize_gate_assignment(
+                    self.logic_network,
+                    self.gate_library,
+                    self.input_sensors,
+                    seed=self.assignment_seed,
+                ).assignment
+            else:
+                self.gate_assignment = greedy_gate_assignment(
+                    self.logic_network,
+                    self.gate_library,
+                    self.input_sensors,
+                )
+        return self.gate_assignment
+
+    def propagate_rows(self, input_matrix: np.ndarray) -> np.ndarray:
         """
-        Function to score efficacy of a gate.
+        The activity of every output, in RPU, for a block of rows.
+
+        Args:
+            input_matrix: Boolean array of shape (inputs, rows).
+
+        Returns:
+            Float array of shape (outputs, rows).
         """
-        logical_inputs = list(
-            itertools.product(
-                [True, False],
-                repeat=len(self.logic_network.get_available_inputs())
+        assignment = self.propagator.get_assignment_indices(self.get_gate_assignment())
+        return self.propagator.propagate(
+            assignment[np.newaxis, :],
+            self.propagator.get_input_levels(input_matrix),
+        )[:, 0]
+
+    def iterate_rows(
+            self,
+            chunk_size: int = 1 << 16,
+    ) -> Iterator[Tuple[Tuple[bool, ...], Tuple[bool, ...], Tuple[float, ...]]]:
+        """
+        Streams the truth table row by row, simulating a block of rows at a
+        time, so arbitrarily large tables are scored with bounded memory.
+
+        Yields:
+            The logical input, the logical outputs, and the output levels of
+            every row, in canonical ordering.
+        """
+        for chunk in self.logic_network.iterate_truth_table(chunk_size=chunk_size):
+            output_levels = self.propagate_rows(chunk.input_matrix)
+            yield from zip(
+                map(tuple, chunk.input_matrix.T.tolist()),
+                map(tuple, chunk.output_matrix.T.tolist()),
+                map(tuple, output_levels.T.tolist()),
             )
+
+    def evaluate(self, chunk_size: int = 1 << 16) -> CelloResult:
+        """
+        Scores the design in a single pass over the truth table, keeping the
+        level of every output in every row. The result is cached until the
+        gate assignment changes.
+
+        Args:
+            chunk_size: Number of truth table rows simulated at a time.
+
+        Returns:
+            The result of the design.
+        """
+        gate_assignment = self.get_gate_assignment()
+        if self.result is not None and self.result.gate_assignment == gate_assignment:
+            return self.result
+        result = CelloResult(
+            score=0.0,
+            sensor_names=self.propagator.sensor_names,
+            output_names=self.logic_network.get_available_outputs(),
+            gate_assignment=dict(gate_assignment),
         )
-        high_off = float("-inf")
-        low_on = float("inf")
-        # We basically iterate over all possibilities of the truth table.
-        for logical_input in logical_inputs:
-            truth = self.logic_network.get_logical_output(logical_input)
-            input_list = list(self.input_sensors.sensor_table.keys())[:len(logical_input)]
-            boolean_input = {
-                input_list[0]: logical_input[0],
-                input_list[1]: logical_input[1],
-            }
-            on_value, off_value = self.input_sensors.generate_score_for_sensor(
-                boolean_input
+        if self.use_sampling():
+            result.score = self.estimate_score()
+            result.sampling_estimate = self.sampling_estimate
+            result.margin_estimate = self.margin_estimate
+        else:
+            chunks = list(self.logic_network.iterate_truth_table(chunk_size=chunk_size))
+            result.input_matrix = np.hstack([chunk.input_matrix for chunk in chunks])
+            result.output_truth = np.hstack([chunk.output_matrix for chunk in chunks])
+            # Every row is propagated in a single pass.
+            result.output_levels = self.propagate_rows(result.input_matrix)
+            result.score = float(
+                -get_on_off_ratio(result.output_levels, result.output_truth).min()
             )
-            # If this is True, our signal is high. If it is False, our signal
-            # is low. We use this to get the lowest one and highest off
-            # respectively.
-            if truth:
-                if on_value < low_on:
-                    low_on = on_value
-            if not truth:
-                if off_value > high_off:
-                    high_off = off_value
-        return math.log10(high_off / low_on)
+        self.result = result
+        return result
 
-    def report(self):
-        table = Table(title=f"Cello Score: {Path(self.verilog_file_fp).stem}")
+    def score(self, stop_above: Optional[float] = None, chunk_size: int = 1 << 16):
+        """
+        Function to score efficacy of a gate. The score is
+        log10(highest OFF level / lowest ON level) of the worst output, so
+        lower is better.
 
-        for index in range(self.logic_network.get_number_of_inputs()):
-            table.add_column(f'Input {index}')
-        table.add_column(f'Output')
-        table.add_column("Score")
-        logical_inputs = list(
-            itertools.product(
-                [True, False],
-                repeat=len(self.logic_network.get_available_inputs())
-            )
+        Args:
+            stop_above: Optional bound. The running score can only ever grow
+                as rows are added, so once it exceeds the bound the remaining
+                rows are skipped and the running score is returned. Without
+                a bound, the full result is kept for report.
+            chunk_size: Number of truth table rows simulated at a time.
+        """
+        if stop_above is None or self.use_sampling():
+            return self.evaluate(chunk_size).score
+        num_outputs = self.logic_network.get_number_of_outputs()
+        high_off = np.full(num_outputs, -np.inf)
+        low_on = np.full(num_outputs, np.inf)
+        for chunk in self.logic_network.iterate_truth_table(chunk_size=chunk_size):
+            output_levels = self.propagate_rows(chunk.input_matrix)
+            truth = chunk.output_matrix
+            low_on = np.minimum(low_on, np.where(truth, output_levels, np.inf).min(axis=1))
+            high_off = np.maximum(high_off, np.where(truth, -np.inf, output_levels).max(axis=1))
+            if (
+                    (high_off > 0).all()
+                    and np.isfinite(low_on).all()
+                    and np.log10(high_off / low_on).max() > stop_above
+            ):
+                break
+        return float(np.log10(high_off / low_on).max())
+
+    def estimate_score(
+            self,
+            confidence: float = 0.95,
+            tolerance: float = 0.02,
+            quantile: float = 1e-3,
+            max_samples: int = 1 << 20,
+    ) -> float:
+        """
+        Estimates the score from random input vectors, for circuits too wide
+        to enumerate. The highest OFF and lowest ON level of every output are
+        taken at the passed in quantile of the rows rather than over every
+        row, as extremes of a sample don't converge while quantiles do. See
+        MarginTracker.
+
+        Sampling stops once the confidence interval of the score is within
+        the tolerance. The estimate is kept in margin_estimate, along with
+        the ON fraction of the first output in sampling_estimate.
+
+        Args:
+            confidence: Confidence level of the intervals.
+            tolerance: Requested half width of the score interval, in log10
+                units.
+            quantile: Fraction of the worst rows left out of the score.
+            max_samples: Upper bound on the number of rows drawn.
+
+        Returns:
+            The estimated score.
+        """
+        sampler = self.logic_network.get_random_vector_sampler(self.sampling_seed)
+        output_name = self.logic_network.get_available_outputs()[0]
+        tracker = MarginTracker(
+            self.logic_network.get_number_of_outputs(),
+            quantile=quantile,
+            confidence=confidence,
+            max_samples=max_samples,
         )
-        high_off = float("-inf")
-        low_on = float("inf")
-        # We basically iterate over all possibilities of the truth table.
-        for logical_input in logical_inputs:
-            observation_list = []
-            truth = self.logic_network.get_logical_output(logical_input)
-            input_list = list(self.input_sensors.sensor_table.keys())[:len(logical_input)]
-            boolean_input = {
-                input_list[0]: logical_input[0],
-                input_list[1]: logical_input[1],
-            }
-            on_value, off_value = self.input_sensors.generate_score_for_sensor(
-                boolean_input
-            )
-            observation_list.append(f'{logical_input[0]}')
-            observation_list.append(f'{logical_input[1]}')
-            observation_list.append(f'{truth}')
-            # If this is True, our signal is high. If it is False, our signal
-            # is low. We use this to get the lowest one and highest off
-            # respectively.
-            if truth:
-                if on_value < low_on:
-                    low_on = on_value
-            if not truth:
-                if off_value > high_off:
-                    high_off = off_value
-            observation_list.append(f'{round(abs(math.log10(off_value / on_value)), 4)}')
-            table.add_row(
-                f'{observation_list[0]}',
-                f'{observation_list[1]}',
-                f'{observation_list[2]}',
-                f'{observation_list[3]}',
+        on_count = 0
+        num_samples = 0
+        for input_matrix, output_matrix in sampler.iterate_batches(
+                max_samples=max_samples,
+        ):
+            tracker.update(self.propagate_rows(input_matrix), output_matrix)
+            truth = output_matrix[0]
+            on_count += int(truth.sum())
+            num_samples += len(truth)
+            self.sampling_estimate = ProportionEstimate(
+                output_name,
+                on_count,
+                num_samples,
+                confidence,
             )
-        # Build our columns
+            self.margin_estimate = tracker.get_estimate()
+            if self.margin_estimate.half_width <= tolerance:
+                break
+        return self.margin_estimate.estimate
+
+    def estimate_robustness(
+            self,
+            num_samples: int = 4096,
+            relative_sd: float = 0.1,
+            parameter_sd: Optional[Dict[str, float]] = None,
+            seed: Optional[int] = 0,
+            processes: int = 1,
+            max_rows: int = 1 << 12,
+    ) -> RobustnessReport:
+        """
+        Scores the circuit under thousands of perturbations of its sensor and
+        gate parameters. See cello_robustness.py.
+
+        Args:
+            num_samples: Number of perturbed parameter sets.
+            relative_sd: Relative error of every parameter.
+            parameter_sd: Relative error by parameter name, overriding
+                relative_sd.
+            seed: Seed of the perturbations.
+            processes: Number of worker processes.
+            max_rows: Circuits with a larger truth table are scored over
+                this many random rows instead.
+
+        Returns:
+            The distribution of the log10 ON/OFF ratio, i.e. the negated
+            score, along with the parameters it is most sensitive to.
+        """
+        num_inputs = self.logic_network.get_number_of_inputs()
+        if 1 << num_inputs <= max_rows:
+            input_matrix = canonical_input_matrix(num_inputs)
+            output_truth = self.logic_network.simulate(input_matrix)
+        else:
+            sampler = self.logic_network.get_random_vector_sampler(self.sampling_seed)
+            input_matrix, output_truth = next(sampler.iterate_batches(
+                batch_size=max_rows,
+                max_samples=max_rows,
+            ))
+        model = ParameterUncertaintyModel(
+            self.propagator,
+            self.input_sensors,
+            self.propagator.get_assignment_indices(self.get_gate_assignment()),
+            input_matrix,
+            output_truth,
+            relative_sd=relative_sd,
+            parameter_sd=parameter_sd,
+        )
+        return estimate_score_distribution(
+            model,
+            num_samples=num_samples,
+            seed=seed,
+            processes=processes,
+        )
 
-        # table.add_row(tuple(observation_list))
+    def report_robustness(self, robustness: Optional[RobustnessReport] = None):
+        if robustness is None:
+            robustness = self.estimate_robustness()
+        console = Console()
+        percentiles = Table(
+            title=f"Cello Robustness: {Path(self.verilog_file_fp).stem} "
+                  f"({len(robustness.scores)} samples)"
+        )
+        percentiles.add_column("Nominal")
+        for percentile in robustness.get_percentiles():
+            percentiles.add_column(f"P{percentile}")
+        percentiles.add_row(
+            f"{round(robustness.nominal_score, 4)}",
+            *[f"{round(value, 4)}" for value in robustness.get_percentiles().values()],
+        )
+        console.print(percentiles)
+        sensitivities = Table(title="Most Sensitive Parameters")
+        sensitivities.add_column("Parameter")
+        sensitivities.add_column("Rank Correlation")
+        for name, correlation in robustness.get_most_sensitive():
+            sensitivities.add_row(name, f"{round(correlation, 3)}")
+        console.print(sensitivities)
+
+    def report(self):
+        result = self.evaluate()
+        if result.sampling_estimate is not None:
+            estimate = result.sampling_estimate
+            margin = result.margin_estimate
+            low, high = estimate.interval
+            panel = Panel(
+                Text(
+                    f"Estimated Score: {abs(result.score)}\n"
+                    f"Score Interval: [{round(margin.interval[0], 4)}, "
+                    f"{round(margin.interval[1], 4)}] at "
+                    f"{margin.confidence:.0%} confidence, observed "
+                    f"{round(margin.observed, 4)}\n"
+                    f"ON Fraction: {round(estimate.estimate, 4)} "
+                    f"[{round(low, 4)}, {round(high, 4)}] at "
+                    f"{estimate.confidence:.0%} confidence over "
+                    f"{estimate.num_samples} samples",
+                    justify="center",
+                ),
+                title=f"Cello Score: {Path(self.verilog_file_fp).stem}",
+                expand=False,
+            )
+            Console().print(panel)
+            return
+        table = Table(title=f"Cello Score: {Path(self.verilog_file_fp).stem}")
+        for sensor_name in result.sensor_names:
+            table.add_column(sensor_name)
+        for output_name in result.output_names:
+            table.add_column(f'{output_name}')
+            table.add_column(f'{output_name} (RPU)')
+        for logical_input, truth, output_levels in zip(
+                result.input_matrix.T.tolist(),
+                result.output_truth.T.tolist(),
+                result.output_levels.T.tolist(),
+        ):
+            observation_list = [f'{value}' for value in logical_input]
+            for output_truth, output_level in zip(truth, output_levels):
+                observation_list.append(f'{output_truth}')
+                observation_list.append(f'{round(output_level, 4)}')
+            table.add_row(*observation_list)
         console = Console()
         console.print(table)
 
-        panel = Panel(Text(f"Final Score: {abs(math.log10(low_on / high_off))}", justify="center"), expand=False)
+        assignment = Table(title="Gate Assignment")
+        assignment.add_column("Circuit Gate")
+        assignment.add_column("Library Gate")
+        for gate_name, library_gate in result.gate_assignment.items():
+            assignment.add_row(gate_name, library_gate)
+        console.print(assignment)
+
+        panel = Panel(Text(f"Final Score: {abs(result.score)}", justify="center"), expand=False)
         console.print(panel)
 
     def get_requirements(self):
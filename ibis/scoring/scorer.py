@@ -14,6 +14,9 @@ from typing import (
     List,
     Optional,
     Type,
+    Union,
+    get_args,
+    get_origin,
 )
 
 import yaml
@@ -283,6 +286,16 @@ def generate_template_yaml(
         yaml.dump(requirement_dict, out_file)
 
 
+def get_field_type(annotation) -> type:
+    """
+    The plain type a requirement field is checked against, e.g. dict for
+    Optional[Dict[str, str]].
+    """
+    if get_origin(annotation) is Union:
+        annotation = [arg for arg in get_args(annotation) if arg is not type(None)][0]
+    return get_origin(annotation) or annotation
+
+
 def validate_input_file(input_fp: str, requested_scorers: List[str]):
     if not os.path.isfile(input_fp):
         raise RuntimeError(
@@ -297,11 +310,7 @@ def validate_input_file(input_fp: str, requested_scorers: List[str]):
         for scorer in requested_scorers:
             requirements = req_map[scorer]
             req_annotations = inspect.signature(requirements).parameters
-            anno_dict = {}
-            for k in req_annotations:
-                anno = req_annotations[k].annotation
-                anno_dict[k] = anno
-            requirement_dict[scorer] = anno_dict
+            requirement_dict[scorer] = dict(req_annotations)
         # They could be using an older input file that has entries for a
         # specific solver, but we shouldn't care about them if they aren't
         # requested.
@@ -319,21 +328,32 @@ def validate_input_file(input_fp: str, requested_scorers: List[str]):
                 )
             sub_entry_dict = input_dict[key]
             sub_requirement_dict = requirement_dict[key]
-            if sub_entry_dict.keys() != sub_requirement_dict.keys():
-                diff = set(sub_requirement_dict.keys()) - set(sub_entry_dict)
+            # Fields with a default may be left out of the file.
+            required = {
+                name for name, parameter in sub_requirement_dict.items()
+                if parameter.default is inspect.Parameter.empty
+            }
+            if (
+                    not required <= sub_entry_dict.keys()
+                    or not sub_entry_dict.keys() <= sub_requirement_dict.keys()
+            ):
+                diff = set(sub_entry_dict) ^ set(sub_requirement_dict.keys())
                 raise RuntimeError(
                     f"Input Dictionary and Requirements differ. Delta is {diff}"
                 )
             for entry in sub_entry_dict:
-                field_type = sub_requirement_dict[entry]
+                parameter = sub_requirement_dict[entry]
+                field_type = get_field_type(parameter.annotation)
                 # Some of these might require a cast because how they are
                 # persisted to the file might differ from it's type in Python
                 # space.
                 actual_field = sub_entry_dict[entry]
+                if actual_field is None and parameter.default is None:
+                    continue
                 if type(actual_field) != field_type:
                     try:
                         field_type(actual_field)
-                    except ValueError:
+                    except (TypeError, ValueError):
                         raise RuntimeError(
                             f"{key}: Field {actual_field} in {entry} is not of "
                             f"type {field_type}. Please investigate"
@@ -12,6 +12,11 @@ import matplotlib.pyplot as plt
 import networkx as nx
 import seaborn as sns
 
+from ibis.datastucture.netlist import (
+    BINARY_NETLIST_SUFFIX,
+    CompactNetlist,
+)
+
 
 def plot_graph(
         input_graph: nx.DiGraph,
@@ -51,7 +56,10 @@ def plot_cell_edgelist(
         output_filename: str = 'test.jpg',
 ):
     original_network = False
-    g = nx.read_edgelist(input_edgelist_fp)
+    if input_edgelist_fp.endswith(BINARY_NETLIST_SUFFIX):
+        g = CompactNetlist.read_binary(input_edgelist_fp).to_networkx()
+    else:
+        g = nx.read_edgelist(input_edgelist_fp)
     plt.figure(num=None, figsize=(15, 15), dpi=80)
     img_path = "nor_gate.png"
     img_list = []
@@ -6,8 +6,11 @@ Primary Entrypoint into Ibis
 Written by W.R. Jackson, Ben Bremer, Eric South
 --------------------------------------------------------------------------------
 """
+from collections import Counter
+import glob
 import os
 from pathlib import Path
+import time
 from typing import (
     List,
     Optional,
@@ -16,13 +19,20 @@ from typing import (
 import pkg_resources
 import typer
 from rich.console import Console
+from rich.table import Table
 
 from ibis.datastucture import (
     NetworkGeneticCircuit,
     LogicNetwork,
+    parse_cello_gate_library,
+    parse_cello_input_file,
 )
+from ibis.datastucture.batch import synthesize_verilog_batch
+from ibis.datastucture.netlist import BINARY_NETLIST_SUFFIX
 
 from ibis.ingress import parse_sbol_xml_tree
+from ibis.scoring.blade_score import BladeDatasetScoring
+from ibis.scoring.cello_assignment import optimize_gate_assignment
 from ibis.scoring import (
     get_requirement_map,
     get_scorer_map,
@@ -177,10 +187,43 @@ def score(
 @app.command()
 def synthesize_logic_graph(
         input_fp: str,
-        visualize_graph: bool = True,
+        visualize_graph: Optional[bool] = typer.Option(
+            None,
+            help="Plot the network. Defaults to on for a single file and off "
+                 "for a batch.",
+        ),
         save_edgelist: bool = True,
         output_fp: str = None,
+        processes: Optional[int] = typer.Option(
+            None,
+            help="Worker processes for a batch. Defaults to the CPU count.",
+        ),
+        truth_table: bool = typer.Option(
+            True,
+            help="Write the truth table of every file in a batch.",
+        ),
+        force: bool = typer.Option(
+            False,
+            help="Regenerate batch outputs that are already up to date.",
+        ),
 ):
+    """
+    Synthesizes a verilog file into a logic graph. If passed a directory or a
+    glob pattern, every verilog file within is synthesized in parallel and
+    output_fp is the directory to write to.
+    """
+    if os.path.isdir(input_fp) or glob.has_magic(input_fp):
+        synthesize_logic_graph_batch(
+            input_pattern=input_fp,
+            output_dir=output_fp or os.getcwd(),
+            processes=processes,
+            write_truth_table=truth_table,
+            visualize_graph=bool(visualize_graph),
+            force=force,
+        )
+        return
+    if visualize_graph is None:
+        visualize_graph = True
     if not os.path.exists(input_fp):
         raise RuntimeError(f'Unable to find {input_fp}. Please investigate.')
     fn = Path(input_fp).stem
@@ -197,21 +240,175 @@ def synthesize_logic_graph(
         if output_fp is None:
             output_fp = f'{fn}.edgelist'
         lnetwork.save_netlist(output_fp=output_fp)
-    lnetwork.cleanup()
+
+
+def synthesize_logic_graph_batch(
+        input_pattern: str,
+        output_dir: str,
+        processes: Optional[int],
+        write_truth_table: bool,
+        visualize_graph: bool,
+        force: bool,
+):
+    """
+    Runs a batch synthesis and prints a summary of throughput and failures.
+    """
+    start_time = time.perf_counter()
+    results = synthesize_verilog_batch(
+        input_pattern=input_pattern,
+        output_dir=output_dir,
+        processes=processes,
+        write_truth_table=write_truth_table,
+        visualize_graph=visualize_graph,
+        force=force,
+    )
+    elapsed = time.perf_counter() - start_time
+    counts = Counter(result.status for result in results)
+    table = Table(title=f"Batch Synthesis: {input_pattern}")
+    table.add_column("Files")
+    table.add_column("Synthesized")
+    table.add_column("Skipped")
+    table.add_column("Failed")
+    table.add_column("Seconds")
+    table.add_column("Files / Second")
+    table.add_row(
+        f"{len(results)}",
+        f"{counts['synthesized']}",
+        f"{counts['skipped']}",
+        f"{counts['failed']}",
+        f"{round(elapsed, 2)}",
+        f"{round(len(results) / elapsed, 1) if elapsed else len(results)}",
+    )
+    console.print(table)
+    for result in results:
+        if result.status == "failed":
+            console.print(f"[red]Failed: {result.verilog_fp}[/red]")
+            console.print(result.error)
 
 
 @app.command()
-def visualize_edgelist(
+def write_truth_table(
         input_fp: str,
+        output_fp: str = None,
+        binary: bool = False,
+        chunk_size: int = 1 << 16,
 ):
+    """
+    Streams the truth table of a verilog file to a CSV or packed binary file.
+    """
     if not os.path.exists(input_fp):
         raise RuntimeError(f'Unable to find {input_fp}. Please investigate.')
     fn = Path(input_fp).stem
-    if Path(input_fp).suffix != '.edgelist':
+    if Path(input_fp).suffix != '.v':
         raise RuntimeError(
             f'Input File {fn} does not seem to be a verilog '
             f'file. Please investigate.'
         )
+    if output_fp is None:
+        output_fp = f'{fn}.truth' if binary else f'{fn}.csv'
+    lnetwork = LogicNetwork(verilog_fp=input_fp)
+    lnetwork.write_truth_table(
+        output_fp=output_fp,
+        binary=binary,
+        chunk_size=chunk_size,
+    )
+
+
+@app.command()
+def assign_gates(
+        verilog_fp: str,
+        gate_library_fp: str,
+        input_sensor_fp: str,
+        seed: int = 0,
+        chains: int = 4,
+        steps: int = 200,
+        processes: int = 1,
+        node_limit: int = 10000,
+):
+    """
+    Assigns repressors from a UCF gate library to the gates of a verilog file,
+    maximizing the ON/OFF ratio of the NOR mapped circuit.
+    """
+    for fp in (verilog_fp, gate_library_fp, input_sensor_fp):
+        if not os.path.exists(fp):
+            raise RuntimeError(f'Unable to find {fp}. Please investigate.')
+    lnetwork = LogicNetwork(verilog_fp=verilog_fp)
+    lnetwork.perform_nor_logic_expansion()
+    result = optimize_gate_assignment(
+        logic_network=lnetwork,
+        gate_library=parse_cello_gate_library(gate_library_fp),
+        input_sensors=parse_cello_input_file(input_sensor_fp),
+        seed=seed,
+        chains=chains,
+        steps=steps,
+        processes=processes,
+        node_limit=node_limit,
+    )
+    table = Table(title=f"Gate Assignment: {Path(verilog_fp).name}")
+    table.add_column("Circuit Gate")
+    table.add_column("Library Gate")
+    for gate_name, library_gate in result.assignment.items():
+        table.add_row(gate_name, library_gate)
+    console.print(table)
+    console.print(
+        f"Score: {round(result.score, 3)} "
+        f"({'proven optimal' if result.proven_optimal else 'best found'}), "
+        f"{result.evaluations} assignments in {round(result.elapsed, 2)} s "
+        f"({round(result.assignments_per_second)} / second)"
+    )
+
+
+@app.command()
+def score_blade_dataset(
+        experimental_data_fp: str,
+        top: Optional[int] = typer.Option(
+            None,
+            help="Only list this many of the best gates.",
+        ),
+        bootstrap: int = typer.Option(
+            0,
+            help="Report confidence intervals of the angles from this many "
+                 "measurements resampled from the SEM columns.",
+        ),
+        confidence: float = typer.Option(
+            0.95,
+            help="Coverage of the confidence intervals.",
+        ),
+        seed: int = typer.Option(0, help="Seed of the resampling."),
+):
+    """
+    Scores every gate of a Blade experimental data file at once, ranked next
+    to the published angles.
+    """
+    if not os.path.exists(experimental_data_fp):
+        raise RuntimeError(
+            f'Unable to find {experimental_data_fp}. Please investigate.'
+        )
+    scorer = BladeDatasetScoring(experimental_data_fp)
+    scorer.report(top=top)
+    if bootstrap:
+        scorer.report_uncertainty(
+            scorer.estimate_uncertainty(
+                num_samples=bootstrap,
+                confidence=confidence,
+                seed=seed,
+            ),
+            top=top,
+        )
+
+
+@app.command()
+def visualize_edgelist(
+        input_fp: str,
+):
+    if not os.path.exists(input_fp):
+        raise RuntimeError(f'Unable to find {input_fp}. Please investigate.')
+    fn = Path(input_fp).stem
+    if Path(input_fp).suffix not in ('.edgelist', BINARY_NETLIST_SUFFIX):
+        raise RuntimeError(
+            f'Input File {fn} does not seem to be an edgelist '
+            f'file. Please investigate.'
+        )
     plot_cell_edgelist(input_fp)
 
 
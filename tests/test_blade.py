@@ -1,8 +1,28 @@
 import os
 
+import numpy as np
 import pytest
 
-from ibis.datastucture import GeneticCircuit
+from ibis.datastucture import (
+    GeneticCircuit,
+    TruthTable,
+    batch_circuit_metrics,
+)
+from ibis.ingress import (
+    infer_experimental_data_schema,
+    iterate_experimental_data,
+    read_experimental_data,
+    read_experimental_data_row,
+)
+from ibis.scoring.blade_score import (
+    BladeDatasetScoring,
+    BladeRequirement,
+    BladeScoring,
+)
+from ibis.scoring.blade_uncertainty import bootstrap_vector_proximity
+
+BLADE_DIR = os.path.join(os.path.dirname(__file__), "test_blade")
+BLADE_DATA_FP = os.path.join(BLADE_DIR, "41587_2017_BFnbt3805_MOESM250_ESM-1.csv")
 
 
 def _parse_line(line):
@@ -40,12 +60,7 @@ def parse_blade_file():
     """
     Load data file from BLADE paper.
     """
-    fn = os.path.join(
-        os.path.dirname(__file__),
-        "test_blade",
-        "41587_2017_BFnbt3805_MOESM250_ESM-1.csv",
-    )
-    with open(fn) as f:
+    with open(BLADE_DATA_FP) as f:
         f.readline()  # header
         circuits = dict(_parse_line(line) for line in f)
     return circuits
@@ -65,5 +80,206 @@ def test_blade():
         vp = round(gc.vector_proximity(), 1)
         assert abs(vp - ta) < 0.11  # room for rounding errors
 
+
+def test_blade_truth_table():
+    """
+    A packed TruthTable is scored the same as the equivalent list.
+    """
+    circs = parse_blade_file()
+    for i, (gc, ta) in list(circs.items())[:20]:
+        packed_gc = GeneticCircuit(2, 2)
+        binary_logic = gc.intended_truth_table
+        # Blade interleaves both outputs of each row.
+        packed_gc.intended_truth_table = TruthTable.from_output_matrix(
+            np.array([binary_logic[0::2], binary_logic[1::2]]) != 0,
+            num_inputs=2,
+        )
+        packed_gc.exp_data = gc.exp_data
+        assert packed_gc.get_intended_vector().tolist() == binary_logic
+        assert packed_gc.vector_proximity() == gc.vector_proximity()
+
+
+def test_blade_dataset():
+    """
+    Scoring the whole dataset at once matches scoring gate by gate.
+    """
+    circs = parse_blade_file()
+    scorer = BladeDatasetScoring(BLADE_DATA_FP)
+    angles = scorer.score()
+    assert angles.shape == (len(circs),)
+    assert scorer.dataset.gate_ids.tolist() == list(circs)
+    for angle, (i, (gc, ta)) in zip(angles.tolist(), circs.items()):
+        assert np.isclose(angle, gc.vector_proximity())
+        if i != "99":
+            assert abs(round(angle, 1) - ta) < 0.11
+    assert np.array_equal(scorer.dataset.published_angles, [ta for _, ta in circs.values()])
+    ranking = scorer.get_ranking()
+    assert (np.diff(angles[ranking]) >= 0).all()
+    scorer.report(top=10)
+
+
+def test_experimental_data_schema(tmp_path):
+    """
+    The column layout is inferred from the header for any number of inputs,
+    and streaming the file in chunks matches reading it whole.
+    """
+    with open(BLADE_DATA_FP) as f:
+        header = [cell.strip('"') for cell in f.readline().strip().split(",")]
+        first_row = f.readline().strip().split(",")
+    schema = infer_experimental_data_schema(header, first_row)
+    assert (schema.num_inputs, schema.num_outputs) == (2, 2)
+    assert schema.logic_columns == list(range(5, 13))
+    assert schema.mean_columns == list(range(13, 21))
+    assert schema.sem_columns == list(range(21, 29))
+    assert (schema.gate_column, schema.angle_column) == (0, 29)
+
+    # A single output three input layout, without angles.
+    rng = np.random.default_rng(0)
+    conditions = [format(index, "03b") for index in range(8)]
+    logic = rng.integers(0, 2, size=(50, 8))
+    means = rng.uniform(0, 30000, size=(50, 8)).round(1)
+    sems = rng.uniform(0, 100, size=(50, 8)).round(1)
+    csv_fp = tmp_path / "three_input.csv"
+    with open(csv_fp, "w") as f:
+        f.write(",".join(
+            ["GATE", "NOTES"]
+            + [f"Z{c}" for c in conditions]
+            + [f"Z{c} MEAN" for c in conditions]
+            + [f"Z{c} SEM" for c in conditions]
+        ) + "\n")
+        for index in range(50):
+            f.write(",".join(
+                [f"G{index}", "note"]
+                + [str(x) for x in logic[index]]
+                + [str(x) for x in means[index]]
+                + [str(x) for x in sems[index]]
+            ) + "\n")
+        f.write("\n")
+    data = read_experimental_data(str(csv_fp), cap_value=20000.0)
+    assert data.binary_logic.dtype == np.int8
+    assert data.gate_ids.tolist() == [f"G{index}" for index in range(50)]
+    assert np.array_equal(data.binary_logic, logic)
+    assert np.array_equal(data.exp_means, np.minimum(means, 20000.0))
+    assert np.array_equal(data.exp_sems, sems)
+    assert data.published_angles is None
+    chunks = list(iterate_experimental_data(str(csv_fp), chunk_size=16))
+    assert [len(chunk) for chunk in chunks] == [16, 16, 16, 2]
+    assert np.array_equal(np.concatenate([chunk.exp_means for chunk in chunks]), means)
+    # Single rows are indexed the same, past any blank lines.
+    lines = csv_fp.read_text().splitlines(keepends=True)
+    blank_fp = tmp_path / "blank_lines.csv"
+    blank_fp.write_text("".join(lines[:10] + ["\n", "  \n"] + lines[10:]))
+    for index in (0, 9, 37, 49):
+        row = read_experimental_data_row(str(blank_fp), index, cap_value=20000.0)
+        assert row.gate_ids.tolist() == [f"G{index}"]
+        assert np.array_equal(row.exp_means[0], data.exp_means[index])
+    with pytest.raises(RuntimeError):
+        read_experimental_data_row(str(blank_fp), 50)
+    scorer = BladeDatasetScoring(str(csv_fp))
+    assert scorer.score().shape == (50,)
+    scorer.report(top=5)
+
+
+def test_batch_circuit_metrics():
+    """
+    Batch metrics match GeneticCircuit, average replicates, and come out NaN
+    rather than failing for rows they are undefined for, where GeneticCircuit
+    raises.
+    """
+    circs = parse_blade_file()
+    metrics = BladeDatasetScoring(BLADE_DATA_FP).get_metrics()
+    for index, (gc, _) in enumerate(circs.values()):
+        assert np.isclose(metrics.angles[index], gc.vector_proximity())
+        if 0 in gc.intended_truth_table and 1 in gc.intended_truth_table:
+            assert np.isclose(metrics.dynamic_ranges[index], gc.dynamic_range())
+        else:
+            assert np.isnan(metrics.dynamic_ranges[index])
+
+    intended = np.array([[0, 1, 0, 1], [0, 1, 0, 1], [0, 0, 1, 1]])
+    measured = np.array([
+        [[1, 2], [10, 12], [1, 1], [9, 9]],
+        # No replicate variation.
+        [[5, 5], [5, 5], [5, 5], [5, 5]],
+        # No signal at all, and a missing replicate.
+        [[0, 0], [0, 0], [0, np.nan], [0, 0]],
+    ], dtype=float)
+    with np.errstate(all="raise"):
+        metrics = batch_circuit_metrics(intended, measured)
+    assert metrics.means[0].tolist() == [1.5, 11.0, 1.0, 9.0]
+    assert np.isclose(metrics.dynamic_ranges[0], 6.0)
+    assert np.isclose(metrics.signal_to_noise[0], 8.75 / np.sqrt(0.625))
+    assert metrics.dynamic_ranges[1] == 1.0
+    assert np.isnan(metrics.signal_to_noise[1])
+    assert np.isnan(metrics.angles[2])
+    assert np.isnan(metrics.dynamic_ranges[2])
+    # A single circuit still raises on the same degenerate input.
+    gc = GeneticCircuit()
+    gc.intended_truth_table = [0, 0, 1, 1]
+    gc.exp_data = [0.0, 0.0, 0.0, 0.0]
+    with pytest.raises(ZeroDivisionError):
+        gc.vector_proximity()
+    with pytest.raises(ZeroDivisionError):
+        gc.dynamic_range()
+    gc.intended_truth_table = [0, 0, 0, 0]
+    gc.exp_data = [1.0, 2.0, 3.0, 4.0]
+    with pytest.raises(ValueError):
+        gc.dynamic_range()
+
+
+def test_blade_angle_intervals():
+    """
+    Resampled angles are reproducible, bracket the nominal angles and
+    collapse onto them without measurement error.
+    """
+    scorer = BladeDatasetScoring(BLADE_DATA_FP)
+    intervals = scorer.estimate_uncertainty(num_samples=2000, seed=1)
+    assert np.array_equal(intervals.nominal, scorer.score())
+    assert (intervals.lower <= intervals.upper).all()
+    assert (intervals.standard_errors > 0).all()
+    # Resampling is noisy around the nominal angle, not biased away from it.
+    inside = (intervals.lower <= intervals.nominal) & (intervals.nominal <= intervals.upper)
+    assert inside.mean() > 0.9
+    repeated = scorer.estimate_uncertainty(num_samples=2000, seed=1)
+    assert np.array_equal(intervals.lower, repeated.lower)
+    exact = bootstrap_vector_proximity(
+        scorer.dataset.binary_logic,
+        scorer.dataset.exp_means,
+        np.zeros_like(scorer.dataset.exp_means),
+        num_samples=100,
+    )
+    assert np.allclose(exact.lower, exact.nominal)
+    assert np.allclose(exact.upper, exact.nominal)
+    scorer.report_uncertainty(intervals, top=5)
+
+
+def test_blade_scoring():
+    """
+    A circuit is scored against a row of the dataset with both of its
+    outputs, in the layout of its truth table.
+    """
+    requirement = BladeRequirement(
+        verilog_file_fp=os.path.join(BLADE_DIR, "gfp_and.v"),
+        num_inputs=2,
+        num_outputs=2,
+        experimental_data_fp=BLADE_DATA_FP,
+        column_index=112,
+    )
+    scorer = BladeScoring(requirement)
+    assert len(scorer.gc.get_intended_vector()) == len(scorer.gc.exp_data) == 8
+    assert sorted(scorer.gc.get_intended_vector().tolist()) == sorted(scorer.binary_logic)
+    assert scorer.score() == scorer.true_angle == 1.7
+    intervals = scorer.estimate_uncertainty(num_samples=500)
+    assert intervals.lower[0] <= intervals.nominal[0] <= intervals.upper[0]
+    scorer.report()
+    with pytest.raises(RuntimeError):
+        BladeScoring(BladeRequirement(
+            os.path.join(os.path.dirname(__file__), "test_verilog", "and.v"),
+            2,
+            2,
+            BLADE_DATA_FP,
+            3,
+        ))
+
+
 if __name__ == '__main__':
     test_blade()
\ No newline at end of file
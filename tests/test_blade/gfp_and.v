@@ -0,0 +1,10 @@
+// GFP on only when both inputs are present, mCherry never on. The layout of
+// gate 113 of the Blade data.
+module gfp_and(output gfp, mcherry, input a, b);
+
+   wire w1;
+   and (gfp, a, b);
+   not (w1, a);
+   and (mcherry, a, w1);
+
+endmodule
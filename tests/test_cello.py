@@ -239,3 +239,267 @@
 #     p1.set_biological_inputs([plux, s1])
 #     p1.set_logical_function("NOR")
 #     results = optimize_repressor(p1, "Nelder-Mead")
+
+
+import os
+
+import numpy as np
+import pytest
+import yaml
+
+import main
+from ibis.datastucture import (
+    LogicNetwork,
+    canonical_input_matrix,
+    parse_cello_gate_library,
+    parse_cello_input_file,
+)
+from ibis.scoring import (
+    generate_requirement_classes,
+    validate_input_file,
+)
+from ibis.scoring.cello_assignment import (
+    GateAssignmentProblem,
+    branch_and_bound,
+    greedy_gate_assignment,
+    optimize_gate_assignment,
+)
+from ibis.scoring.cello_score import (
+    CelloRequirement,
+    CelloScoring,
+)
+
+UCF_DIR = os.path.join(os.path.dirname(__file__), "test_cello", "test_ucf_files")
+
+
+def test_gate_assignment():
+    network = LogicNetwork(verilog_fp=os.path.join(UCF_DIR, "and.v"))
+    network.perform_nor_logic_expansion()
+    gate_library = parse_cello_gate_library(
+        os.path.join(UCF_DIR, "Eco1C1G1T1.gates.json")
+    )
+    input_sensors = parse_cello_input_file(
+        os.path.join(UCF_DIR, "Eco1C1G1T1.input.json")
+    )
+    assert len(gate_library) == 20
+    # Responses are repressing.
+    levels = gate_library.evaluate(
+        np.arange(len(gate_library))[:, np.newaxis],
+        np.array([[0.01, 1.0, 10.0]]),
+    )
+    assert (np.diff(levels, axis=1) <= 0).all()
+    result = optimize_gate_assignment(
+        network, gate_library, input_sensors, seed=3, chains=2, steps=30,
+    )
+    assert result.proven_optimal
+    assert result.evaluations > 0
+    assert len(result.assignment) == 3
+    # Every repressor is used at most once.
+    gate_names = gate_library.get_gate_names()
+    groups = [
+        gate_library.groups[gate_names.index(name)]
+        for name in result.assignment.values()
+    ]
+    assert len(set(groups)) == len(groups)
+    # The reported score is the exact score of the assignment.
+    problem = GateAssignmentProblem(network, gate_library, input_sensors)
+    assignment = np.array([
+        gate_names.index(result.assignment[name]) for name in problem.gate_names
+    ])
+    assert np.isclose(problem.evaluate(assignment[np.newaxis, :])[0], result.score)
+    # Exhaustive branch and bound agrees, and the search is deterministic.
+    _, optimum, complete = branch_and_bound(problem, node_limit=10 ** 6)
+    assert complete
+    assert np.isclose(optimum, result.score)
+    repeat = optimize_gate_assignment(
+        network, gate_library, input_sensors, seed=3, chains=2, steps=30,
+        processes=2,
+    )
+    assert repeat.assignment == result.assignment
+
+
+def get_and_or_requirement() -> CelloRequirement:
+    return CelloRequirement(
+        ucf_fp=os.path.join(UCF_DIR, "Eco1C1G1T1.gates.json"),
+        input_signal_fp=os.path.join(UCF_DIR, "Eco1C1G1T1.input.json"),
+        output_signal_fp=os.path.join(UCF_DIR, "Eco1C1G1T1.output.json"),
+        verilog_file_fp=os.path.join(UCF_DIR, "and_or.v"),
+    )
+
+
+def get_and_or_scorer(**kwargs) -> CelloScoring:
+    """
+    Scores a four input circuit with a fixed gate assignment.
+    """
+    library_gates = [
+        "A1_AmtR", "B1_BM3R1", "E1_BetI", "F1_AmeR",
+        "H1_HlyIIR", "I1_IcaRA", "L1_LitR", "N1_LmrA",
+        "P1_PhlF", "Q1_QacR", "R1_PsrA", "S1_SrpR",
+    ]
+    scorer = CelloScoring(None, get_and_or_requirement(), **kwargs)
+    scorer.gate_assignment = dict(zip(scorer.propagator.gate_names, library_gates))
+    return scorer
+
+
+def test_cello_signal_propagation():
+    scorer = get_and_or_scorer()
+    propagator = scorer.propagator
+    assert len(propagator.sensor_names) == 4
+    # Every row goes through the circuit in one pass.
+    input_matrix = canonical_input_matrix(4)
+    output_levels = scorer.propagate_rows(input_matrix)
+    assert output_levels.shape == (1, 16)
+    # Compared against propagating each row one gate at a time.
+    netlist = scorer.logic_network.netlist
+    fanin = netlist.get_fanin_lists()
+    gate_library = scorer.gate_library
+    gate_index = dict(zip(
+        propagator.gate_names,
+        propagator.get_assignment_indices(scorer.gate_assignment).tolist(),
+    ))
+    for row in range(16):
+        activity = {}
+        for node_id, *_ in propagator.plan:
+            if node_id in netlist.input_ids:
+                sensor_name = propagator.sensor_names[netlist.input_ids.index(node_id)]
+                activity[node_id] = scorer.input_sensors.get_sensor(sensor_name).get_score(
+                    int(input_matrix[netlist.input_ids.index(node_id), row])
+                )
+                continue
+            state = sum(activity[driver] for driver in fanin[node_id].tolist())
+            name = netlist.names[node_id]
+            if name in gate_index:
+                state = float(gate_library.evaluate(gate_index[name], state))
+            activity[node_id] = state
+        assert np.isclose(activity[netlist.output_ids[0]], output_levels[0, row])
+    truth = scorer.logic_network.simulate(input_matrix)[0]
+    expected = np.log10(output_levels[0, ~truth].max() / output_levels[0, truth].min())
+    assert np.isclose(scorer.score(), expected)
+
+
+def test_cello_parameter_robustness():
+    scorer = get_and_or_scorer()
+    robustness = scorer.estimate_robustness(num_samples=2000, seed=5)
+    assert robustness.scores.shape == (2000,)
+    assert np.isclose(robustness.nominal_score, -scorer.score())
+    # 4 parameters for each of the 8 gates, and 2 for each of the 4 sensors.
+    assert len(robustness.parameter_names) == len(robustness.sensitivities) == 40
+    percentiles = robustness.get_percentiles((5, 50, 95))
+    assert percentiles[5] < percentiles[50] < percentiles[95]
+    most_sensitive = robustness.get_most_sensitive(5)
+    magnitudes = [abs(correlation) for _, correlation in most_sensitive]
+    assert magnitudes == sorted(magnitudes, reverse=True)
+    assert magnitudes[0] > 0.2
+    # Without uncertainty every sample is the nominal design.
+    certain = scorer.estimate_robustness(num_samples=64, relative_sd=0.0)
+    assert np.allclose(certain.scores, certain.nominal_score)
+    # Results only depend on the seed.
+    repeat = scorer.estimate_robustness(num_samples=2000, seed=5, processes=2)
+    assert np.array_equal(repeat.scores, robustness.scores)
+
+
+def test_cello_result(monkeypatch):
+    scorer = get_and_or_scorer()
+    level_table = scorer.input_sensors.get_level_table()
+    assert level_table.shape == (4, 2)
+    for row, sensor_name in enumerate(scorer.input_sensors.get_available_sensors()):
+        sensor = scorer.input_sensors.get_sensor(sensor_name)
+        assert level_table[row].tolist() == [sensor.get_score(0), sensor.get_score(1)]
+    result = scorer.evaluate()
+    assert result.output_levels.shape == (1, 16)
+    assert result.input_matrix.shape == (4, 16)
+    assert scorer.score() == result.score
+    assert np.isclose(scorer.score(stop_above=10.0), result.score)
+    # Reporting renders the stored result without simulating again.
+    def fail(*args, **kwargs):
+        raise AssertionError("The design was simulated again.")
+
+    monkeypatch.setattr(scorer, "propagate_rows", fail)
+    monkeypatch.setattr(scorer.logic_network, "iterate_truth_table", fail)
+    scorer.report()
+    # Changing the assignment invalidates the result.
+    scorer.gate_assignment = dict(scorer.gate_assignment, NOT1="F1_AmeR")
+    with pytest.raises(AssertionError):
+        scorer.evaluate()
+
+
+def test_cello_circuit_metrics():
+    """
+    Blade style metrics of a Cello design agree with its score.
+    """
+    scorer = get_and_or_scorer()
+    result = scorer.evaluate()
+    metrics = result.get_circuit_metrics()
+    assert metrics.angles.shape == (1,)
+    assert np.isclose(-np.log10(metrics.dynamic_ranges[0]), result.score)
+    assert np.isnan(metrics.signal_to_noise).all()
+
+
+def test_cello_sampled_score():
+    """
+    Circuits past the sampling threshold are scored from sampled rows, and
+    the gate assignment is never searched for over every row.
+    """
+    scorer = get_and_or_scorer(sampling_threshold=2, sampling_seed=0)
+    assert scorer.use_sampling()
+    result = scorer.evaluate()
+    assert result.sampling_estimate is not None
+    assert result.output_levels is None
+    # Rows that weren't drawn can only make the score worse.
+    exhaustive = get_and_or_scorer().score()
+    assert result.score <= exhaustive + 1e-12
+    margin = result.margin_estimate
+    assert margin is not None
+    assert margin.interval[0] - 1e-12 <= exhaustive <= margin.interval[1] + 1e-12
+    assert margin.half_width <= 0.02
+    assert margin.observed == pytest.approx(exhaustive)
+    # Without an assignment, sampled circuits get the greedy one rather than
+    # a search over every row.
+    unassigned = CelloScoring(
+        None,
+        get_and_or_requirement(),
+        sampling_threshold=2,
+        sampling_seed=0,
+    )
+    assert np.isfinite(unassigned.score())
+    assert unassigned.gate_assignment == greedy_gate_assignment(
+        unassigned.logic_network,
+        unassigned.gate_library,
+        unassigned.input_sensors,
+    )
+
+
+def test_cello_score_command(tmp_path):
+    """
+    The score command builds the scorer from the input file alone, with or
+    without a gate assignment in it.
+    """
+    assignment = get_and_or_scorer().gate_assignment
+    requirement = get_and_or_requirement()
+    parameter_fp = tmp_path / "input.yml"
+    with open(parameter_fp, "w") as out_file:
+        yaml.dump({"cello": {**vars(requirement), "gate_assignment": assignment}}, out_file)
+    requirements = generate_requirement_classes(str(parameter_fp), ["cello"])
+    assert requirements[0].gate_assignment == assignment
+    main.score(
+        ["cello"],
+        sbol_filepath=os.path.join(
+            os.path.dirname(__file__),
+            "test_cello",
+            "example_and_gate.xml",
+        ),
+        parameter_filepath=str(parameter_fp),
+        out_filepath=str(tmp_path / "output"),
+    )
+    # The assignment may be left out, as may any other field with a default.
+    del requirement.gate_assignment
+    with open(parameter_fp, "w") as out_file:
+        yaml.dump({"cello": vars(requirement)}, out_file)
+    assert validate_input_file(str(parameter_fp), ["cello"])
+    greedy = CelloScoring(
+        None,
+        generate_requirement_classes(str(parameter_fp), ["cello"])[0],
+        optimize_assignment=False,
+    )
+    assert np.isfinite(greedy.score())
+    greedy.report()
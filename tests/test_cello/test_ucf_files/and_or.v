@@ -0,0 +1,9 @@
+// Two and gates feeding an or gate, driven by four sensors.
+module and_or(output out, input a, b, c, d);
+
+   wire w1, w2;
+   and (w1, a, b);
+   and (w2, c, d);
+   or (out, w1, w2);
+
+endmodule
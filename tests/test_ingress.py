@@ -6,8 +6,11 @@ Tests for the Ingress Module
 Written by W.R. Jackson, Ben Bremer, Eric South
 --------------------------------------------------------------------------------
 """
+import os
 import pathlib
+import shutil
 
+import numpy as np
 import pytest
 
 from ibis.ingress import parse_sbol_xml_tree
@@ -16,6 +19,10 @@ from ibis.datastucture import (
     NetworkGeneticNode,
     parse_cello_input_file,
 )
+from ibis.datastucture.parse_cache import (
+    get_ucf_cache_fp,
+    load_cached_ucf,
+)
 
 example_input_dict = {
     "name": "example_and_gate",
@@ -227,6 +234,48 @@ def test_ucf_parsing(get_input_sensor_ucf):
     parsed_input = parse_cello_input_file(input_file)
     tetr = parsed_input.get_sensor("TetR_sensor")
     assert round(tetr.get_score(1)) == 4
+    # The compiled response functions match the symbolic path.
+    states = np.linspace(0, 5, 101)
+    for sensor_name in parsed_input.get_available_sensors():
+        sensor = parsed_input.get_sensor(sensor_name)
+        for state in (0, 1):
+            symbolic = sensor.response_function.calculate_score(
+                state, sensor.sensor_parameters,
+            )
+            assert isinstance(sensor.get_score(state), float)
+            assert sensor.get_score(state) == float(symbolic)
+        symbolic = [
+            float(sensor.response_function.calculate_score(
+                state, sensor.sensor_parameters,
+            ))
+            for state in states
+        ]
+        assert np.allclose(sensor.get_score(states), symbolic, rtol=1e-14, atol=0)
+
+
+def test_ucf_cache(get_input_sensor_ucf, tmp_path, monkeypatch):
+    monkeypatch.setenv("IBIS_CACHE_DIR", str(tmp_path / "cache"))
+    input_file = tmp_path / "inputs.json"
+    shutil.copyfile(get_input_sensor_ucf, input_file)
+    parsed_input = parse_cello_input_file(str(input_file))
+    assert get_ucf_cache_fp(str(input_file), "inputs").endswith(".pickle")
+    cached_input = parse_cello_input_file(str(input_file))
+    assert cached_input.get_available_sensors() == parsed_input.get_available_sensors()
+    for sensor_name in parsed_input.get_available_sensors():
+        assert (
+            cached_input.get_sensor(sensor_name).get_score(1)
+            == parsed_input.get_sensor(sensor_name).get_score(1)
+        )
+    # Touching the file without changing it still hits the cache.
+    os.utime(input_file, ns=(0, 0))
+    assert load_cached_ucf(str(input_file), "inputs") is not None
+    # Changing it doesn't.
+    input_file.write_text(
+        input_file.read_text().replace('"value": 4.4', '"value": 8.4')
+    )
+    assert load_cached_ucf(str(input_file), "inputs") is None
+    tetr = parse_cello_input_file(str(input_file)).get_sensor("TetR_sensor")
+    assert round(tetr.get_score(1)) == 8
 
 
 if __name__ == "__main__":
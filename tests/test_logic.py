@@ -6,14 +6,43 @@ Tests our ability to parse verilog and come to the correct logical conclusions.
 Written by W.R. Jackson, Ben Bremer, Eric South
 --------------------------------------------------------------------------------
 """
+import importlib
 import itertools
 import os
 import pathlib
 
 import pytest
 import networkx as nx
+import numpy as np
 import matplotlib.pyplot as plt
+from ibis.datastucture import logic
+from ibis.datastucture.batch import synthesize_verilog_batch
+from ibis.datastucture.bdd import BDDManager
 from ibis.datastucture.logic import LogicNetwork
+from ibis.datastucture.sampling import (
+    MarginTracker,
+    wilson_interval,
+)
+from ibis.datastucture.simulation import (
+    canonical_input_matrix,
+    gray_code_flips,
+    unpack_words,
+)
+from ibis.datastucture.truth_table import (
+    TruthTable,
+    hamming_distance_matrix,
+    read_truth_table_binary,
+)
+from ibis.datastucture.netlist import CompactNetlist
+from ibis.datastucture.optimization import NetlistRewriter
+from ibis.generators.random_verilog import (
+    generate_random_structural_verilog,
+    write_random_binary_netlist,
+)
+from ibis.datastucture.structural_verilog import (
+    UnsupportedVerilogError,
+    parse_structural_verilog,
+)
 
 
 # @pytest.fixture
@@ -41,8 +70,59 @@ def test_and_expansion():
     file_location = os.path.join(path, "and.v")
     # Exercise the truth table. Trivial I know. Simple AND Table, 2 Inputs 1 Out
     c_net = LogicNetwork(verilog_fp=file_location)
-    c_net.perform_nor_logic_expansion()
-    c_net.plot_graph()
+    truth_table = c_net.generate_truth_table()
+    # NOR(NOT a, NOT b)
+    assert c_net.perform_nor_logic_expansion() == 3
+    assert np.array_equal(c_net.generate_truth_table(), truth_table)
+    assert c_net.get_available_inputs() == ["a", "b"]
+    assert c_net.get_available_outputs() == ["out"]
+    if importlib.util.find_spec("pygraphviz") is not None:
+        c_net.plot_graph()
+
+
+def test_nor_mapping(tmp_path):
+    file_location = tmp_path / "random.v"
+    file_location.write_text(
+        generate_random_structural_verilog(
+            num_inputs=8,
+            num_outputs=4,
+            num_gates=500,
+            seed=3,
+        )
+    )
+    c_net = LogicNetwork(verilog_fp=str(file_location), use_cache=False)
+    truth_table = c_net.generate_truth_table()
+    gate_count = c_net.perform_nor_logic_expansion()
+    assert np.array_equal(c_net.generate_truth_table(), truth_table)
+    function_names = [
+        node.logical_function.__name__
+        for node in c_net.get_logic_function_nodes()
+    ]
+    assert len(function_names) == gate_count
+    assert set(function_names) <= {"NOR", "NOT"}
+    for node in c_net.get_logic_function_nodes():
+        assert len(node.input_signals) == (2 if node.logical_function.__name__ == "NOR" else 1)
+    # Structural hashing: mapping an already mapped network adds nothing.
+    assert c_net.perform_nor_logic_expansion() == gate_count
+    assert np.array_equal(c_net.generate_truth_table(), truth_table)
+    # Dead logic costs no repressors, and x NOR NOT x is the constant False
+    # rather than a NOT and a NOR.
+    file_location = tmp_path / "dead.v"
+    file_location.write_text(
+        "module dead(output y, z, input a, b);\n"
+        "   wire na, dead1, dead2;\n"
+        "   not (na, a);\n"
+        "   nor (y, a, b);\n"
+        "   and (dead1, a, b);\n"
+        "   or (dead2, dead1, na);\n"
+        "   nor (z, a, na);\n"
+        "endmodule\n"
+    )
+    c_net = LogicNetwork(verilog_fp=str(file_location), use_cache=False)
+    truth_table = c_net.generate_truth_table()
+    assert c_net.perform_nor_logic_expansion() == 1
+    assert np.array_equal(c_net.generate_truth_table(), truth_table)
+    assert c_net.get_node_by_node_name("CONST0") is not None
 
 def test_or_gate():
     path = get_test_verilog_directory()
@@ -60,6 +140,685 @@ def test_struct():
     file_location = os.path.join(path, "struct.v")
     c_net = LogicNetwork(verilog_fp=file_location)
     thing = c_net.get_logical_output([True, True, True])
+    assert thing is True
+    assert c_net.get_logical_output([True, False, True]) is False
+
+
+def test_fanout():
+    path = get_test_verilog_directory()
+    file_location = os.path.join(path, "fanout.v")
+    c_net = LogicNetwork(verilog_fp=file_location)
+    truth_table = c_net.generate_truth_table()
+    # The memoized traversal must agree with the vectorized simulation even
+    # though w1 and w2 each drive two gates.
+    for row in truth_table:
+        logical_input = [bool(x) for x in row[:3]]
+        outputs = c_net.get_logical_outputs(logical_input)
+        assert outputs == [bool(x) for x in row[3:]]
+        assert c_net.get_logical_output(logical_input, 1) == outputs[1]
+
+
+def test_canonical_input_ordering():
+    expected = np.array(list(itertools.product([True, False], repeat=4))).T
+    assert np.array_equal(canonical_input_matrix(4), expected)
+    # Partial blocks of the table line up with the full table.
+    assert np.array_equal(canonical_input_matrix(4, 5, 11), expected[:, 5:11])
+
+
+def test_event_driven_truth_table(tmp_path):
+    # Consecutive Gray code rows differ in exactly one input.
+    rows = [0]
+    for input_index in gray_code_flips(4).tolist():
+        rows.append(rows[-1] ^ (1 << (3 - input_index)))
+    assert sorted(rows) == list(range(16))
+    path = get_test_verilog_directory()
+    for fn in ["and.v", "or.v", "xor_gate.v", "fanout.v", "struct.v"]:
+        c_net = LogicNetwork(verilog_fp=os.path.join(path, fn))
+        assert np.array_equal(
+            c_net.generate_truth_table(simulation_mode="event_driven"),
+            c_net.generate_truth_table(),
+        )
+    fp = tmp_path / "random.v"
+    fp.write_text(
+        generate_random_structural_verilog(
+            num_inputs=9,
+            num_outputs=4,
+            num_gates=200,
+            seed=5,
+        )
+    )
+    c_net = LogicNetwork(verilog_fp=str(fp))
+    assert np.array_equal(
+        c_net.generate_truth_table(simulation_mode="event_driven"),
+        c_net.generate_truth_table(),
+    )
+    # Ten independent inverter chains: a flip only travels down its own.
+    chains = []
+    for index in range(10):
+        signals = [f"i{index}"] + [f"w{index}_{depth}" for depth in range(15)]
+        signals.append(f"o{index}")
+        chains.append(f"   wire {', '.join(signals[1:-1])};")
+        chains.extend(
+            f"   not ({signals[depth + 1]}, {signals[depth]});"
+            for depth in range(16)
+        )
+    ports = ", ".join(
+        [f"output o{index}" for index in range(10)]
+        + [f"input i{index}" for index in range(10)]
+    )
+    fp = tmp_path / "chains.v"
+    fp.write_text(f"module chains({ports});\n" + "\n".join(chains) + "\nendmodule\n")
+    c_net = LogicNetwork(verilog_fp=str(fp))
+    simulator = c_net.get_event_driven_simulator()
+    output_matrix = simulator.evaluate_gray_code()
+    assert np.array_equal(output_matrix, c_net.simulate(canonical_input_matrix(10)))
+    schedule = c_net.get_simulation_schedule()
+    num_gates = sum(1 for drivers in schedule.fanin if drivers)
+    assert simulator.gate_evaluations * 8 <= num_gates * (2 ** 10 - 1)
+    with pytest.raises(RuntimeError):
+        c_net.generate_truth_table(simulation_mode="unknown")
+
+
+def test_random_vector_sampling(tmp_path):
+    fp = tmp_path / "random.v"
+    fp.write_text(
+        generate_random_structural_verilog(
+            num_inputs=12,
+            num_outputs=3,
+            num_gates=300,
+            seed=2,
+        )
+    )
+    c_net = LogicNetwork(verilog_fp=str(fp))
+    schedule = c_net.get_simulation_schedule()
+    # Bit-parallel evaluation agrees with the boolean kernels.
+    sampler = c_net.get_random_vector_sampler(seed=0)
+    packed_inputs, packed_outputs = sampler.draw_batch(4)
+    assert np.array_equal(
+        unpack_words(packed_outputs),
+        c_net.simulate(unpack_words(packed_inputs)),
+    )
+    input_matrix, output_matrix = next(sampler.iterate_batches(100, max_samples=70))
+    assert input_matrix.shape == (12, 70)
+    assert np.array_equal(output_matrix, schedule.evaluate_outputs(input_matrix))
+    # The exact ON fractions lie within the intervals.
+    exact = c_net.get_truth_table()
+    estimates = c_net.estimate_output_balance(tolerance=0.005, seed=1)
+    for output_index, estimate in enumerate(estimates):
+        low, high = estimate.interval
+        assert low <= exact.count_on(output_index) / exact.num_rows <= high
+        assert estimate.half_width <= 0.005
+    # Seeded runs are reproducible.
+    assert c_net.estimate_output_balance(seed=1) == c_net.estimate_output_balance(seed=1)
+    # The last batch is cut short, so no more than max_samples rows count.
+    capped = c_net.estimate_output_balance(tolerance=1e-9, seed=4, max_samples=100)
+    _, output_matrix = next(
+        c_net.get_random_vector_sampler(seed=4).iterate_batches(100, max_samples=100)
+    )
+    assert [estimate.num_samples for estimate in capped] == [100] * 3
+    assert [estimate.successes for estimate in capped] == output_matrix.sum(axis=1).tolist()
+    low, high = wilson_interval(0, 100)
+    assert low == 0 and 0 < high < 0.05
+    # Levels spread over a decade either side of the threshold, so the
+    # margin at the quantile is known in closed form.
+    rng = np.random.default_rng(0)
+    tracker = MarginTracker(1, quantile=0.01, max_samples=1 << 16)
+    for _ in range(16):
+        truth = rng.random((1, 4096)) < 0.5
+        levels = np.where(truth, 1 + rng.random((1, 4096)), rng.random((1, 4096)))
+        tracker.update(levels, truth)
+    margin = tracker.get_estimate()
+    expected = np.log10(0.99 / 1.01)
+    assert margin.interval[0] <= expected <= margin.interval[1]
+    assert margin.half_width < 0.01
+    assert margin.observed > margin.estimate
+    assert margin.num_samples == 1 << 16
+    # Far beyond the exhaustive limit.
+    fp = tmp_path / "wide.v"
+    fp.write_text(
+        generate_random_structural_verilog(
+            num_inputs=48,
+            num_outputs=2,
+            num_gates=2000,
+            seed=3,
+        )
+    )
+    c_net = LogicNetwork(verilog_fp=str(fp))
+    estimates = c_net.estimate_output_balance(tolerance=0.01, seed=4)
+    assert all(estimate.half_width <= 0.01 for estimate in estimates)
+
+
+def test_truth_table():
+    path = get_test_verilog_directory()
+    for fn, function in [
+        ("and.v", lambda a, b: a and b),
+        ("or.v", lambda a, b: a or b),
+        ("xor_gate.v", lambda a, b: a != b),
+    ]:
+        c_net = LogicNetwork(verilog_fp=os.path.join(path, fn))
+        truth_table = c_net.generate_truth_table()
+        assert truth_table.shape == (4, 3)
+        for row in truth_table:
+            assert bool(row[2]) == function(bool(row[0]), bool(row[1]))
+        assert np.array_equal(
+            c_net.generate_truth_vector(truth_table, 0),
+            truth_table[:, 2],
+        )
+
+
+def test_packed_truth_table():
+    path = get_test_verilog_directory()
+    tables = {}
+    for fn in ["and.v", "or.v", "xor_gate.v", "fanout.v"]:
+        c_net = LogicNetwork(verilog_fp=os.path.join(path, fn))
+        table = c_net.get_truth_table()
+        array = c_net.generate_truth_table()
+        num_inputs = c_net.get_number_of_inputs()
+        assert np.array_equal(table.to_array(), array)
+        assert table == TruthTable.from_array(array, num_inputs)
+        for output_index in range(c_net.get_number_of_outputs()):
+            column = array[:, num_inputs + output_index]
+            assert np.array_equal(
+                c_net.generate_truth_vector(table, output_index),
+                column,
+            )
+            assert np.array_equal(
+                table.get_on_set(output_index),
+                np.flatnonzero(column),
+            )
+            assert np.array_equal(
+                table.get_off_set(output_index),
+                np.flatnonzero(column == 0),
+            )
+            assert table.count_on(output_index) == column.sum()
+        tables[fn] = table
+    and_table, or_table, xor_table = tables["and.v"], tables["or.v"], tables["xor_gate.v"]
+    assert and_table == TruthTable.from_vector([1, 0, 0, 0])
+    assert hash(and_table) == hash(TruthTable.from_vector([1, 0, 0, 0]))
+    assert and_table.canonical_hash() != or_table.canonical_hash()
+    assert and_table.hamming_distance(or_table).tolist() == [2]
+    assert hamming_distance_matrix([and_table, or_table, xor_table]).tolist() == [
+        [0, 2, 3],
+        [2, 0, 1],
+        [3, 1, 0],
+    ]
+    with pytest.raises(RuntimeError):
+        and_table.hamming_distance(tables["fanout.v"])
+    # 16 inputs: 64 kilobits for a single output.
+    wide = TruthTable.from_output_matrix(np.ones((1, 2 ** 16), dtype=bool), 16)
+    assert wide.nbytes == 2 ** 16 // 8
+
+
+def test_streamed_truth_table(tmp_path):
+    verilog_code = generate_random_structural_verilog(
+        num_inputs=10,
+        num_outputs=3,
+        num_gates=120,
+        seed=11,
+    )
+    fp = tmp_path / "streamed.v"
+    fp.write_text(verilog_code)
+    c_net = LogicNetwork(verilog_fp=str(fp))
+    full_table = c_net.generate_truth_table()
+    # Uneven blocks, so the last one is partial.
+    chunks = list(c_net.iterate_truth_table(chunk_size=96))
+    assert [chunk.start for chunk in chunks] == list(range(0, 2 ** 10, 96))
+    assert np.array_equal(
+        np.vstack([chunk.to_array() for chunk in chunks]),
+        full_table,
+    )
+    # Consumers can stop early and only pay for what they read.
+    first = next(iter(c_net.iterate_truth_table(chunk_size=8, start=40)))
+    assert np.array_equal(first.to_array(), full_table[40:48])
+    assert c_net.get_truth_table() == TruthTable.from_array(full_table, 10)
+
+    csv_fp = tmp_path / "streamed.csv"
+    c_net.write_truth_table(str(csv_fp), chunk_size=100)
+    lines = csv_fp.read_text().splitlines()
+    assert lines[0].split(",") == (
+        c_net.get_available_inputs() + c_net.get_available_outputs()
+    )
+    assert np.array_equal(
+        np.array([line.split(",") for line in lines[1:]], dtype=float),
+        full_table,
+    )
+    binary_fp = tmp_path / "streamed.truth"
+    c_net.write_truth_table(str(binary_fp), binary=True, chunk_size=64)
+    assert binary_fp.stat().st_size == 2 ** 10 * 3 // 8
+    assert read_truth_table_binary(str(binary_fp), 10, 3) == c_net.get_truth_table()
+    with pytest.raises(RuntimeError):
+        c_net.write_truth_table(str(binary_fp), binary=True, chunk_size=100)
+
+
+def test_struct_truth_table():
+    path = get_test_verilog_directory()
+    c_net = LogicNetwork(verilog_fp=os.path.join(path, "struct.v"))
+    truth_table = c_net.generate_truth_table()
+    # Struct reduces to a three input AND.
+    for row in truth_table:
+        assert bool(row[3]) == all(row[:3])
+
+
+def test_parse_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("IBIS_CACHE_DIR", str(tmp_path))
+    file_location = os.path.join(get_test_verilog_directory(), "struct.v")
+    first = LogicNetwork(verilog_fp=file_location)
+    assert os.listdir(tmp_path / "netlists")
+
+    # A cached netlist never touches pyverilog.
+    def _fail(*args, **kwargs):
+        raise AssertionError("Pyverilog was invoked for a cached netlist.")
+
+    monkeypatch.setattr(logic, "parse_verilog_ast", _fail)
+    second = LogicNetwork(verilog_fp=file_location)
+    assert second.get_available_inputs() == first.get_available_inputs()
+    assert second.get_available_outputs() == first.get_available_outputs()
+    assert np.array_equal(
+        first.generate_truth_table(),
+        second.generate_truth_table(),
+    )
+    with pytest.raises(AssertionError):
+        LogicNetwork(
+            verilog_fp=file_location,
+            use_cache=False,
+            use_native_parser=False,
+        )
+    # The cached native netlist is never handed out in place of pyverilog.
+    with pytest.raises(AssertionError):
+        LogicNetwork(verilog_fp=file_location, use_native_parser=False)
+
+
+def test_native_parser_matches_pyverilog():
+    path = get_test_verilog_directory()
+    for fn in ["and.v", "or.v", "xor_gate.v", "struct.v", "fanout.v"]:
+        file_location = os.path.join(path, fn)
+        native = LogicNetwork(verilog_fp=file_location, use_cache=False)
+        pyverilog = LogicNetwork(
+            verilog_fp=file_location,
+            use_cache=False,
+            use_native_parser=False,
+        )
+        assert native.serialize_netlist() == pyverilog.serialize_netlist()
+
+
+def test_native_parser_subset():
+    # Non-ANSI port declarations.
+    netlist = parse_structural_verilog(
+        [
+            "module and_gate(a, b, out);",
+            "  input a; input b; output out;",
+            "  and g0 (out, a, b); /* A named",
+            "  instance */",
+            "endmodule",
+        ]
+    )
+    assert [netlist["nodes"][i][0] for i in netlist["inputs"]] == ["a", "b"]
+    assert [netlist["nodes"][i][0] for i in netlist["outputs"]] == ["out"]
+    # Vectors are outside of the structural subset, and fall back.
+    with pytest.raises(UnsupportedVerilogError):
+        parse_structural_verilog(
+            ["module m(input [3:0] a, output b);", "endmodule"]
+        )
+    with pytest.raises(UnsupportedVerilogError):
+        parse_structural_verilog(
+            ["module m(input a, output b);", "always @(a) b = a;", "endmodule"]
+        )
+
+
+def test_batch_synthesis(tmp_path):
+    corpus = tmp_path / "corpus"
+    (corpus / "nested").mkdir(parents=True)
+    path = get_test_verilog_directory()
+    for fn in ["and.v", "or.v", "fanout.v"]:
+        (corpus / fn).write_text(pathlib.Path(path, fn).read_text())
+    (corpus / "nested" / "struct.v").write_text(
+        pathlib.Path(path, "struct.v").read_text()
+    )
+    (corpus / "broken.v").write_text("module broken(output y, input a);\n")
+    output_dir = tmp_path / "output"
+    results = synthesize_verilog_batch(str(corpus), str(output_dir), processes=2)
+    statuses = {pathlib.Path(r.verilog_fp).name: r.status for r in results}
+    assert statuses == {
+        "and.v": "synthesized",
+        "broken.v": "failed",
+        "fanout.v": "synthesized",
+        "or.v": "synthesized",
+        "struct.v": "synthesized",
+    }
+    table = np.loadtxt(output_dir / "and.csv", delimiter=",", skiprows=1)
+    and_net = LogicNetwork(verilog_fp=os.path.join(path, "and.v"))
+    assert np.array_equal(table, and_net.generate_truth_table())
+    assert (output_dir / "and.edgelist").read_text().splitlines() == [
+        f"{start} {end}" for start, end in and_net.netlist.iterate_edges()
+    ]
+    # Nothing left behind in the working directory.
+    assert not os.path.exists("preprocess.output")
+    # Unchanged files are skipped, changed ones are redone.
+    (corpus / "or.v").write_text((corpus / "or.v").read_text() + "\n")
+    results = synthesize_verilog_batch(
+        str(corpus / "*.v"),
+        str(output_dir),
+        processes=1,
+    )
+    statuses = {pathlib.Path(r.verilog_fp).name: r.status for r in results}
+    assert statuses == {
+        "and.v": "skipped",
+        "broken.v": "failed",
+        "fanout.v": "skipped",
+        "or.v": "synthesized",
+    }
+
+
+def test_compact_netlist(tmp_path):
+    file_location = tmp_path / "random.v"
+    file_location.write_text(
+        generate_random_structural_verilog(
+            num_inputs=6,
+            num_outputs=3,
+            num_gates=2000,
+            seed=5,
+        )
+    )
+    c_net = LogicNetwork(verilog_fp=str(file_location), use_cache=False)
+    netlist = c_net.netlist
+    # Loading the netlist does not materialize a LogicNode per gate.
+    assert len(c_net._node_views) < netlist.number_of_nodes()
+    # The CSR fanin and fanout are transposes of one another.
+    for node_id in range(netlist.number_of_nodes()):
+        for driver in netlist.get_fanin(node_id):
+            assert node_id in netlist.get_fanout(driver)
+    assert netlist.number_of_edges() == sum(
+        len(netlist.get_fanin(n)) for n in range(netlist.number_of_nodes())
+    )
+    node = c_net.get_node_by_node_name("w10")
+    assert node is c_net.get_node_by_node_name("w10")
+    assert node.node_name == "w10"
+    assert c_net.get_node_by_node_name("not_a_node") is None
+    gate_nodes = [
+        n for n in c_net.get_logic_function_nodes()
+        if n.logical_function.__name__ != "WIRE"
+    ]
+    assert len(gate_nodes) == 2000
+    # The node views, the traversal, and the lazily built graph all agree
+    # with the vectorized simulation.
+    assert node.input_signals[0].output_signal.logical_function is not None
+    assert c_net.graph.number_of_edges() == netlist.number_of_edges()
+    truth_table = c_net.generate_truth_table()
+    for row in truth_table[::7]:
+        outputs = c_net.get_logical_outputs([bool(x) for x in row[:6]])
+        assert outputs == [bool(x) for x in row[6:]]
+    edgelist_fp = tmp_path / "random.edgelist"
+    c_net.save_netlist(str(edgelist_fp))
+    assert len(edgelist_fp.read_text().splitlines()) == netlist.number_of_edges()
+    # Duplicate edges are dropped, keeping the first, as in a DiGraph.
+    small = CompactNetlist()
+    a, b = small.add_node("a"), small.add_node("b")
+    gate = small.add_node("g", "NOR")
+    for start_id in (b, a, b, a):
+        small.add_edge(start_id, gate)
+    assert small.number_of_edges() == 2
+    assert small.get_fanin(gate).tolist() == [b, a]
+    # The reported memory covers the name table as well as the arrays.
+    array_bytes = sum(view.nbytes for view in netlist.get_arrays().values())
+    assert netlist.get_memory_usage() > array_bytes + len(netlist.names) * 8
+
+
+def test_binary_netlist(tmp_path):
+    fp = tmp_path / "random.v"
+    fp.write_text(
+        generate_random_structural_verilog(
+            num_inputs=10,
+            num_outputs=3,
+            num_gates=1000,
+            seed=12,
+        )
+    )
+    c_net = LogicNetwork(verilog_fp=str(fp))
+    binary_fp = str(tmp_path / "random.ibisnet")
+    c_net.save_netlist(binary_fp)
+    loaded = CompactNetlist.read_binary(binary_fp)
+    # Read only views of the mapped file rather than copies, and names are
+    # only decoded when asked for.
+    assert not loaded.get_arrays()["fanin_indices"].flags.writeable
+    assert loaded.number_of_nodes() == c_net.netlist.number_of_nodes()
+    assert loaded.number_of_edges() == c_net.netlist.number_of_edges()
+    assert loaded.get_schedule().num_nodes == c_net.netlist.get_schedule().num_nodes
+    assert loaded._names is None and loaded._name_index is None
+    assert np.shares_memory(loaded._edge_sources, loaded.get_arrays()["edge_sources"])
+    loaded.write_binary(str(tmp_path / "copy.ibisnet"))
+    assert loaded._names is None
+    copied = CompactNetlist.read_binary(str(tmp_path / "copy.ibisnet"))
+    assert copied.names == c_net.netlist.names
+    assert loaded.serialize() == c_net.netlist.serialize()
+    assert loaded.name_index == c_net.netlist.name_index
+    for name, array in c_net.netlist.get_arrays().items():
+        assert np.array_equal(loaded.get_arrays()[name], array)
+    in_memory = CompactNetlist.read_binary(binary_fp, use_mmap=False)
+    assert in_memory.serialize() == c_net.netlist.serialize()
+    truth_table = c_net.get_truth_table()
+    loaded_net = LogicNetwork(verilog_fp=str(fp))
+    loaded_net.load_binary_netlist(binary_fp)
+    assert loaded_net.get_truth_table() == truth_table
+    # A loaded netlist can still be extended.
+    start, end = loaded.iterate_edges()[0]
+    loaded.add_edge(start, end)
+    assert loaded.number_of_edges() == c_net.netlist.number_of_edges()
+    node_id = loaded.add_node(None, "NOT")
+    loaded.add_edge(start, node_id)
+    assert loaded.get_fanin(node_id).tolist() == [start]
+    # Unnamed nodes stay unnamed.
+    loaded.write_binary(binary_fp)
+    assert CompactNetlist.read_binary(binary_fp).names[node_id] is None
+    bad_fp = tmp_path / "bad.ibisnet"
+    bad_fp.write_bytes(b"not a netlist" * 8)
+    with pytest.raises(RuntimeError):
+        CompactNetlist.read_binary(str(bad_fp))
+    write_random_binary_netlist(binary_fp, num_inputs=6, num_gates=50, seed=1)
+    assert len(CompactNetlist.read_binary(binary_fp).input_ids) == 6
+
+
+def test_optimization():
+    path = get_test_verilog_directory()
+    c_net = LogicNetwork(verilog_fp=os.path.join(path, "constants.v"))
+    truth_table = c_net.generate_truth_table()
+    statistics = c_net.optimize()
+    assert np.array_equal(c_net.generate_truth_table(), truth_table)
+    assert c_net.get_available_inputs() == ["a", "b"]
+    assert c_net.get_available_outputs() == ["x", "y", "z"]
+    # x is constant, z is a double inversion of a, and y is a NOT of b since
+    # the XOR is fed a constant True.
+    function_names = [
+        node.logical_function.__name__
+        for node in c_net.get_logic_function_nodes()
+    ]
+    assert function_names == ["NOT"]
+    assert sum(s.nodes_removed for s in statistics) > 0
+    # The pipeline stopped once nothing changed.
+    assert all(s.nodes_removed == 0 for s in statistics[-4:])
+    assert all(s.nodes_removed == 0 for s in c_net.optimize())
+
+
+def test_optimization_fixed_point(tmp_path):
+    """
+    The pipeline runs until the structure is unchanged rather than the size,
+    and constants never take the name of an existing net.
+    """
+
+    class RewriteOneAnd(NetlistRewriter):
+        # Turns a single AND gate into an OR per run, keeping the size.
+        name = "rewrite_one_and"
+
+        def __init__(self, source):
+            super().__init__(source)
+            self.rewritten = False
+
+        def rewrite_node(self, node_id, fanin):
+            if self.source.get_gate_type(node_id) == "AND" and not self.rewritten:
+                self.rewritten = True
+                return self.emit(node_id, "OR", fanin)
+            return super().rewrite_node(node_id, fanin)
+
+    file_location = tmp_path / "chain.v"
+    file_location.write_text(
+        "module chain(output y, input a, b, c);\n"
+        "   wire w;\n"
+        "   and (w, a, b);\n"
+        "   and (y, w, c);\n"
+        "endmodule\n"
+    )
+    c_net = LogicNetwork(verilog_fp=str(file_location), use_cache=False)
+    statistics = c_net.optimize(passes=[RewriteOneAnd])
+    assert all(s.nodes_removed == 0 for s in statistics)
+    function_names = [
+        node.logical_function.__name__
+        for node in c_net.get_logic_function_nodes()
+    ]
+    assert function_names == ["OR", "OR"]
+    file_location = tmp_path / "named_constant.v"
+    file_location.write_text(
+        "module named_constant(output x, CONST0, input a, b);\n"
+        "   wire u;\n"
+        "   nand (x, a, u);\n"
+        "   and (CONST0, a, b);\n"
+        "endmodule\n"
+    )
+    c_net = LogicNetwork(verilog_fp=str(file_location), use_cache=False)
+    truth_table = c_net.generate_truth_table()
+    c_net.optimize()
+    assert np.array_equal(c_net.generate_truth_table(), truth_table)
+    assert c_net.netlist.names.count("CONST0") == 1
+    assert c_net.get_available_outputs() == ["x", "CONST0"]
+
+
+def test_optimization_random(tmp_path):
+    file_location = tmp_path / "random.v"
+    file_location.write_text(
+        generate_random_structural_verilog(
+            num_inputs=8,
+            num_outputs=3,
+            num_gates=400,
+            seed=11,
+        )
+    )
+    c_net = LogicNetwork(verilog_fp=str(file_location), use_cache=False)
+    truth_table = c_net.generate_truth_table()
+    nodes_before = c_net.netlist.number_of_nodes()
+    c_net.optimize()
+    assert c_net.netlist.number_of_nodes() < nodes_before
+    assert np.array_equal(c_net.generate_truth_table(), truth_table)
+    assert not any(
+        node.logical_function.__name__ == "WIRE"
+        for node in c_net.get_logic_function_nodes()
+    )
+
+
+def test_symbolic_truth_function(tmp_path):
+    file_location = tmp_path / "random.v"
+    file_location.write_text(
+        generate_random_structural_verilog(
+            num_inputs=10,
+            num_outputs=3,
+            num_gates=300,
+            seed=7,
+        )
+    )
+    c_net = LogicNetwork(verilog_fp=str(file_location), use_cache=False)
+    truth_table = c_net.generate_truth_table()
+    manager = BDDManager()
+    symbolic = c_net.get_symbolic_truth_function(manager)
+    for output_index in range(3):
+        column = truth_table[:, 10 + output_index].astype(bool)
+        assert symbolic.count_rows(output_index) == column.sum()
+        assert symbolic.count_rows(output_index, False) == (~column).sum()
+        assert sorted(symbolic.iterate_rows(output_index)) == (
+            np.flatnonzero(column).tolist()
+        )
+        assert sorted(symbolic.iterate_rows(output_index, False)) == (
+            np.flatnonzero(~column).tolist()
+        )
+    for row in truth_table[::37]:
+        assert symbolic.evaluate([bool(x) for x in row[:10]]) == (
+            [bool(x) for x in row[10:]]
+        )
+    # Equivalent networks share their BDDs, different ones don't.
+    c_net.perform_nor_logic_expansion()
+    assert symbolic.is_equivalent(c_net.get_symbolic_truth_function(manager))
+    and_net = LogicNetwork(
+        verilog_fp=os.path.join(get_test_verilog_directory(), "and.v"),
+    )
+    and_symbolic = and_net.get_symbolic_truth_function(manager)
+    assert not symbolic.is_equivalent(and_symbolic)
+    # Variables from the other network don't inflate the counts.
+    assert and_symbolic.count_rows() == 1
+    with pytest.raises(RuntimeError):
+        symbolic.is_equivalent(and_net.get_symbolic_truth_function())
+
+
+def test_equivalence_checking(tmp_path):
+    path = get_test_verilog_directory()
+    and_net = LogicNetwork(verilog_fp=os.path.join(path, "and.v"))
+    or_net = LogicNetwork(verilog_fp=os.path.join(path, "or.v"))
+    mapped = LogicNetwork(verilog_fp=os.path.join(path, "and.v"))
+    mapped.perform_nor_logic_expansion()
+    result = and_net.equivalent(mapped)
+    assert result and result.method == "exhaustive"
+    result = and_net.equivalent(or_net)
+    assert not result and result.method == "signature"
+    counterexample = result.counterexample
+    assert counterexample["a"] != counterexample["b"]
+    # Ports are matched by name, not position.
+    swapped = and_net.serialize_netlist()
+    swapped["inputs"] = swapped["inputs"][::-1]
+    swapped_net = LogicNetwork(verilog_fp=os.path.join(path, "and.v"))
+    swapped_net.load_netlist(swapped)
+    assert swapped_net.get_available_inputs() == ["b", "a"]
+    assert and_net.equivalent(swapped_net)
+    with pytest.raises(RuntimeError):
+        and_net.equivalent(LogicNetwork(verilog_fp=os.path.join(path, "fanout.v")))
+    # Past the exhaustive limit.
+    verilog_code = generate_random_structural_verilog(
+        num_inputs=40,
+        num_outputs=2,
+        num_gates=150,
+        seed=9,
+    )
+    fp = tmp_path / "wide.v"
+    fp.write_text(verilog_code)
+    wide_net = LogicNetwork(verilog_fp=str(fp))
+    wide_mapped = LogicNetwork(verilog_fp=str(fp))
+    wide_mapped.perform_nor_logic_expansion()
+    result = wide_net.equivalent(wide_mapped)
+    assert result and result.method == "bdd"
+    # These differ in a single row out of 2 ** 40, which random signatures
+    # practically never hit.
+    ports = ", ".join(f"i{index}" for index in range(40))
+    fp = tmp_path / "wide_and.v"
+    fp.write_text(
+        f"module wide(output o, input {ports});\n"
+        f"   and (o, {ports});\nendmodule\n"
+    )
+    fp_short = tmp_path / "short_and.v"
+    fp_short.write_text(
+        f"module wide(output o, input {ports});\n"
+        f"   and (o, {ports[:ports.rindex(',')]});\nendmodule\n"
+    )
+    result = LogicNetwork(verilog_fp=str(fp)).equivalent(
+        LogicNetwork(verilog_fp=str(fp_short)),
+    )
+    assert not result and result.method == "bdd"
+    assert result.counterexample == {
+        f"i{index}": index != 39 for index in range(40)
+    }
+
+
+def test_symbolic_truth_function_wide():
+    # A 64 input parity tree would have a truth table with 2 ** 64 rows.
+    manager = BDDManager([f"in{index}" for index in range(64)])
+    parity = 0
+    for index in range(64):
+        parity = manager.exclusive_or(parity, manager.variable(f"in{index}"))
+    assert manager.count_satisfying(parity) == 2 ** 63
+    assert manager.count_nodes(parity) == 127
 
 
 def test_sr_latch():
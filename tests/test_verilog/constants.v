@@ -0,0 +1,11 @@
+module constants(output x, y, z, input a, b);
+
+   wire u, w1, w2;
+   and (x, a, u);
+   not (w1, u);
+   xor (y, b, w1);
+   not (w2, a);
+   not (z, w2);
+   and (dead, a, b);
+
+endmodule
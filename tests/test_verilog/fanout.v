@@ -0,0 +1,10 @@
+module fanout(output x, y, input a, b, c);
+
+   wire w1, w2, w3;
+   nor (w1, a, b);
+   nor (w2, w1, c);
+   nor (w3, w1, w2);
+   not (x, w3);
+   nor (y, w2, w3);
+
+endmodule